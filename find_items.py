@@ -8,7 +8,10 @@
 #   - pack animal player is riding
 
 from pycraft import Player
-from pycraft import Chunk
+from pycraft import Region
+from pycraft import World
+from pycraft.item_search import search_world
+from pycraft.prefilter import BytesPrefilter
 
 import argparse
 import math
@@ -22,6 +25,10 @@ def parse_args():
     parser.add_argument('--search', '-s', type=str, default=None, help='Comma separated list of search terms')
     parser.add_argument('--show-all', '-a', action='store_true', help='Show all items in container even if they do not match')
     parser.add_argument('--distance', '-d', default=0, type=int, help='Only show items withint "distance" of the player')
+    parser.add_argument('--world', '-W', action='store_true', help='Search the whole world instead of the player\'s region')
+    parser.add_argument('--bbox', '-b', type=str, default=None, help='Search the world inside "x0,z0,x1,z1" (block coordinates)')
+    parser.add_argument('--radius', '-r', type=int, default=None, help='Search the world within this many blocks of the player')
+    parser.add_argument('--processes', '-P', type=int, default=None, help='Number of worker processes for world searches. [default: one per core]')
     return parser.parse_args()
 
 def check_player(player, search, show_all, pos, dist):
@@ -93,24 +100,45 @@ def check_items(e, search, show_all, pos, dist):
 
 def check_entity_data(region, search, show_all, pos, dist):
     print('Searching Entities Data...')
-    for cy in range(Chunk.BLOCK_WIDTH):
-        for cx in range(Chunk.BLOCK_WIDTH):
-            # check region data
-            chunk = region.get_r_chunk('entities', cx, cy)
-            # print(f'--- c {cx} {cy} ---')
-            for e in chunk.entities:
-                check_items(e, search, show_all, pos, dist)
+    prefilter = BytesPrefilter(search) if search else None
+    for cx, cz, timestamp, chunk in region.iter_chunks('entities', tags=('Entities',), prefilter=prefilter):
+        # print(f'--- c {cx} {cz} ---')
+        for e in chunk.entities:
+            check_items(e, search, show_all, pos, dist)
 
 def check_region_data(region, search, show_all, pos, dist):
     print('Searching Region Data...')
-    for cy in range(Chunk.BLOCK_WIDTH):
-        for cx in range(Chunk.BLOCK_WIDTH):
-            # check region data
-            rchunk = region.get_r_chunk('region', cx, cy)
-            # print(f'--- c {cx} {cy} ---')
-            entities = rchunk.get_tag('block_entities')
-            for e in entities:
-                check_items(e, search, show_all, pos, dist)
+    prefilter = BytesPrefilter(search) if search else None
+    for cx, cz, timestamp, rchunk in region.iter_chunks('region', tags=('block_entities',), prefilter=prefilter):
+        # print(f'--- c {cx} {cz} ---')
+        entities = rchunk.get_tag('block_entities') or []
+        for e in entities:
+            check_items(e, search, show_all, pos, dist)
+
+def search_regions(worldpath, search, show_all, pos, bbox, radius, processes):
+    """
+    Search the regions of the world that overlap bbox (all of them if bbox is None) in parallel
+    and print the results sorted by distance from pos.
+    """
+    world = World(worldpath)
+    regions = set(world.get_region_positions('region')) | set(world.get_region_positions('entities'))
+    if bbox:
+        regions &= set(Region.bbox_positions(bbox))
+    print(f'Searching {len(regions)} regions...')
+    results = search_world(worldpath, sorted(regions), search, bbox, pos, radius, processes)
+    for result in results:
+        print('----------')
+        x, y, z = result['pos']
+        dist_str = f' distance: {int(result["distance"])}' if result['distance'] is not None else ''
+        print(f'{result["id"]} at ({x}, {y}, {z}){dist_str}')
+        for i in result['items']:
+            matched = '*' if search and i['matched'] else ' '
+            if show_all or matched == '*':
+                inside = ''.join(f'{c} > ' for c in i['path'])
+                slot = f'Slot {i["slot"]}: ' if i['slot'] is not None else ''
+                print(f'  {matched}{inside}{slot}{i["count"]} {i["id"]}')
+    print(f'Found {len(results)} containers')
+
 
 if __name__ == '__main__':
     args = parse_args()
@@ -129,6 +157,17 @@ if __name__ == '__main__':
     dist = args.distance * args.distance
     check_player(player, search, args.show_all, player.position, dist)
 
+    if args.world or args.bbox or args.radius:
+        bbox = None
+        if args.bbox:
+            bbox = tuple(int(v) for v in args.bbox.split(','))
+        elif args.radius:
+            p = player.position
+            bbox = (int(p[0]) - args.radius, int(p[2]) - args.radius,
+                    int(p[0]) + args.radius + 1, int(p[2]) + args.radius + 1)
+        search_regions(args.worldpath, search, args.show_all, player.position, bbox, args.radius, args.processes)
+        sys.exit(0)
+
     region = player.get_region()
     check_region_data(region, search, args.show_all, player.position, dist)
     check_entity_data(region, search, args.show_all, player.position, dist)
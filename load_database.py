@@ -10,14 +10,18 @@ import threading
 import traceback
 
 from pycraft import __version__ as pycraft_version
-from pycraft import Chunk
 from pycraft import Database
+from pycraft.database import BulkWriter
+from pycraft.database import RecordIdAllocator
 from pycraft import Player
 from pycraft import Region
+from pycraft import mca
 from pycraft import World
+from pycraft.world_catalog import WorldCatalog
+from pycraft import region_stats
 from pycraft.util import ElapsedTime
 from pycraft.colors import get_sheep_color
-from pycraft.entity import entity_factory
+from pycraft.entity import EntityRecord
 
 SHUTTING_DOWN=False
 
@@ -35,14 +39,19 @@ def parse_args():
     parser.add_argument('dbfile', type=str, help='Database file')
     parser.add_argument('--worldpath', '-w', type=str, default=None, help='Path to saved world')
     parser.add_argument('--loglevel', '-l', type=str, default='INFO', help='Log level: DEBUG, INFO, WARN, ERROR')
-    parser.add_argument('--threads', '-t', type=int, default=10, help=f'Number of threads to run. [default {DEF_THREADS}]. More than a 100 may require you to increase the open file limit using "ulimit -n NUM" on Linux')
+    parser.add_argument('--threads', '-t', type=int, default=10, help=f'Number of threads to run. [default {DEF_THREADS}]. Region files are opened through a shared pool of at most {mca.FILE_POOL.max_open} files, so the thread count does not change the open file limit needed')
+    parser.add_argument('--processes', '-P', type=int, default=0, help='Number of worker processes to parse the world data with. Uses all cores if negative. When set, --threads is ignored and this process is the only database writer')
+    parser.add_argument('--incremental', '-i', action='store_true', help='Update an existing database, only reloading the chunks that have changed since the last import')
+    parser.add_argument('--bulk', '-b', action='store_true', help='Use the bulk writer: WAL journal, relaxed synchronous mode, indexes created at the end and records written in large batches')
+    parser.add_argument('--batch-rows', type=int, default=50000, help='With --bulk, write a batch once this many records are buffered [default 50000]')
+    parser.add_argument('--batch-seconds', type=float, default=10.0, help='With --bulk, write a batch once this many seconds have passed since the last one [default 10]')
     parser.add_argument('--playeronly', '-p', help='Load only data for the player\'s region. (default is to load all data for all regions)', action='store_true')
     return parser.parse_args()
 
 def get_value(v):
     return v.value if str(type(v).__name__).startswith('NBT') else v
 
-def process_item(item, owner, pos, container, container_id, item_list, modifier_list, db, slot=None, debug=False):
+def process_item(item, owner, pos, container, container_id, item_list, modifier_list, ids, slot=None, debug=False):
     if slot is None and not 'Slot' in item:
         return None
     slot = slot if slot is not None else item['Slot'].value
@@ -56,7 +65,7 @@ def process_item(item, owner, pos, container, container_id, item_list, modifier_
     if 'id' in item and 'Count' in item:
         item_type = get_value(item['id'])[10:]
         count = item['Count'] if isinstance(item['Count'], int) else item['Count'].value
-        item_id = db.next_record_id()
+        item_id = ids.next_record_id()
         damage = None
         repair_cost = None
         if 'tag' in item:
@@ -191,76 +200,65 @@ def process_item(item, owner, pos, container, container_id, item_list, modifier_
         item_list.append(item)
         return item_id
 
-def process_entity(entity, entity_list, item_list, villager_list, modifier_list, db):
-    e = entity_factory(entity)
+def process_entity(entity, entity_list, item_list, villager_list, modifier_list, ids):
+    e = EntityRecord(entity)
     pos = e.position
     color = get_sheep_color(e.color)
-    chested = e.get_attributev('ChestedHorse') == 1
-    tame = e.get_attributev('Tame') == 1
-    owner = e.owner
     uuid = e.uuid
 
-    # print(f'{uuid} | {e.id} | {e.get_attributev("Health")} | {pos} | {color} | {chested} | {tame} | {owner}')
     ## ArmorItems
-    items = e.get_attributev('ArmorItems')
-    if items:
+    if e.armor_items:
         slot = 0
-        for item in items:
-            # print(f'ArmorItem: {item}')
-            process_item(item, uuid, pos, 'armor', None, item_list, modifier_list, db, slot)
+        for item in e.armor_items:
+            process_item(item, uuid, pos, 'armor', None, item_list, modifier_list, ids, slot)
             slot += 1
     ## HandItems
-    items = e.get_attributev('HandItems')
-    if items:
+    if e.hand_items:
         slot = 0
-        for item in items:
-            # print(f'HandItem: {item}')
-            process_item(item, uuid, pos, 'hand', None, item_list, modifier_list, db, slot)
+        for item in e.hand_items:
+            process_item(item, uuid, pos, 'hand', None, item_list, modifier_list, ids, slot)
             slot += 1
     ## Items (chest)
-    items = e.get_attributev('Items')
-    if items:
+    if e.items:
         # Create an item for the entity itself
         fake_item = {'id': 'minecraft:' + e.id, 'Count': 1}
-        chest_id = process_item(fake_item, uuid, pos, 'entity', None, item_list, modifier_list, db, 0)
-        for item in items:
-            process_item(item, uuid, pos, e.id, chest_id, item_list, modifier_list, db)
+        chest_id = process_item(fake_item, uuid, pos, 'entity', None, item_list, modifier_list, ids, 0)
+        for item in e.items:
+            process_item(item, uuid, pos, e.id, chest_id, item_list, modifier_list, ids)
 
     # Item (contents of "item_frame" or "item")
     # 'item': a pile of things
     # 'item_frame': a frame that can hold items
-    item = e.get_attributev('Item')
-    if item:
+    if e.item:
         # Create an item for the entity itself
         fake_item = {'id': 'minecraft:' + e.id, 'Count': 1}
-        entity_id = process_item(fake_item, uuid, pos, 'entity', None, item_list, modifier_list, db, 0)
-        process_item(item, None, pos, e.id, entity_id, item_list, modifier_list, db, 0)
+        entity_id = process_item(fake_item, uuid, pos, 'entity', None, item_list, modifier_list, ids, 0)
+        process_item(e.item, None, pos, e.id, entity_id, item_list, modifier_list, ids, 0)
 
     # SaddleItem: {'type_id': 10, 'value': {'id': {'type_id': 8, 'value': 'minecraft:saddle'}, 'Count': {'type_id': 1, 'value': 1}}}
-    item = e.get_attributev('SaddleItem')
-    if item:
-        process_item(item, uuid, pos, 'saddle', None, item_list, modifier_list, db, 0)
+    if e.saddle_item:
+        process_item(e.saddle_item, uuid, pos, 'saddle', None, item_list, modifier_list, ids, 0)
 
     entity_list.append(
         {
             'Id': uuid,
             'type': e.id,
-            'health': e.get_attributev('Health'),
+            'health': e.health,
             'pos_x': pos[0],
             'pos_y': pos[1],
             'pos_z': pos[2],
             'color': color,
-            'chested': chested,
-            'tame': tame,
-            'owner': owner
+            'chested': e.chested,
+            'tame': e.tame,
+            'owner': e.owner
         })
     if e.is_type('villager'):
-        home = e.home['pos'] if e.home else [None, None, None]
-        meet = e.meeting_point['pos'] if e.meeting_point else [None, None, None]
+        home = e.home or [None, None, None]
+        meet = e.meeting_point or [None, None, None]
         villager_list.append(
             {
                 'Id': uuid,
-                'job': e.profession[10:],
+                'job': e.profession,
                 'home_x': home[0],
                 'home_y': home[1],
                 'home_z': home[2],
@@ -269,7 +267,7 @@ def process_entity(entity, entity_list, item_list, villager_list, modifier_list,
                 'meet_z': meet[2]
             })
 
-def process_entity_items(entity, item_list, modifier_list, db):
+def process_entity_items(entity, item_list, modifier_list, ids):
     if 'Items' in entity and len(entity['Items']) > 0:
         logging.info(f'--- ENTITY: {entity["id"].value[10:]} ({entity["x"].value}, {entity["y"].value}, {entity["z"].value})')
         x = y = z = None
@@ -287,7 +285,7 @@ def process_entity_items(entity, item_list, modifier_list, db):
             'id': entity['id'],
             'Count': 1
         }
-        fake_item_id = process_item(fake_item, None, pos, '', None, item_list, modifier_list, db, 0)
+        fake_item_id = process_item(fake_item, None, pos, '', None, item_list, modifier_list, ids, 0)
         if fake_item_id is not None:
             logging.info(f'Fake Entity Item: {item_list[-1:][0]}')
         for t in entity:
@@ -303,117 +301,139 @@ def process_entity_items(entity, item_list, modifier_list, db):
                         logging.info(f'{r[10:]:>15}: {entity[t][r].value}')
             elif t == 'Items':
                 for item in entity[t].value:
-                    process_item(item, None, pos, entity['id'].value[10:], fake_item_id, item_list, modifier_list, db)
+                    process_item(item, None, pos, entity['id'].value[10:], fake_item_id, item_list, modifier_list, ids)
                     # print(f'{"Slot":>10} {item["Slot"].value}: {item["id"].value[10:]} ({item["Count"].value})')
             else:
                 logging.info(f'{t:>10}: {entity[t].value}')
 
-def process_poi(region, db):
+def chunk_key(dtype, region_pos, cx, cz):
+    '''
+    Identify the chunk that a record was loaded from. Stored in the "chunk" column of each record so that
+    incremental imports can replace the records of a chunk when it changes.
+    '''
+    return f'{dtype}.{region_pos[0]}.{region_pos[1]}.{cx}.{cz}'
+
+def set_records_chunk(record_lists, starts, chunk):
+    '''
+    Set the chunk of the records appended to each list since starts was taken
+    '''
+    for records, start in zip(record_lists, starts):
+        for record in records[start:]:
+            record['chunk'] = chunk
+
+def import_state(region, dtype, file_stat, timestamps, present, changed):
+    '''
+    Bookkeeping returned with the records of a region task (see store_records)
+
+    timestamps: chunk timestamps from the last import (None for a full import)
+    present: chunk timestamps of the chunks in the file now
+    changed: keys of the chunks that were (re)loaded
+    '''
+    if timestamps:
+        # chunks that have been removed from the file since the last import
+        changed += [chunk_key(dtype, region.pos, cx, cz) for cx, cz in timestamps if (cx, cz) not in present]
+    return {
+        'replace': timestamps is not None,
+        'changed': changed,
+        'region': (dtype, region.pos[0], region.pos[1], file_stat.st_mtime_ns, file_stat.st_size, present)
+    }
+
+def process_poi(region, ids, timestamps=None):
     logging.info(f'Processing POI data for region {region.pos}...')
     et = ElapsedTime()
+    file_stat = os.stat(region.data_path('poi'))
+    present = region.get_timestamps('poi')
+    changed = []
     poi_list = []
     count = 0
-    for cx in range(Chunk.BLOCK_WIDTH):
-        for cy in range(Chunk.BLOCK_WIDTH):
-            poi_chunk = region.get_r_chunk('poi', cx, cy)
-            if poi_chunk:
-                logging.debug(f'Loading poi chunk {cx}, {cy}...')
-                sections = poi_chunk.get_tag('Sections')
-                if sections is None:
-                    continue
-                for sec in sections:
-                    if SHUTTING_DOWN:
-                        return
-                    # v = sections[sec]['Valid'].value
-                    recs = sections[sec]['Records']
-                    for rec in recs:
-                        count += 1
-                        pos = rec['pos'].value
-                        free_tickets = rec['free_tickets'].value
-                        if free_tickets is None:
-                            logging.warning('free_tickets is None')
-                            free_tickets = 0
-                        rtype = rec['type'].value[10:]
-                        poi_list.append({
-                            'x': pos[0],
-                            'y': pos[1],
-                            'z': pos[2],
-                            'type': rtype,
-                            'free': free_tickets
-                        })
-    if len(poi_list) > 0:
-        logging.info(f'adding {len(poi_list)} POIs')
-        db.insert_poi_records(poi_list)
-        poi_list = []
+    for cx, cz, timestamp, poi_chunk in region.iter_chunks('poi', known_timestamps=timestamps, tags=('Sections',)):
+        logging.debug(f'Loading poi chunk {cx}, {cz}...')
+        chunk = chunk_key('poi', region.pos, cx, cz)
+        changed.append(chunk)
+        sections = poi_chunk.get_tag('Sections')
+        if sections is None:
+            continue
+        for sec in sections:
+            if SHUTTING_DOWN:
+                return
+            # v = sections[sec]['Valid'].value
+            recs = sections[sec]['Records']
+            for rec in recs:
+                count += 1
+                pos = rec['pos'].value
+                free_tickets = rec['free_tickets'].value
+                if free_tickets is None:
+                    logging.warning('free_tickets is None')
+                    free_tickets = 0
+                rtype = rec['type'].value[10:]
+                poi_list.append({
+                    'x': pos[0],
+                    'y': pos[1],
+                    'z': pos[2],
+                    'type': rtype,
+                    'free': free_tickets,
+                    'chunk': chunk
+                })
     logging.info(f'Processed {count} poi records ({et.elapsed_time_str()})')
+    return {'poi': poi_list, 'state': import_state(region, 'poi', file_stat, timestamps, present, changed)}
 
-def process_regions(region, db):
+def process_regions(region, ids, timestamps=None):
     logging.info(f'Processing Region data for region {region.pos}...')
     et = ElapsedTime()
+    file_stat = os.stat(region.data_path('region'))
+    present = region.get_timestamps('region')
+    changed = []
     item_list = []
     modifier_list = []
     count = 0
     total_size = 0
-    for cx in range(Chunk.BLOCK_WIDTH):
-        for cy in range(Chunk.BLOCK_WIDTH):
-            if SHUTTING_DOWN:
-                return
-            region_chunk = region.get_r_chunk('region', cx, cy)
-            total_size += region_chunk.size
-            block_entities = region_chunk.get_tag('block_entities')
-            if block_entities:
-                logging.info(f'Loading regions block_entities from chunk {cx}, {cy}... (chunk size: {region_chunk.size})')
-                for entity in block_entities:
-                    count += 1
-                    process_entity_items(entity, item_list, modifier_list, db)
-    if len(item_list) > 0:
-        logging.info(f'adding {len(item_list)} items')
-        db.insert_items_records(item_list)
-        item_list = []
-    if len(modifier_list) > 0:
-        logging.info(f'adding {len(modifier_list)} modifiers')
-        db.insert_item_modifiers_records(modifier_list)
-        modifier_list = []
-    logging.info(f'Processed {count} block entities in region. TOTAL SIZE: {total_size} TIME: {et.elapsed_time_str()}, {total_size/et.get_elapsed_time():.0f} BPS')
-
-def process_entities(region, db):
+    for cx, cz, timestamp, region_chunk in region.iter_chunks('region', known_timestamps=timestamps, tags=('block_entities',)):
+        if SHUTTING_DOWN:
+            return
+        chunk = chunk_key('region', region.pos, cx, cz)
+        changed.append(chunk)
+        total_size += region_chunk.size
+        block_entities = region_chunk.get_tag('block_entities')
+        if block_entities:
+            logging.info(f'Loading regions block_entities from chunk {cx}, {cz}... (chunk size: {region_chunk.size})')
+            start = len(item_list)
+            for entity in block_entities:
+                count += 1
+                process_entity_items(entity, item_list, modifier_list, ids)
+            set_records_chunk((item_list,), (start,), chunk)
+    logging.info(f'Processed {count} block entities in region. TOTAL SIZE: {total_size} TIME: {et.elapsed_time_str()}, {total_size/max(et.get_elapsed_time(), 0.001):.0f} BPS')
+    return {'items': item_list, 'item_modifiers': modifier_list,
+            'state': import_state(region, 'region', file_stat, timestamps, present, changed)}
+
+def process_entities(region, ids, timestamps=None):
     logging.info(f'Processing entities for region {region.pos}...')
     et = ElapsedTime()
+    file_stat = os.stat(region.data_path('entities'))
+    present = region.get_timestamps('entities')
+    changed = []
     count = 0
-    for cx in range(Chunk.BLOCK_WIDTH):
-        for cy in range(Chunk.BLOCK_WIDTH):
-            # print(f'Loading chunk {cx}, {cy}...')
-            entity_chunk = region.get_r_chunk('entities', cx, cy)
-            entities = entity_chunk.entities
-            entity_list = []
-            villager_list = []
-            item_list = []
-            modifier_list = []
-            for entity in entities:
-                if SHUTTING_DOWN:
-                    return
-                count += 1
-                process_entity(entity, entity_list, item_list, villager_list, modifier_list, db)
-
-    if len(entity_list) > 0:
-        logging.info(f'adding {len(entity_list)} entities')
-        db.insert_entity_records(entity_list)
-        entity_list = []
-    if len(villager_list) > 0:
-        logging.info(f'adding {len(villager_list)} villagers')
-        db.insert_villager_records(villager_list)
-        villager_list = []
-    if len(item_list) > 0:
-        logging.info(f'adding {len(item_list)} items')
-        db.insert_items_records(item_list)
-        item_list = []
-    if len(modifier_list) > 0:
-        logging.info(f'adding {len(modifier_list)} modifiers')
-        db.insert_item_modifiers_records(modifier_list)
-        modifier_list = []
+    entity_list = []
+    villager_list = []
+    item_list = []
+    modifier_list = []
+    # item_modifiers are tied to their chunk through the item records
+    record_lists = (entity_list, villager_list, item_list)
+    for cx, cz, timestamp, entity_chunk in region.iter_chunks('entities', known_timestamps=timestamps, tags=('Entities',)):
+        # print(f'Loading chunk {cx}, {cz}...')
+        chunk = chunk_key('entities', region.pos, cx, cz)
+        changed.append(chunk)
+        starts = [len(records) for records in record_lists]
+        for entity in entity_chunk.entities:
+            if SHUTTING_DOWN:
+                return
+            count += 1
+            process_entity(entity, entity_list, item_list, villager_list, modifier_list, ids)
+        set_records_chunk(record_lists, starts, chunk)
     logging.info(f'Processed {count} entities in entities data ({et.elapsed_time_str()})')
+    return {'entities': entity_list, 'villagers': villager_list, 'items': item_list, 'item_modifiers': modifier_list,
+            'state': import_state(region, 'entities', file_stat, timestamps, present, changed)}
 
-def process_player(player, db):
+def process_player(player, ids, timestamps=None):
     logging.info('Processing Player data...')
     et = ElapsedTime()
     item_list = []
@@ -423,7 +443,7 @@ def process_player(player, db):
     vehicle = player.get_vehicle()
     if vehicle and 'Entity' in vehicle:
         entity = vehicle['Entity']
-        process_entity(entity, entity_list, item_list, villager_list, modifier_list, db)
+        process_entity(entity, entity_list, item_list, villager_list, modifier_list, ids)
     pos = player.position
     entity_list.append({
         'Id': player.uuid,
@@ -449,38 +469,82 @@ def process_player(player, db):
             elif slot == -106:
                 container = 'hand'
                 slot = 0
-        i = process_item(item, player.uuid, pos, container, None, item_list, modifier_list, db, slot)
-
-    if len(entity_list) > 0:
-        db.insert_entity_records(entity_list)
-    if len(item_list) > 0:
-        db.insert_items_records(item_list)
-    if len(villager_list) > 0:
-        db.insert_villager_records(villager_list)
-    if len(modifier_list) > 0:
-        db.insert_item_modifiers_records(modifier_list)
+        i = process_item(item, player.uuid, pos, container, None, item_list, modifier_list, ids, slot)
+    # player data is always reloaded
+    set_records_chunk((entity_list, villager_list, item_list), (0, 0, 0), 'player')
     logging.info(f'Processed Player data ({et.elapsed_time_str()})')
+    return {'entities': entity_list, 'villagers': villager_list, 'items': item_list, 'item_modifiers': modifier_list,
+            'state': {'replace': True, 'changed': ['player'], 'region': None}}
 
-def setup_logging(args):
-    level = getattr(logging, args.loglevel.upper(), None)
+TASK_COMMANDS = {
+    'player': process_player,
+    'regions': process_regions,
+    'entities': process_entities,
+    'poi': process_poi
+}
+
+RECORD_TABLES = ('entities', 'villagers', 'items', 'item_modifiers', 'poi')
+
+class LocalRecordIds:
+    '''
+    Record id source for worker processes, which do not have access to the database.
+
+    Ids are handed out starting at 0. The writer process reserves a block of real ids
+    from the database and rebases the records onto it (see rebase_record_ids)
+    '''
+    def __init__(self):
+        self.count = 0
+
+    def next_record_id(self):
+        record_id = self.count
+        self.count += 1
+        return record_id
+
+def rebase_record_ids(records, base):
+    '''
+    Add base to every record id created by a LocalRecordIds object
+    '''
+    for item in records.get('items', []):
+        item['Id'] += base
+        if item['container_item'] is not None:
+            item['container_item'] += base
+    for modifier in records.get('item_modifiers', []):
+        modifier['item_id'] += base
+
+def store_records(db, records):
+    state = records.get('state', None)
+    if state and state['replace'] and len(state['changed']) > 0:
+        logging.info(f'replacing records from {len(state["changed"])} chunks')
+        db.delete_chunk_records(state['changed'])
+    for table in RECORD_TABLES:
+        rows = records.get(table, [])
+        if len(rows) > 0:
+            logging.info(f'adding {len(rows)} {table} records')
+            db.insert_records(table, rows)
+    if state and state['region']:
+        db.save_region_state(*state['region'])
+
+def task_region(worldpath, pos):
+    if len(pos) == 2:
+        return Region(worldpath, pos[0], pos[1])
+    x, y = World.pos_to_xy(pos)
+    return Region.from_position_xy(worldpath, x, y)
+
+def setup_logging(loglevel):
+    level = getattr(logging, loglevel.upper(), None)
     if not isinstance(level, int):
         raise ValueError(f'Invalid log level: {level}')
-    lformat = '%(levelname)s:%(asctime)s:%(threadName)s:%(message)s'
+    lformat = '%(levelname)s:%(asctime)s:%(processName)s:%(threadName)s:%(message)s'
     filename = 'load_database.log'
     logging.basicConfig(level=level, format=lformat, filename=filename)
 
-def thread_runner(qlen, q, worldpath, dbfile):
+def thread_runner(qlen, q, worldpath, dbfile, writer=None):
     try:
         have_task = False
-        cmdmap = {
-            'player': process_player,
-            'regions': process_regions,
-            'entities': process_entities,
-            'poi': process_poi
-        }
         me = threading.current_thread()
         base_name = me.name
         db = Database(dbfile, create_tables=False)
+        ids = RecordIdAllocator(db)
         while True:
             if SHUTTING_DOWN:
                 return False
@@ -495,26 +559,25 @@ def thread_runner(qlen, q, worldpath, dbfile):
             logging.info(f'Got task: {cmd}')
             have_task = True
             if cmd and data:
-                if not cmd in cmdmap:
+                if not cmd in TASK_COMMANDS:
                     logging.error(f'BAD CMD: {cmd}')
                 else:
                     # rename the thread to something useful
-                    region = None
+                    timestamps = None
                     if cmd != 'player':
                         logging.debug(f'DATA: {data}')
-                        pos = data.get('pos', None)
-                        if len(pos) == 2:
-                            data = Region(worldpath, pos[0], pos[1])
-                        elif len(pos) == 3:
-                            x, y = World.pos_to_xy(pos)
-                            data = Region.from_position_xy(worldpath, x, y)
+                        timestamps = data.get('timestamps', None)
+                        data = task_region(worldpath, data.get('pos', None))
                     taskname = f'{base_name}.{cmd}' if cmd == 'player' else f'{base_name}.{cmd}{data.pos}'
                     pct = ((qlen - tasks_remaining) / qlen) * 100
                     logging.info(f'START TASK: {taskname} ({qlen - tasks_remaining} of {qlen}: {pct:.1f}%)')
                     me.name = taskname
-                    cmdmap[cmd](data, db)
+                    records = TASK_COMMANDS[cmd](data, ids, timestamps)
+                    if cmd != 'player':
+                        data.close()
                     if SHUTTING_DOWN:
                         return False
+                    store_records(writer or db, records)
                     logging.info(f'TASK COMPLETE')
                     me.name = base_name
 
@@ -528,6 +591,61 @@ def thread_runner(qlen, q, worldpath, dbfile):
         if have_task:
             q.task_done()
 
+def process_task(worldpath, cmd, pos, timestamps=None):
+    '''
+    Run one task in a worker process.
+
+    Returns (records, id_count): the records to insert and the number of local record ids used
+    '''
+    ids = LocalRecordIds()
+    if cmd == 'player':
+        records = TASK_COMMANDS[cmd](Player(worldpath), ids, timestamps)
+    else:
+        with task_region(worldpath, pos) as region:
+            records = TASK_COMMANDS[cmd](region, ids, timestamps)
+    return records, ids.count
+
+def process_runner(q, worldpath, db, loglevel, processes, writer=None):
+    '''
+    Parse the tasks in a pool of worker processes. This process is the only writer to the database.
+    '''
+    tasks = []
+    while not q.empty():
+        task = q.get()
+        cmd = task.get('cmd', None)
+        pos = timestamps = None
+        if cmd != 'player':
+            pos = task['data'].get('pos', None)
+            timestamps = task['data'].get('timestamps', None)
+        tasks.append((cmd, pos, timestamps))
+    qlen = len(tasks)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=setup_logging,
+                                                initargs=(loglevel,)) as executor:
+        futures = {}
+        for cmd, pos, timestamps in tasks:
+            taskname = cmd if cmd == 'player' else f'{cmd}{pos}'
+            futures[executor.submit(process_task, worldpath, cmd, pos, timestamps)] = taskname
+        completed = 0
+        for future in concurrent.futures.as_completed(futures):
+            if SHUTTING_DOWN:
+                for f in futures:
+                    f.cancel()
+                return False
+            completed += 1
+            taskname = futures[future]
+            try:
+                records, id_count = future.result()
+            except Exception as e:
+                logging.exception(f'##### TASK {taskname} FAILED: {e}')
+                continue
+            if records is None:
+                continue
+            if id_count > 0:
+                rebase_record_ids(records, db.reserve_record_ids(id_count))
+            store_records(writer or db, records)
+            logging.info(f'TASK COMPLETE: {taskname} ({completed} of {qlen}: {completed / qlen * 100:.1f}%)')
+    return True
+
 def thread_launcher(**kwargs):
     logging.info('Launch Thread')
     qlen = kwargs.get('qlen', None)
@@ -542,52 +660,107 @@ def thread_launcher(**kwargs):
         logging.error('Database file path not passed into thread launcher')
         return False
 
-    return thread_runner(qlen, q, worldpath, dbfile)
+    return thread_runner(qlen, q, worldpath, dbfile, kwargs.get('writer', None))
 
-def setup_database(dbfile):
+def setup_database(dbfile, incremental=False, bulk=False):
     '''
     Force the tables to all be created before accessing via threads.
+
+    For an incremental import an existing database is kept as long as its records
+    carry the chunk they were loaded from.
     '''
     if os.path.exists(dbfile):
+        if incremental:
+            db = Database(dbfile, bulk=bulk)
+            if db.has_chunk_records():
+                return db
+            db.close()
+            logging.warning('DB file was not created with chunk information. Doing a full import')
         logging.warning('DB file exists. Deleting')
         os.remove(dbfile)
-    db = Database(args.dbfile)
+    return Database(dbfile, bulk=bulk)
+
+TASK_DTYPES = {'regions': 'region', 'entities': 'entities', 'poi': 'poi'}
 
-def load_queue(worldpath, playeronly):
+def region_chunk_keys(dtype, region_pos):
+    '''
+    Keys of all of the chunks a region file can hold
+    '''
+    width = mca.Mca.DIMENSION_SIZE
+    return [chunk_key(dtype, region_pos, cx, cz) for cz in range(width) for cx in range(width)]
+
+def delete_removed_regions(db, region_files, catalog):
+    '''
+    Delete the records and saved state of region files recorded by the last import that are no longer in
+    the (refreshed) catalog.
+
+    Returns the number of region files removed
+    '''
+    removed = 0
+    for dtype, rx, rz in region_files:
+        if not catalog.has_region(dtype, rx, rz):
+            logging.info(f'Removing records of deleted region file {dtype} {(rx, rz)}')
+            db.delete_region(dtype, rx, rz, region_chunk_keys(dtype, (rx, rz)))
+            removed += 1
+    return removed
+
+def region_positions(worldpath, dtype, catalog=None):
+    '''
+    Sorted (rx, rz) of the region files of type dtype, from the catalog if there is one
+    '''
+    if catalog is not None:
+        return catalog.get_region_positions(dtype)
+    return sorted((rx, rz) for rx, rz, path in region_stats.region_files(worldpath, dtype))
+
+def load_queue(worldpath, playeronly, db=None):
+    '''
+    Create the queue of tasks.
+
+    If db is set (incremental import) the records of region files deleted since the last import are
+    removed, region files that are unchanged since the last import are skipped and the other tasks
+    get the chunk timestamps from the last import.
+    '''
     q = queue.Queue()
+    catalog = None
+    if db:
+        # the catalog only reads the headers of the region files that changed since it was last refreshed.
+        # A full import lists the data directories instead, so it writes nothing under the home directory
+        catalog = WorldCatalog(worldpath)
+        catalog.refresh()
     player = Player(worldpath)
     q.put({'cmd': 'player', 'data': player})
     if playeronly:
         pos = player.position
-        data = {
-            'pos': pos
-        }
-        q.put({'cmd': 'regions', 'data': {'pos': pos}})
-        q.put({'cmd': 'entities', 'data': {'pos': pos}})
-        q.put({'cmd': 'poi', 'data': {'pos': pos}})
+        region = Region.from_position_xy(worldpath, pos[0], pos[2])
+        positions = {cmd: [region.pos] for cmd in TASK_DTYPES}
     else:
-        files = os.listdir(f'{worldpath}/region')
-        # NOTE: mapping the pos to ints is not strictly necessary, but it makes the logs
-        # easier to read
-        for f in files:
-            pos = list(map(int, f.split('.')[1:-1]))
-            logging.debug(f'Adding {f}...{pos}')
-            q.put({'cmd': 'regions', 'data': {'pos': pos}})
-        files = os.listdir(f'{worldpath}/entities')
-        for f in files:
-            pos = list(map(int, f.split('.')[1:-1]))
-            logging.debug(f'Adding {f}...{pos}')
-            q.put({'cmd': 'entities', 'data': {'pos': pos}})
-        files = os.listdir(f'{worldpath}/poi')
-        for f in files:
-            pos = list(map(int, f.split('.')[1:-1]))
-            logging.debug(f'Adding {f}...{pos}')
-            q.put({'cmd': 'poi', 'data': {'pos': pos}})
+        positions = {cmd: [list(pos) for pos in region_positions(worldpath, dtype, catalog)]
+                     for cmd, dtype in TASK_DTYPES.items()}
+    region_files = db.get_region_files() if db else {}
+    if db:
+        removed = delete_removed_regions(db, region_files, catalog)
+        logging.info(f'Removed the records of {removed} deleted region files')
+    skipped = 0
+    for cmd, dtype in TASK_DTYPES.items():
+        for pos in positions[cmd]:
+            data = {'pos': pos}
+            if db:
+                file_stat = catalog.get_file_stat(dtype, pos[0], pos[1])
+                if file_stat is None:
+                    continue
+                if region_files.get((dtype, pos[0], pos[1])) == file_stat:
+                    skipped += 1
+                    continue
+                data['timestamps'] = db.get_chunk_timestamps(dtype, pos[0], pos[1])
+            logging.debug(f'Adding {cmd}...{pos}')
+            q.put({'cmd': cmd, 'data': data})
+    if db:
+        logging.info(f'Skipping {skipped} unchanged region files')
     return q
 
 if __name__ == '__main__':
     args = parse_args()
-    setup_logging(args)
+    setup_logging(args.loglevel)
     logging.info('******************************')
     logging.info(f'* START {os.path.basename(sys.argv[0])}')
     logging.info(f'* pycraft v{pycraft_version}')
@@ -598,22 +771,36 @@ if __name__ == '__main__':
         raise Exception('World path must be specified on commandline (--worldpath) or via environment var WORLDPATH')
     if not os.path.isdir(worldpath):
         raise Exception(f'Specified world path does not exist: "{worldpath}"')
-    setup_database(args.dbfile)
-
-    q = load_queue(worldpath, args.playeronly)
-    queue_length = q.qsize()
-    logging.info(f'{queue_length} Tasks to perform')
-    if args.threads == 0:
-        args.threads = queue_length
-        logging.info(f'Setting number of threads to {queue_length}')
-    threads = []
-    for i in range(args.threads):
-        t = threading.Thread(target=thread_launcher, name=f'w.{i:03}', kwargs={'queue': q, 'dbfile': args.dbfile, 'qlen': queue_length, 'world': worldpath})
-        t.start()
-        threads.append(t)
-
-    # wait for all of the threads to complete
-    for t in threads:
-        while t.is_alive():
-            t.join(1)
+    db = setup_database(args.dbfile, args.incremental, args.bulk)
+    writer = BulkWriter(db, args.batch_rows, args.batch_seconds) if args.bulk else None
+
+    try:
+        q = load_queue(worldpath, args.playeronly, db if args.incremental else None)
+        queue_length = q.qsize()
+        logging.info(f'{queue_length} Tasks to perform')
+        if args.processes != 0:
+            processes = os.cpu_count() if args.processes < 0 else args.processes
+            logging.info(f'Running tasks in {processes} processes')
+            process_runner(q, worldpath, db, args.loglevel, processes, writer)
+        else:
+            if args.threads == 0:
+                args.threads = queue_length
+                logging.info(f'Setting number of threads to {queue_length}')
+            threads = []
+            for i in range(args.threads):
+                t = threading.Thread(target=thread_launcher, name=f'w.{i:03}', kwargs={'queue': q, 'dbfile': args.dbfile, 'qlen': queue_length, 'world': worldpath, 'writer': writer})
+                t.start()
+                threads.append(t)
+
+            # wait for all of the threads to complete
+            for t in threads:
+                while t.is_alive():
+                    t.join(1)
+        if writer:
+            writer.flush()
+            writer.log_stats()
+    finally:
+        # create the deferred indexes and restore the journal even if the import failed
+        if args.bulk:
+            db.end_bulk_import()
     logging.info(f'All Done (TOTAL ELAPSED TIME: {main_et.elapsed_time_str()}')
@@ -12,7 +12,8 @@ from pygame_gui.windows import UIMessageWindow
 import pycraft_gui
 from pycraft_gui import PycraftGuiApp, PYCRAFT_WORLD_CHANGED
 
-from pycraft.map import Map
+from pycraft.map import MapData
+from pycraft.map_cache import MapCache
 
 GAP = 10
 
@@ -26,29 +27,28 @@ class PycraftMapElement(UIImage):
                  rr: pygame.Rect,
                  manager: IUIManagerInterface,
                  container: Union[IContainerLikeInterface, None],
-                 image_dir: str,
-                 pycraft_map: Map):
+                 map_cache: MapCache,
+                 map_path: str,
+                 map_data: MapData):
         """
-        Create a PycraftMapElement object. Creates an image using PIL,
-        saves the image to a PNG then loads the image into a surface.
-
-        Probably more efficient ways to do this, but this was quick and seems
-        to be performant enough for my needs.
+        Create a PycraftMapElement object. Loads the map image PNG from the
+        map cache into a surface. The image is only rendered (using PIL) if
+        the map has changed since it was last cached.
 
         Parameters:
         - rr: Relative Rectangle
         - manager: the UIManager for the app
         - container: The container object.
-        - image_dir: directory where temporary map PNG files are stored.
-        - pycraft_map: A pycraft.Map object with the map loaded into it
+        - map_cache: MapCache where the map PNG files are stored.
+        - map_path: Path to the map file
+        - map_data: A pycraft.map.MapData object with the map loaded into it
         """
-        self._pycraft_map = pycraft_map
-        img = pycraft_map.create_image()
-        outpath = os.path.join(image_dir, os.path.basename(pycraft_map.path)[:-4] + '.png')
-        img.save(outpath)
+        self._map_path = map_path
+        self._pycraft_map = map_data
+        outpath = map_cache.get_image_path(map_path, mapdata=map_data)
         surface = pygame.image.load_extended(outpath)
         super().__init__(rr, surface, manager, container=container)
-        self._width = img.width
+        self._width = map_data.get_width()
 
     def get_origin(self):
         """
@@ -68,7 +68,7 @@ class PycraftMapElement(UIImage):
         """
         Path to the map file displayed by this object.
         """
-        return self._pycraft_map.path
+        return self._map_path
 
 
 class PycraftMapPanel(UIPanel):
@@ -85,9 +85,7 @@ class PycraftMapPanel(UIPanel):
         self._tops = []
         self._lefts = []
         self._map_elements = []
-        self._image_dir = os.path.join(str(Path.home()), '.pycraft/maps/')
-        if not os.path.exists(self._image_dir):
-            os.makedirs(self._image_dir)
+        self._map_cache = MapCache(os.path.join(str(Path.home()), '.pycraft/maps/'))
 
     def reset(self):
         """
@@ -101,14 +99,19 @@ class PycraftMapPanel(UIPanel):
         self._lefts = []
         self._map_elements = []
 
-    def add_map(self, pycraft_map: Map):
+    @property
+    def map_cache(self):
+        return self._map_cache
+
+    def add_map(self, map_path: str, map_data: MapData):
         """
         Add a map to the Map Panel.
 
         Parameters:
-        - pycraft_map: a pycraft map object
+        - map_path: path to the map file
+        - map_data: the decoded map (pycraft.map.MapData)
         """
-        origin = pycraft_map.get_origin()
+        origin = map_data.get_origin()
 
         map_block_left = origin[0]
         self._insert_left(map_block_left)
@@ -117,7 +120,7 @@ class PycraftMapPanel(UIPanel):
         self._insert_top(map_block_top)
 
         rr = pygame.Rect(0, 0, 128, 128)
-        map_element = PycraftMapElement(rr, self.ui_manager, self, self._image_dir, pycraft_map)
+        map_element = PycraftMapElement(rr, self.ui_manager, self, self._map_cache, map_path, map_data)
         self._map_elements.append(map_element)
 
         self._do_layout()
@@ -255,10 +258,11 @@ class PycraftMapToolApp(PycraftGuiApp):
             msg_win.show()
             return
         for f in mapfilelist:
-            mobj = Map(f)
+            # decoded maps come from the map cache unless the map file changed
+            mobj = self._map_panel.map_cache.get_map_data(f)
             # currently we only look at fully zoomed maps (zoom = 4)
             if mobj.get_zoom() == 4:
-                self._map_panel.add_map(mobj)
+                self._map_panel.add_map(f, mobj)
                 # run the event loop once so that the screen updates
                 # It would probably be better to use threads, but this
                 # way worked and it was easy.
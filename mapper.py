@@ -8,6 +8,8 @@ import sys
 def parse_args():
     parser = argparse.ArgumentParser(description='Create image files of minecraft maps')
     parser.add_argument('config_file', type=str, help='Configuration file')
+    parser.add_argument('--tiles', '-t', type=str, default=None, help='Write a z/x/y tile pyramid to this directory instead of bigmap.png. Only changed tiles are updated')
+    parser.add_argument('--max-zoom', type=int, default=None, help='Zoom level of the most detailed tiles [default: just enough levels for the map grid to fit in one tile at level 0]')
     return parser.parse_args()
 
 if __name__ == '__main__':
@@ -15,6 +17,11 @@ if __name__ == '__main__':
     if not os.path.exists(args.config_file):
         print(f'Config file not found: "{args.config_file}"')
         sys.exit(1)
-    map_image = MapImage(args.config_file)
-    map_image.create_image()
-    map_image.save_image('bigmap.png')
+    # tiles are rendered a row of maps at a time, only stitched images need all of the maps in memory
+    map_image = MapImage(args.config_file, load_maps=not args.tiles)
+    if args.tiles:
+        count = map_image.create_tiles(args.tiles, max_zoom=args.max_zoom)
+        print(f'Wrote {count} tiles to {args.tiles}')
+    else:
+        map_image.create_image()
+        map_image.save_image('bigmap.png')
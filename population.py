@@ -3,157 +3,101 @@ from pycraft import Player
 from pycraft import World
 from pycraft import Entity
 
-from pycraft.chunk import Chunk
+from pycraft.census import Census
+from pycraft.census import area_regions
+from pycraft.census import entity_filter
+from pycraft.census import take_census
 from pycraft.entity import entity_factory
+from pycraft.util import ElapsedTime
 
 import argparse
+import math
 import sys
-import json
 
 def parse_args():
-    parser = argparse.ArgumentParser(description='Take a census of the user\'s region')
+    parser = argparse.ArgumentParser(description='Take a census of the entities in the player\'s region')
     parser.add_argument('worldpath', type=str, help='Path to saved world')
+    parser.add_argument('--all', '-a', action='store_true', help='Take a census of the whole world')
+    parser.add_argument('--region', type=str, action='append', default=None, help='Take a census of this region, as "rx,rz". Can be repeated')
+    parser.add_argument('--bbox', '-b', type=str, default=None, help='Take a census inside "x0,z0,x1,z1" (block coordinates)')
+    parser.add_argument('--radius', '-r', type=int, default=None, help='Take a census within this many blocks (horizontally) of the player')
+    parser.add_argument('--type', '-t', type=str, default=None, help='Comma separated list of entity types to count (e.g. villager,cat)')
+    parser.add_argument('--processes', '-P', type=int, default=None, help='Number of worker processes. [default: one per core]')
     return parser.parse_args()
 
-def add_entity(e, entity_count, number=1):
-    if not e in entity_count:
-        entity_count[e] = 0
-    entity_count[e] += number
-
-def process_entity(e, entity_count):
-    print(f'Entity: {e.id} | {e.uuid} | pos {e.position} | health {e.get_attributev("Health")}')
-    if e:
-        if e.is_type('item'):
-            item = e.get_attribute('Item')
-            if item and 'id' in item:
-                item_id = item['id'].value
-                item_count = item['Count'].value
-                if item_id.startswith('minecraft:'):
-                    item_id = item_id[10:]
-                add_entity(item_id, entity_count, number=item_count)
+def show_vehicle(player):
+    v = player.get_vehicle()
+    if not v:
+        return
+    v_ent = entity_factory(v['Entity'])
+    print('Player Vehicle:')
+    print(f' - {v_ent.id}: {v_ent.uuid}')
+    a = v_ent.owner
+    if a:
+        if a == player.uuid:
+            print(f'        Owner: Player')
         else:
-            add_entity(e.id, entity_count)
-        if e.is_type('villager'):
-            home = e.home['pos'] if e.home else 'HOMELESS'
-            print(f'   HOME: {home}')
-            job = e.profession if e.profession else 'Unemployed'
-            print(f'    JOB: {job}')
-            village = e.meeting_point['pos'] if e.meeting_point else 'Vagrant'
-            print(f'VILLAGE: {village}')
-        if e.owner:
-            if e.owner == player._uuid:
-                print(f'   Owner: PLAYER')
-            else:
-                print(f'  Player: {player._uuid}')
-                print(f'   Owner: {e.owner}')
-    
-def process_entities(entities, entity_count):
-    for entity in entities:
-        e = entity_factory(entity)
-        process_entity(e, entity_count)
-
-def process_region(region, player=None):
-    entity_count = {}
-    if player:
-        v = player.get_vehicle()
-        if v and 'Entity' in v:
-            v_ent = entity_factory(v['Entity'])
-            process_entity(v_ent, entity_count)
-
-    for cx in range(Chunk.BLOCK_WIDTH):
-        for cy in range(Chunk.BLOCK_WIDTH):
-            entity_chunk = region.get_r_chunk('entities', cx, cy)
-            # print(f'    {entity_chunk.position()}')
-            entities = entity_chunk.entities
-            process_entities(entities, entity_count)
-
-    for k in entity_count:
-        print(f'{k:>20}: {entity_count[k]}')
+            print(f'        Owner: {a}')
+    a = v_ent.get_attribute('Tame')
+    if a:
+        print(f'         Tame: {a.value}')
+    a = v_ent.get_attribute('Leash')
+    if a:
+        print(f'        Leash: {a.json_obj(full_json=False)}')
+    a = v_ent.chest
+    if a:
+        print(f'        Chest:')
+        for i in a:
+            t = i["id"].value
+            if t.startswith('minecraft'):
+                t = t[10:]
+            print(f'          - {i["Slot"].value}: {i["Count"].value} {t}')
+    a = v_ent.get_attribute('SaddleItem')
+    if a:
+        print(f'       Saddle: {a.value}')
 
 if __name__ == '__main__':
     args = parse_args()
+    world = World(args.worldpath)
     player = Player(args.worldpath)
     print(f'Player: {player.uuid}')
-    alist = player.get_attr_list()
-    v = player.get_vehicle()
-    if v:
-        v_ent = entity_factory(v['Entity']
-                               )
-        print('Player Vehicle:')
-        print(f' - {v_ent.id}: {v_ent.uuid}')
-        a = v_ent.owner
-        if a:
-            if a == player.uuid:
-                print(f'        Owner: Player')
-            else:
-                print(f'        Owner: {a}')
-        a = v_ent.get_attribute('Tame')
-        if a:
-            print(f'         Tame: {a.value}')
-        a = v_ent.get_attribute('Leash')
-        if a:
-            print(f'        Leash: {a.json_obj(full_json=False)}')
-        a = v_ent.chest
-        if a:
-            print(f'        Chest:')
-            for i in a:
-                t = i["id"].value
-                if t.startswith('minecraft'):
-                    t = t[10:]
-                print(f'          - {i["Slot"].value}: {i["Count"].value} {t}')
-        a = v_ent.get_attribute('SaddleItem')
-        if a:
-            print(f'       Saddle: {a.value}')
-        # print(f'{v_ent.get_attribute_list()}')
-
-    world = World(args.worldpath)
-    print(f'Player position: {player.position}')
-    region = player.get_region()
-    print(f' - region: {region._fname}')
-    region_tags = {}
-    entity_tags = {}
-    poi_tags = {}
-
+    show_vehicle(player)
     player_pos = player.position
-    print(f'PLAYER CHUNK: {player.chunk_position}')
-    print(f'    Expected: 13, 12 (13, 172)')
-    process_region(region, player)
-    sys.exit(1)
-    # chunk = world.get_chunk(player_pos, 'entities')
-    # chunk_tags = chunk.get_tags()
-    # if not chunk_tags:
-    #     print(f'No tags in player\'s chunk')
-    # else:
-    #     for tag in chunk_tags:
-    #         entity_tags[tag] = 1
-    #         print(f'{tag}: {chunk_tags[tag]}')
-    # sys.exit()
+    print(f'Player position: {player_pos}')
 
-    # look at the N x N chunks surrounding the player
-    CHUNK_SIZE = 16
-    print(f'-------- START {CHUNK_SIZE*2+1}x{CHUNK_SIZE*2+1}')
-    cx0 = player_pos[0] - CHUNK_SIZE * 16
-    cx1 = player_pos[0] + CHUNK_SIZE * 16
-    cy0 = player_pos[2] - CHUNK_SIZE * 16
-    cy1 = player_pos[2] + CHUNK_SIZE * 16
-    cy = cy0
+    bbox = None
+    center = None
+    radius = None
+    types = args.type.split(',') if args.type else None
+    if args.bbox:
+        bbox = tuple(int(v) for v in args.bbox.split(','))
+        if len(bbox) != 4:
+            print('bbox must be "x0,z0,x1,z1"')
+            sys.exit(1)
+    if args.radius is not None:
+        center = player_pos
+        radius = args.radius
+    if args.region:
+        regions = [tuple(int(v) for v in r.split(',')) for r in args.region]
+    elif args.all or bbox or radius is not None:
+        regions = area_regions(world.get_region_positions('entities'), bbox, center, radius)
+    else:
+        # the player's region
+        regions = [(math.floor(player_pos[0] / 512), math.floor(player_pos[2] / 512))]
 
-    chunk_collection = {}
-    entity_count = {}
-    while cy <= cy1:
-        cx = cx0
-        while cx <= cx1:
-            cpos = (cx, player_pos[1], cy)
-            print(f'--- CHUNK {cx}, {cy}')
-            entity_chunk = world.get_r_chunk(cpos, 'entities')
-            # find mob data
-            if entity_chunk:
-                print(f'    {entity_chunk.position()}')
-                entities = entity_chunk.entities
-                process_entities(entities, entity_count)
-            cx += CHUNK_SIZE
+    et = ElapsedTime()
+    census = take_census(args.worldpath, regions, bbox, center, radius, types, args.processes)
 
-        cy += CHUNK_SIZE
+    # the entity the player is riding is saved with the player, not in the entities files
+    v = player.get_vehicle()
+    if v and 'Entity' in v:
+        vehicle = Census()
+        vehicle.add_entity(v['Entity'].json_obj(full_json=False), entity_filter(bbox, center, radius, types))
+        census.merge(vehicle)
 
-    for k in entity_count:
-        print(f'{k:>20}: {entity_count[k]}')
+    # owner UUIDs are formatted by Entity._make_uuid, without the leading zeros of the player file name
+    player_ints = [int(player.uuid[i:i + 8], 16) for i in range(0, 32, 8)]
+    owner_names = {player.uuid: 'PLAYER', Entity._make_uuid(player_ints): 'PLAYER'}
+    for line in census.summary(owner_names=owner_names):
+        print(line)
+    print(f'Census took {et.elapsed_time_str()}')
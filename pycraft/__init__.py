@@ -7,9 +7,12 @@ from pycraft import colors
 
 from pycraft.dat_file import DatFile
 from pycraft.entity import Entity
+from pycraft.entity import EntityRecord
 from pycraft.mapimage import MapImage
+from pycraft.map_cache import MapCache
 from pycraft.player import Player
 from pycraft.region import Region
 from pycraft.chunk import Chunk
+from pycraft.chunk_cache import ChunkCache
 from pycraft.world import World
 from pycraft.database import Database
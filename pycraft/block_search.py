@@ -0,0 +1,96 @@
+"""
+Search the region files of a world for blocks by name
+"""
+import concurrent.futures
+
+import numpy
+
+from pycraft.block_states import section_block_indexes
+from pycraft.error import PycraftException
+from pycraft.prefilter import BytesPrefilter
+from pycraft.region import Region
+
+SEARCH_TAGS = ('sections', 'xPos', 'zPos')
+
+
+def normalize_block_names(names):
+    """
+    Return a set of block names with the "minecraft:" prefix added where it is missing
+    """
+    if isinstance(names, str):
+        names = [names]
+    return set(name if ':' in name else f'minecraft:{name}' for name in names)
+
+
+def find_blocks_in_chunk(chunk, names, bbox=None):
+    """
+    Find the blocks named in names (a set of full block names) in a region chunk decoded with the fast decoder.
+
+    Sections whose palette does not contain any of the names are skipped without unpacking their block states.
+
+    Returns a list of (x, y, z, name) in world coordinates.
+    """
+    found = []
+    x0 = chunk.get_tag('xPos') * 16
+    z0 = chunk.get_tag('zPos') * 16
+    for section in chunk.get_tag('sections') or []:
+        palette = section.get('block_states', {}).get('palette', [])
+        matches = [i for i, entry in enumerate(palette) if entry.get('Name') in names]
+        if not matches:
+            continue
+        indexes, palette = section_block_indexes(section)
+        y, z, x = numpy.nonzero(numpy.isin(indexes, matches))
+        wx = x + x0
+        wy = y + section.get('Y') * 16
+        wz = z + z0
+        if bbox is not None:
+            keep = (wx >= bbox[0]) & (wz >= bbox[1]) & (wx < bbox[2]) & (wz < bbox[3])
+            wx, wy, wz, indexes_found = wx[keep], wy[keep], wz[keep], indexes[y[keep], z[keep], x[keep]]
+        else:
+            indexes_found = indexes[y, z, x]
+        for bx, by, bz, index in zip(wx.tolist(), wy.tolist(), wz.tolist(), indexes_found.tolist()):
+            found.append((bx, by, bz, palette[index]['Name']))
+    return found
+
+
+def find_blocks_in_region(world_path, rx, rz, names, bbox=None):
+    """
+    Find the blocks named in names in region (rx, rz). Runs in a worker process for find_blocks.
+
+    Returns a list of (x, y, z, name) in world coordinates.
+    """
+    found = []
+    # block names are in the section palettes, so a chunk without any of the names has none of the blocks
+    prefilter = BytesPrefilter(names)
+    try:
+        with Region(world_path, rx, rz) as region:
+            chunk_filter = region.bbox_chunk_filter(bbox) if bbox is not None else None
+            for cx, cz, timestamp, chunk in region.iter_chunks('region', decoder='fast', tags=SEARCH_TAGS,
+                                                               chunk_filter=chunk_filter, prefilter=prefilter):
+                if chunk.get_tag('xPos') is None:
+                    continue
+                found.extend(find_blocks_in_chunk(chunk, names, bbox))
+    except PycraftException:
+        # region file doesn't exist
+        pass
+    return found
+
+
+def find_blocks(world_path, regions, names, bbox=None, processes=None):
+    """
+    Generator for the blocks named in names in the given regions. Regions are searched in parallel
+    in worker processes and the blocks of each region are yielded as soon as the region is done.
+
+    Yields (x, y, z, name)
+    """
+    names = normalize_block_names(names)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(find_blocks_in_region, world_path, rx, rz, names, bbox) for rx, rz in regions]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                for block in future.result():
+                    yield block
+        finally:
+            # stop the regions that have not started if the caller stops early
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,107 @@
+"""
+Decoding of the packed long arrays in region chunks: section block states, biomes and heightmaps.
+
+Since Minecraft 1.16 values do not span longs: each long holds 64 // bits values starting at the
+least significant bits and any left over bits are padding.
+
+See https://minecraft.fandom.com/wiki/Chunk_format
+"""
+import math
+
+import numpy
+
+SECTION_WIDTH = 16
+SECTION_VOLUME = SECTION_WIDTH ** 3
+HEIGHTMAP_SIZE = SECTION_WIDTH * SECTION_WIDTH
+# block states use at least 4 bits per value, biomes use as few as needed
+BLOCK_STATES_MIN_BITS = 4
+BIOMES_MIN_BITS = 1
+BIOMES_VOLUME = 4 * 4 * 4
+
+
+def unpack_longs(longs, bits, count):
+    """
+    Unpack count values of bits bits each from an array of longs (non-spanning layout).
+
+    longs: NumPy array (any 64 bit integer dtype, e.g. the big-endian arrays from nbt.decode_bytes) or list
+
+    Returns a NumPy uint16 array if bits <= 16 otherwise uint32.
+    """
+    longs = numpy.asarray(longs).astype(numpy.uint64)
+    per_long = 64 // bits
+    shifts = numpy.arange(per_long, dtype=numpy.uint64) * numpy.uint64(bits)
+    mask = numpy.uint64((1 << bits) - 1)
+    values = ((longs[:, None] >> shifts[None, :]) & mask).reshape(-1)[:count]
+    return values.astype(numpy.uint16 if bits <= 16 else numpy.uint32)
+
+
+def palette_bits(palette_length, min_bits):
+    """
+    Number of bits per value for a palette with palette_length entries
+    """
+    return max(min_bits, math.ceil(math.log2(palette_length))) if palette_length > 1 else 0
+
+
+def unpack_palette_indexes(container, count, min_bits):
+    """
+    Unpack the palette indexes of a paletted container (a compound with 'palette' and 'data').
+
+    A container with a single palette entry has no data; all of its values are 0.
+
+    Returns (indexes, palette)
+    """
+    palette = container.get('palette', [])
+    data = container.get('data', None)
+    bits = palette_bits(len(palette), min_bits)
+    if bits == 0 or data is None or len(data) == 0:
+        return numpy.zeros(count, dtype=numpy.uint16), palette
+    return unpack_longs(data, bits, count), palette
+
+
+def section_block_indexes(section):
+    """
+    Return (indexes, palette) for the block states of a section (decoded with the fast decoder).
+
+    indexes is a 16 x 16 x 16 uint16 array of palette indexes ordered [y, z, x].
+    Returns None if the section has no block states.
+    """
+    block_states = section.get('block_states', None)
+    if not block_states:
+        return None
+    indexes, palette = unpack_palette_indexes(block_states, SECTION_VOLUME, BLOCK_STATES_MIN_BITS)
+    return indexes.reshape((SECTION_WIDTH, SECTION_WIDTH, SECTION_WIDTH)), palette
+
+
+def section_biome_indexes(section):
+    """
+    Return (indexes, palette) for the biomes of a section (decoded with the fast decoder).
+
+    indexes is a 4 x 4 x 4 uint16 array of palette indexes ordered [y, z, x], one per 4 x 4 x 4 blocks.
+    Returns None if the section has no biomes.
+    """
+    biomes = section.get('biomes', None)
+    if not biomes:
+        return None
+    indexes, palette = unpack_palette_indexes(biomes, BIOMES_VOLUME, BIOMES_MIN_BITS)
+    return indexes.reshape((4, 4, 4)), palette
+
+
+def heightmap_bits(long_count):
+    """
+    Bits per value of a heightmap stored in long_count longs
+    """
+    for bits in range(1, 33):
+        if math.ceil(HEIGHTMAP_SIZE / (64 // bits)) == long_count:
+            return bits
+    raise ValueError(f'Unexpected heightmap size: {long_count} longs')
+
+
+def unpack_heightmap(longs):
+    """
+    Unpack a heightmap into a 16 x 16 array ordered [z, x].
+
+    The values are the number of blocks above the bottom of the world to the top of the column,
+    so the highest block is at min_y + value - 1. 0 means the column is empty.
+    """
+    heights = unpack_longs(longs, heightmap_bits(len(longs)), HEIGHTMAP_SIZE)
+    return heights.astype(numpy.int32).reshape((SECTION_WIDTH, SECTION_WIDTH))
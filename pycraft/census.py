@@ -0,0 +1,201 @@
+"""
+Entity census: count the entities of a set of regions by type, owner and villager profession.
+
+Regions are read in parallel worker processes. Each worker returns a Census for its region and the results are
+merged into one, so memory does not grow with the number of entities.
+
+census = take_census(world_path, regions, bbox=(-512, -512, 512, 512))
+for line in census.summary():
+    print(line)
+"""
+import collections
+import concurrent.futures
+
+from pycraft.entity import EntityRecord
+from pycraft.entity import short_id
+from pycraft.error import PycraftException
+from pycraft.prefilter import BytesPrefilter
+from pycraft.region import Region
+
+ENTITIES_TAGS = ('Entities',)
+
+
+class Census:
+    """
+    Mergeable entity counters. Entities are the plain values of the fast decoder (or json_obj(full_json=False))
+
+    types: entities by id. Dropped items are counted in items (by item id, with the stack size) instead.
+    owners: tamed entities by owner UUID
+    professions: villagers by profession ('none' for unemployed villagers)
+    homeless: villagers without a home
+    """
+    def __init__(self):
+        self.types = collections.Counter()
+        self.items = collections.Counter()
+        self.owners = collections.Counter()
+        self.owned_types = collections.Counter()
+        self.professions = collections.Counter()
+        self.homeless = 0
+        self.entities = 0
+        self.chunks = 0
+        self.regions = 0
+
+    def merge(self, other):
+        """
+        Add the counts of another Census to this one. Returns self
+        """
+        self.types.update(other.types)
+        self.items.update(other.items)
+        self.owners.update(other.owners)
+        self.owned_types.update(other.owned_types)
+        self.professions.update(other.professions)
+        self.homeless += other.homeless
+        self.entities += other.entities
+        self.chunks += other.chunks
+        self.regions += other.regions
+        return self
+
+    def add_entity(self, e, entity_filter=None):
+        """
+        Count an entity and its passengers. e is an entity compound or an EntityRecord
+
+        entity_filter: optional function of an EntityRecord (see entity_filter) that tells whether to count it.
+        It is applied to the entity and to each passenger, so a villager riding a boat is counted even when
+        the boat is not.
+        """
+        if not isinstance(e, EntityRecord):
+            e = EntityRecord(e)
+        for passenger in e.passengers:
+            self.add_entity(passenger, entity_filter)
+        if entity_filter is not None and not entity_filter(e):
+            return
+        self.entities += 1
+        eid = e.id or 'unknown'
+        if eid == 'item':
+            item = e.item or {}
+            self.items[short_id(item.get('id', 'unknown'))] += item.get('Count', item.get('count', 1))
+        else:
+            self.types[eid] += 1
+        if e.owner is not None:
+            self.owners[e.owner] += 1
+            self.owned_types[eid] += 1
+        if eid == 'villager':
+            self.professions[e.profession or 'none'] += 1
+            if e.home is None:
+                self.homeless += 1
+
+    def summary(self, owner_names=None):
+        """
+        Return the census as a list of lines of text.
+
+        owner_names: optional {uuid: name} used in place of the UUIDs of the owners
+        """
+        owner_names = owner_names or {}
+        lines = [f'{self.entities} entities in {self.chunks} chunks of {self.regions} regions']
+
+        def section(title, counter, names=None):
+            if not counter:
+                return
+            lines.append(f'{title}:')
+            for k, n in sorted(counter.items(), key=lambda kv: (-kv[1], kv[0])):
+                k = names.get(k, k) if names else k
+                lines.append(f'{k:>32}: {n}')
+        section('Entities', self.types)
+        section('Dropped items', self.items)
+        section('Villager professions', self.professions)
+        if self.professions:
+            lines.append(f'{"homeless":>32}: {self.homeless}')
+        section('Owned entities', self.owned_types)
+        section('Owners', self.owners, owner_names)
+        return lines
+
+
+def _in_area(p, bbox, center, radius):
+    if not p:
+        return bbox is None and center is None
+    if bbox is not None and not (bbox[0] <= p[0] < bbox[2] and bbox[1] <= p[2] < bbox[3]):
+        return False
+    if center is not None and radius is not None:
+        if (p[0] - center[0]) ** 2 + (p[2] - center[2]) ** 2 > radius * radius:
+            return False
+    return True
+
+
+def entity_filter(bbox=None, center=None, radius=None, types=None):
+    """
+    Return a function of an EntityRecord that tells whether it is inside the area and one of types (see
+    census_region), or None if every entity is counted
+    """
+    if bbox is None and center is None and not types:
+        return None
+    types = set(short_id(t) for t in types) if types else None
+    return lambda e: (types is None or (e.id or 'unknown') in types) and _in_area(e.position, bbox, center, radius)
+
+
+def census_region(world_path, rx, rz, bbox=None, center=None, radius=None, types=None):
+    """
+    Count the entities of region (rx, rz). Runs in a worker process for take_census.
+
+    bbox / center and radius: only count the entities inside the area (radius is horizontal, in blocks)
+    types: optional list of entity ids to count (e.g. ['villager', 'cat']). Chunks without any of them
+    are skipped before they are decoded.
+    The area and types apply to each entity on its own: passengers are counted even if their vehicle is not.
+
+    Returns a Census
+    """
+    census = Census()
+    area = (center[0] - radius, center[2] - radius, center[0] + radius + 1, center[2] + radius + 1) \
+        if center is not None and radius is not None else None
+    prefilter = BytesPrefilter(types) if types else None
+    counted = entity_filter(bbox, center, radius, types)
+    try:
+        with Region(world_path, rx, rz) as region:
+            chunk_filter = None
+            if bbox is not None or area is not None:
+                filters = [region.bbox_chunk_filter(b) for b in (bbox, area) if b is not None]
+                chunk_filter = lambda cx, cz: all(f(cx, cz) for f in filters)
+            census.regions = 1
+            for cx, cz, timestamp, chunk in region.iter_chunks('entities', decoder='fast', tags=ENTITIES_TAGS,
+                                                               chunk_filter=chunk_filter, prefilter=prefilter):
+                census.chunks += 1
+                for e in chunk.get_tag('Entities') or []:
+                    census.add_entity(e, counted)
+    except PycraftException:
+        # no entities file for the region
+        pass
+    return census
+
+
+def area_regions(positions, bbox=None, center=None, radius=None):
+    """
+    Return the (rx, rz) of positions that overlap bbox and the circle of radius around center
+    """
+    if center is not None and radius is not None:
+        area = set(Region.bbox_positions((center[0] - radius, center[2] - radius,
+                                          center[0] + radius + 1, center[2] + radius + 1)))
+        positions = [pos for pos in positions if pos in area]
+    if bbox is not None:
+        area = set(Region.bbox_positions(bbox))
+        positions = [pos for pos in positions if pos in area]
+    return positions
+
+
+def take_census(world_path, regions, bbox=None, center=None, radius=None, types=None, processes=None,
+                progress=None):
+    """
+    Count the entities of regions (list of (rx, rz)) in parallel worker processes.
+
+    progress: optional callback called with (rx, rz, census) as each region is finished
+
+    Returns the merged Census
+    """
+    total = Census()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(census_region, world_path, rx, rz, bbox, center, radius, types): (rx, rz)
+                   for rx, rz in regions}
+        for future in concurrent.futures.as_completed(futures):
+            census = future.result()
+            if progress:
+                progress(*futures[future], census)
+            total.merge(census)
+    return total
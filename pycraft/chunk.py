@@ -1,24 +1,94 @@
 import io
 import json
+import threading
 
+import numpy
+
+from pycraft import block_states
 from pycraft import nbt
+from pycraft.error import PycraftException
+
+
+def _decode_python_nbt(data):
+    return nbt.read_bytes(io.BytesIO(data)).value
+
+
+def _decode_python_nbt_payload(data, tag_type):
+    return nbt.read_payload_bytes(data, tag_type)
 
 
 class Chunk:
     BLOCK_WIDTH = 32
+    # NBT decoders. 'python_nbt' returns python_nbt tag objects (use .value to get values),
+    # 'fast' returns plain python values and NumPy arrays (see nbt.decode_bytes)
+    DECODERS = {
+        'python_nbt': _decode_python_nbt,
+        'fast': nbt.decode_bytes
+    }
+    # Decoders for a single top level tag, used by lazy chunks
+    PAYLOAD_DECODERS = {
+        'python_nbt': _decode_python_nbt_payload,
+        'fast': nbt.decode_payload
+    }
+    DEFAULT_DECODER = 'python_nbt'
 
-    def __init__(self, data, size):
+    def __init__(self, data, size, decoder=None, tags=None, lazy=False):
+        """
+        data: uncompressed NBT data
+        size: size of the chunk data in the region file
+        decoder: NBT decoder (see DECODERS)
+        tags: optional collection of top level tag names. Only these tags are kept, the rest are
+        skipped without being decoded. Implies lazy.
+        lazy: index the top level tags and decode each one on first access
+        """
         self._chunk_data = data
         self._tags = None
+        self._index = None
+        # lazy chunks can be shared between threads through Region.CHUNK_CACHE, decoding a tag moves
+        # it from _index to _tags under this lock
+        self._lock = threading.Lock()
         self._size = size
+        self._decoder = decoder or self.DEFAULT_DECODER
+        if self._decoder not in self.DECODERS:
+            raise PycraftException(f'Bad NBT decoder: {self._decoder}')
         if self._chunk_data:
-            byte_data = io.BytesIO(self._chunk_data)
-            self._tags = nbt.read_bytes(byte_data).value
+            if tags is not None or lazy:
+                self._index = nbt.scan_bytes(self._chunk_data, tags)
+                self._tags = {}
+            else:
+                self._tags = self.DECODERS[self._decoder](self._chunk_data)
+
+    def _decode_locked(self, tag):
+        # the tag is added to _tags before it is removed from _index, so readers without the lock
+        # always find it in one of them
+        tag_type, start, end = self._index[tag]
+        self._tags[tag] = self.PAYLOAD_DECODERS[self._decoder](self._chunk_data[start:end], tag_type)
+        del self._index[tag]
+        return self._tags[tag]
+
+    def _decode_tag(self, tag):
+        with self._lock:
+            if tag in self._index:
+                return self._decode_locked(tag)
+            # decoded by another thread
+            return self._tags.get(tag)
+
+    def _decode_all(self):
+        if self._index:
+            with self._lock:
+                for tag in list(self._index):
+                    self._decode_locked(tag)
+
+    @property
+    def lazy(self):
+        return self._index is not None
 
     def get_tags(self):
+        self._decode_all()
         return self._tags
 
     def as_json(self):
+        self._decode_all()
         if self._tags:
             return json.dumps(self._tags)
         return '{}'
@@ -27,23 +97,33 @@ class Chunk:
     def size(self):
         return self._size
 
+    @property
+    def decoder(self):
+        return self._decoder
+
     @property
     def data_version(self):
         return self.get_tag('DataVersion')
 
+    def has_tag(self, tag):
+        return (self._tags is not None and tag in self._tags) or (self._index is not None and tag in self._index)
+
     def get_tag(self, tag):
+        if self._index and tag in self._index:
+            return self._decode_tag(tag)
         if self._tags and tag in self._tags:
             return self._tags[tag]
 
     def get_tag_obj(self, tag):
-        if self._tags and tag in self._tags:
-            return self._tags[tag]
+        return self.get_tag(tag)
 
     def list_tags(self):
-        if not self._tags:
+        if not self._tags and not self._index:
             return None
         for tag in self._tags:
             print(tag)
+        for tag in self._index or {}:
+            print(tag)
 
 
 class PoiSection:
@@ -68,9 +148,51 @@ class PoiSection:
         return self.get_attribute('Records') or []
 
 
+class Section:
+    """
+    Wrapper for Region Chunk Section (16 x 16 x 16 blocks)
+
+    Block states and biomes are unpacked into NumPy arrays of palette indexes
+    (see pycraft.block_states).
+    """
+
+    def __init__(self, section):
+        if hasattr(section, 'json_obj'):
+            # python_nbt tags. Convert to plain values like the fast decoder returns.
+            section = section.json_obj(full_json=False)
+        self._section = section
+
+    @property
+    def y(self):
+        return self._section.get('Y')
+
+    def block_ids(self):
+        """
+        Returns (ids, palette): a 16 x 16 x 16 uint16 array of block state palette indexes ordered
+        [y, z, x] and the palette (list of dicts with 'Name' and optional 'Properties').
+        Returns None if the section has no block states.
+        """
+        return block_states.section_block_indexes(self._section)
+
+    def block_names(self):
+        """
+        Returns the block names in the block state palette
+        """
+        palette = self._section.get('block_states', {}).get('palette', [])
+        return [entry.get('Name') for entry in palette]
+
+    def biome_ids(self):
+        """
+        Returns (ids, palette): a 4 x 4 x 4 uint16 array of biome palette indexes ordered [y, z, x]
+        (one per 4 x 4 x 4 blocks) and the palette (list of biome names).
+        Returns None if the section has no biomes.
+        """
+        return block_states.section_biome_indexes(self._section)
+
+
 class PoiChunk(Chunk):
-    def __init__(self, data, size):
-        super().__init__(data, size)
+    def __init__(self, data, size, decoder=None, tags=None, lazy=False):
+        super().__init__(data, size, decoder, tags, lazy)
 
     @property
     def sections(self):
@@ -78,8 +200,8 @@ class PoiChunk(Chunk):
 
 
 class EntitiesChunk(Chunk):
-    def __init__(self, data, size):
-        super().__init__(data, size)
+    def __init__(self, data, size, decoder=None, tags=None, lazy=False):
+        super().__init__(data, size, decoder, tags, lazy)
 
     @property
     def entities(self):
@@ -90,8 +212,8 @@ class EntitiesChunk(Chunk):
 
 
 class RegionChunk(Chunk):
-    def __init__(self, data, size):
-        super().__init__(data, size)
+    def __init__(self, data, size, decoder=None, tags=None, lazy=False):
+        super().__init__(data, size, decoder, tags, lazy)
 
     @property
     def status(self):
@@ -108,6 +230,47 @@ class RegionChunk(Chunk):
     def structures(self):
         return self.get_tag('structures')
 
+    @property
+    def sections(self):
+        """
+        The sections of the chunk as Section objects, ordered by Y
+        """
+        sections = [Section(section) for section in self.get_tag('sections') or []]
+        return sorted(sections, key=lambda section: section.y)
+
+    def sections_array(self):
+        """
+        Unpack the block states of all of the sections that have them.
+
+        Returns (ids, palettes, ys): an N x 16 x 16 x 16 uint16 array of palette indexes ordered
+        [section, y, z, x], the palette of each section and the Y of each section (in sections,
+        multiply by 16 for blocks). Palette indexes are per section.
+        """
+        return self._stack_sections(Section.block_ids, (16, 16, 16))
+
+    def biomes_array(self):
+        """
+        Unpack the biomes of all of the sections that have them.
+
+        Returns (ids, palettes, ys) like sections_array, with 4 x 4 x 4 biome cells per section.
+        """
+        return self._stack_sections(Section.biome_ids, (4, 4, 4))
+
+    def _stack_sections(self, unpack, shape):
+        arrays = []
+        palettes = []
+        ys = []
+        for section in self.sections:
+            unpacked = unpack(section)
+            if unpacked is None:
+                continue
+            arrays.append(unpacked[0])
+            palettes.append(unpacked[1])
+            ys.append(section.y)
+        if not arrays:
+            return numpy.zeros((0,) + shape, dtype=numpy.uint16), palettes, ys
+        return numpy.stack(arrays), palettes, ys
+
 # Status x
 # zPos x
 # block_entities
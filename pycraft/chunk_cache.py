@@ -0,0 +1,131 @@
+"""
+LRU cache of decompressed and parsed chunks
+"""
+from collections import OrderedDict
+import threading
+
+
+class ChunkCache:
+    """
+    Bounded LRU cache of parsed chunks.
+
+    Keys are (world_path, dtype, rx, rz, cx, cz, timestamp, ...). Since the chunk timestamp is part of
+    the key, a chunk that is rewritten by the game is read again instead of being served stale.
+
+    max_entries: maximum number of chunks to keep, None for no limit
+    max_bytes: maximum total size of the decompressed chunk data to keep, None for no limit
+    """
+    DEFAULT_MAX_ENTRIES = 4096
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def set_limits(self, max_entries=None, max_bytes=None):
+        """
+        Change the limits of the cache, evicting chunks if needed. None means no limit.
+        """
+        with self._lock:
+            self._max_entries = max_entries
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        """
+        Get a chunk from the cache. Returns None on a miss.
+        """
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._chunks.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, chunk, nbytes):
+        """
+        Add a chunk to the cache. nbytes is the size used for the max_bytes limit.
+        """
+        with self._lock:
+            old = self._chunks.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if self._max_bytes is not None and nbytes > self._max_bytes:
+                return
+            self._chunks[key] = (chunk, nbytes)
+            self._bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._chunks and (
+                (self._max_entries is not None and len(self._chunks) > self._max_entries) or
+                (self._max_bytes is not None and self._bytes > self._max_bytes)):
+            _key, (_chunk, nbytes) = self._chunks.popitem(last=False)
+            self._bytes -= nbytes
+            self._evictions += 1
+
+    def clear(self):
+        """
+        Remove all chunks from the cache. The counters are not reset.
+        """
+        with self._lock:
+            self._chunks.clear()
+            self._bytes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def stats(self):
+        """
+        Return a dict of the cache counters and usage.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._chunks),
+                'bytes': self._bytes,
+                'max_entries': self._max_entries,
+                'max_bytes': self._max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
@@ -1,3 +1,9 @@
+import functools
+import hashlib
+
+import numpy
+
+
 def get_sheep_color(value: int):
     sheep_colors = {
         0: 'white',
@@ -218,3 +224,127 @@ colors = {
     142: (112, 2, 0, 255),  # Netherrack, Quartz Ore, Nether Wart, Nether Brick Items
     143: (59, 1, 0, 255)  # Netherrack, Quartz Ore, Nether Wart, Nether Brick Items
 }
+
+
+_map_color_lut = None
+
+
+def get_map_color_lut():
+    """
+    The map colors as a 256 x 4 NumPy array of RGBA values indexed by the unsigned
+    color byte, for rendering a whole map 'colors' array at once.
+
+    Gives the same colors as get_map_color, with the water adjustment baked in.
+    Out of range values get the same fallback color.
+    """
+    global _map_color_lut
+    if _map_color_lut is None:
+        lut = numpy.zeros((256, 4), dtype=numpy.uint8)
+        for color_index in range(256):
+            index = color_index if color_index < len(colors) else 75
+            if 48 <= index <= 51:
+                index += 4
+            lut[color_index] = colors[index]
+        _map_color_lut = lut
+    return _map_color_lut
+
+
+def get_map_palette_version():
+    """
+    A short digest of the map color lookup table. It changes whenever the map colors
+    change, so it can be used to invalidate rendered map images.
+    """
+    return hashlib.sha1(get_map_color_lut().tobytes()).hexdigest()[:12]
+
+
+# Top-down colors for blocks (RGBA) used by the terrain renderer. Blocks that are not listed
+# get a color from block_color_suffixes or default_block_color.
+block_colors = {
+    'minecraft:air': (0, 0, 0, 0),
+    'minecraft:cave_air': (0, 0, 0, 0),
+    'minecraft:void_air': (0, 0, 0, 0),
+    'minecraft:grass_block': (109, 153, 48, 255),
+    'minecraft:grass': (101, 145, 44, 255),
+    'minecraft:tall_grass': (101, 145, 44, 255),
+    'minecraft:fern': (88, 130, 40, 255),
+    'minecraft:dirt': (151, 109, 77, 255),
+    'minecraft:coarse_dirt': (119, 85, 59, 255),
+    'minecraft:podzol': (110, 73, 41, 255),
+    'minecraft:mycelium': (111, 99, 105, 255),
+    'minecraft:dirt_path': (148, 121, 65, 255),
+    'minecraft:farmland': (120, 80, 50, 255),
+    'minecraft:mud': (60, 57, 60, 255),
+    'minecraft:sand': (219, 207, 163, 255),
+    'minecraft:sandstone': (216, 203, 155, 255),
+    'minecraft:red_sand': (190, 102, 33, 255),
+    'minecraft:gravel': (136, 126, 126, 255),
+    'minecraft:clay': (160, 166, 179, 255),
+    'minecraft:stone': (112, 112, 112, 255),
+    'minecraft:cobblestone': (122, 122, 122, 255),
+    'minecraft:andesite': (136, 136, 137, 255),
+    'minecraft:diorite': (188, 188, 188, 255),
+    'minecraft:granite': (149, 103, 85, 255),
+    'minecraft:deepslate': (80, 80, 82, 255),
+    'minecraft:tuff': (108, 109, 102, 255),
+    'minecraft:calcite': (223, 224, 220, 255),
+    'minecraft:bedrock': (85, 85, 85, 255),
+    'minecraft:water': (64, 64, 255, 255),
+    'minecraft:bubble_column': (64, 64, 255, 255),
+    'minecraft:seagrass': (52, 80, 200, 255),
+    'minecraft:tall_seagrass': (52, 80, 200, 255),
+    'minecraft:kelp': (52, 90, 180, 255),
+    'minecraft:kelp_plant': (52, 90, 180, 255),
+    'minecraft:lava': (255, 0, 0, 255),
+    'minecraft:ice': (160, 160, 255, 255),
+    'minecraft:packed_ice': (141, 180, 250, 255),
+    'minecraft:blue_ice': (116, 167, 253, 255),
+    'minecraft:snow': (255, 255, 255, 255),
+    'minecraft:snow_block': (255, 255, 255, 255),
+    'minecraft:powder_snow': (248, 253, 253, 255),
+    'minecraft:cactus': (85, 127, 43, 255),
+    'minecraft:sugar_cane': (136, 175, 86, 255),
+    'minecraft:pumpkin': (198, 118, 24, 255),
+    'minecraft:melon': (112, 146, 30, 255),
+    'minecraft:netherrack': (112, 2, 0, 255),
+    'minecraft:soul_sand': (81, 62, 50, 255),
+    'minecraft:end_stone': (219, 222, 158, 255),
+    'minecraft:obsidian': (21, 18, 30, 255),
+    'minecraft:terracotta': (152, 94, 67, 255),
+    'minecraft:moss_block': (89, 109, 45, 255),
+}
+
+# Colors for families of blocks, by the end of the block name
+block_color_suffixes = (
+    ('_leaves', (0, 124, 0, 255)),
+    ('_log', (102, 76, 51, 255)),
+    ('_wood', (102, 76, 51, 255)),
+    ('_planks', (143, 119, 72, 255)),
+    ('_stairs', (143, 119, 72, 255)),
+    ('_slab', (143, 119, 72, 255)),
+    ('_fence', (143, 119, 72, 255)),
+    ('_flower', (200, 200, 60, 255)),
+    ('_ore', (112, 112, 112, 255)),
+    ('_terracotta', (152, 94, 67, 255)),
+    ('_wool', (220, 220, 220, 255)),
+    ('_carpet', (220, 220, 220, 255)),
+    ('_concrete', (160, 160, 160, 255)),
+    ('_glass', (200, 220, 220, 128)),
+    ('_bricks', (150, 97, 83, 255)),
+    ('_mushroom', (150, 110, 90, 255)),
+)
+
+default_block_color = (127, 127, 127, 255)
+
+
+# bounded: worlds with mods or data packs can have any number of unknown block names
+@functools.lru_cache(maxsize=4096)
+def get_block_color(name: str):
+    """
+    Return the RGBA color for a block name (e.g. "minecraft:grass_block") for top-down rendering
+    """
+    if name in block_colors:
+        return block_colors[name]
+    for suffix, color in block_color_suffixes:
+        if name.endswith(suffix):
+            return color
+    return default_block_color
@@ -4,14 +4,148 @@ Load Minecraft data into a relational database to simplify subsequent data queri
 import sqlalchemy as db
 import threading
 import logging
+import time
 
 DATABASE_LOCK = threading.Lock()
+RECORD_ID_BLOCK_SIZE = 10000
+
+# Indexes are created separately from the tables so that bulk imports can create them
+# after the data is loaded. name: (table, columns)
+INDEXES = {
+    'entities_chunk': ('entities', ('chunk',)),
+    'villagers_chunk': ('villagers', ('chunk',)),
+    'items_chunk': ('items', ('chunk',)),
+    'item_modifiers_item_id': ('item_modifiers', ('item_id',)),
+    'poi_chunk': ('poi', ('chunk',)),
+    'chunk_timestamps_region': ('chunk_timestamps', ('dtype', 'rx', 'rz')),
+}
+
+
+class RecordIdAllocator():
+    '''
+    Hands out record ids in memory from blocks reserved with Database.reserve_record_ids.
+
+    The nextid table is only touched once per block, so workers do not need a database
+    transaction for every record. The nextid table stays the durable high-water mark, ids
+    left over in the last block are simply never used.
+    '''
+    def __init__(self, database, block_size=RECORD_ID_BLOCK_SIZE):
+        self._database = database
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._end_id = 0
+
+    def next_record_id(self):
+        with self._lock:
+            if self._next_id >= self._end_id:
+                self._next_id = self._database.reserve_record_ids(self._block_size)
+                self._end_id = self._next_id + self._block_size
+            record_id = self._next_id
+            self._next_id += 1
+            return record_id
+
+
+class BulkWriter():
+    '''
+    High-throughput writer for imports.
+
+    Records are buffered across chunks and regions and written with one executemany per table in a
+    single transaction once max_rows records are buffered or max_seconds have passed since the last
+    write. Has the same write methods as Database, so it can be used in its place.
+    '''
+    def __init__(self, database, max_rows=50000, max_seconds=10.0):
+        self._database = database
+        self._max_rows = max_rows
+        self._max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._records = {}
+        self._region_states = []
+        self._deletes = []
+        self._row_count = 0
+        self._last_write = time.time()
+        self._stats = {}
+        self._failed_batches = 0
+
+    def insert_records(self, table, records):
+        with self._lock:
+            self._records.setdefault(table, []).extend(records)
+            self._row_count += len(records)
+            self._write_if_needed()
+
+    def save_region_state(self, dtype, rx, rz, mtime, size, timestamps):
+        # written in the same transaction as the records, after them
+        with self._lock:
+            self._region_states.append((dtype, rx, rz, mtime, size, timestamps))
+            self._write_if_needed()
+
+    def delete_chunk_records(self, chunks):
+        # written in the same transaction as the records, before them. A task deletes the records of its
+        # chunks before it adds their new records, and no two tasks load the same chunk, so running all
+        # of the deletes of a batch first does not delete records of the batch
+        with self._lock:
+            self._deletes.extend(chunks)
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _write_if_needed(self):
+        if self._row_count >= self._max_rows or time.time() - self._last_write >= self._max_seconds:
+            self._write()
+
+    def _write(self):
+        if self._row_count > 0 or len(self._region_states) > 0 or len(self._deletes) > 0:
+            try:
+                elapsed = self._database.insert_batch(self._records, self._region_states, self._deletes)
+            except Exception:
+                # the whole batch was rolled back (insert_batch logged the error). It is dropped so one bad
+                # row does not fail every later write. The region states of the batch were not saved either,
+                # so the next incremental import loads those region files again.
+                self._failed_batches += 1
+                for state in self._region_states:
+                    logging.error(f'Dropped the records of {state[0]} region file {state[1:3]}')
+                elapsed = {}
+            for table, seconds in elapsed.items():
+                rows, total = self._stats.get(table, (0, 0.0))
+                self._stats[table] = (rows + len(self._records[table]), total + seconds)
+        self._last_write = time.time()
+        self._records = {}
+        self._region_states = []
+        self._deletes = []
+        self._row_count = 0
+
+    @property
+    def stats(self):
+        '''
+        {table: (rows written, seconds spent writing them)}
+        '''
+        return dict(self._stats)
+
+    @property
+    def failed_batches(self):
+        '''
+        Number of batches that could not be written and were dropped
+        '''
+        return self._failed_batches
+
+    def log_stats(self):
+        for table, (rows, seconds) in sorted(self._stats.items()):
+            logging.info(f'{table}: {rows} rows in {seconds:.2f}s ({rows / max(seconds, 0.001):.0f} rows/sec)')
+        if self._failed_batches:
+            logging.error(f'{self._failed_batches} batches could not be written and were dropped')
 
 
 class Database():
-    def __init__(self, dbfile, create_tables=True):
+    def __init__(self, dbfile, create_tables=True, bulk=False):
+        '''
+        bulk: configure SQLite for a high-throughput import (WAL journal, relaxed synchronous mode) and
+        do not create the indexes of new tables until end_bulk_import() is called.
+        '''
+        self._bulk = bulk
         with DATABASE_LOCK:
             self._engine = db.create_engine(f'sqlite:///{dbfile}')
+            db.event.listen(self._engine, 'connect', self._on_connect)
             self._connection = self._engine.connect()
             self._metadata = db.MetaData(bind=self._engine)
         if create_tables:
@@ -19,7 +153,68 @@ class Database():
         with DATABASE_LOCK:
             self._metadata.reflect()
 
+    def _on_connect(self, dbapi_connection, connection_record):
+        if self._bulk:
+            # pragmas other than journal_mode only apply to the connection they are run on
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+
+    def end_bulk_import(self):
+        '''
+        Create the deferred indexes and checkpoint the write-ahead log
+        '''
+        self.create_indexes()
+        with DATABASE_LOCK:
+            self._connection.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        self._bulk = False
+
+    def create_indexes(self):
+        with DATABASE_LOCK:
+            with self._engine.begin() as connection:
+                for name, (table, columns) in INDEXES.items():
+                    logging.info(f'Create index {name}')
+                    connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+    def insert_batch(self, records, region_states=(), deletes=()):
+        '''
+        Delete the records of chunks, insert the records for several tables and save region states in
+        one transaction.
+
+        records: {table: [record, ...]}
+        region_states: list of save_region_state argument tuples
+        deletes: keys of the chunks whose records are deleted (see delete_chunk_records) before the inserts
+
+        Returns {table: seconds spent inserting}. Exceptions are logged and raised, nothing is written
+        '''
+        elapsed = {}
+        try:
+            with DATABASE_LOCK:
+                with self._engine.begin() as connection:
+                    if deletes:
+                        self._delete_chunk_records(connection, deletes)
+                    for table, table_records in records.items():
+                        if len(table_records) > 0:
+                            start = time.time()
+                            connection.execute(db.insert(self._metadata.tables[table]), table_records)
+                            elapsed[table] = time.time() - start
+                    for state in region_states:
+                        self._save_region_state(connection, *state)
+        except Exception as e:
+            logging.error(f'Exception inserting batch: {e}')
+            for table, table_records in records.items():
+                logging.error(f' - {table}: {len(table_records)} records')
+            raise
+        return elapsed
+
     def next_record_id(self):
+        return self.reserve_record_ids(1)
+
+    def reserve_record_ids(self, count):
+        """
+        Reserve count consecutive record ids. Returns the first id in the block.
+        """
         with DATABASE_LOCK:
             with self._engine.begin() as connection:
                 table_obj = self._metadata.tables['nextid']
@@ -30,7 +225,7 @@ class Database():
                     raise Exception(f'Next Id has {len(rows)} rows')
                 next_id = rows[0]['next_id']
                 query = db.update(table_obj)
-                connection.execute(query, {'id': 0, 'next_id': next_id + 1})
+                connection.execute(query, {'id': 0, 'next_id': next_id + count})
                 return next_id
 
     def insert_entity_records(self, records):
@@ -70,6 +265,101 @@ class Database():
             for record in records:
                 logging.error(f' - {record}')
 
+    def close(self):
+        with DATABASE_LOCK:
+            self._connection.close()
+            self._engine.dispose()
+
+    def has_chunk_records(self):
+        """
+        True if the records in the database carry their source chunk, which incremental imports need.
+        """
+        return 'chunk' in self._metadata.tables['entities'].columns
+
+    def get_region_files(self):
+        """
+        Get the region files recorded by the last import.
+
+        Returns a dict of {(dtype, rx, rz): (mtime, size)}
+        """
+        with DATABASE_LOCK:
+            table_obj = self._metadata.tables['region_files']
+            rows = self._connection.execute(db.select(table_obj)).fetchall()
+        return {(row['dtype'], row['rx'], row['rz']): (row['mtime'], row['size']) for row in rows}
+
+    def get_chunk_timestamps(self, dtype, rx, rz):
+        """
+        Get the chunk timestamps of a region file recorded by the last import.
+
+        Returns a dict of {(cx, cz): timestamp}
+        """
+        with DATABASE_LOCK:
+            table_obj = self._metadata.tables['chunk_timestamps']
+            query = db.select(table_obj).where(db.and_(
+                table_obj.c.dtype == dtype, table_obj.c.rx == rx, table_obj.c.rz == rz))
+            rows = self._connection.execute(query).fetchall()
+        return {(row['cx'], row['cz']): row['timestamp'] for row in rows}
+
+    def delete_chunk_records(self, chunks):
+        """
+        Delete the entities, villagers, items (and their modifiers) and poi records that were loaded from chunks
+        """
+        with DATABASE_LOCK:
+            with self._engine.begin() as connection:
+                self._delete_chunk_records(connection, chunks)
+
+    def _delete_chunk_records(self, connection, chunks):
+        items = self._metadata.tables['items']
+        modifiers = self._metadata.tables['item_modifiers']
+        # keep the number of query parameters under the SQLite limit
+        for start in range(0, len(chunks), 500):
+            batch = chunks[start:start + 500]
+            item_ids = db.select(items.c.Id).where(items.c.chunk.in_(batch))
+            connection.execute(db.delete(modifiers).where(modifiers.c.item_id.in_(item_ids)))
+            for table in ('items', 'entities', 'villagers', 'poi'):
+                table_obj = self._metadata.tables[table]
+                connection.execute(db.delete(table_obj).where(table_obj.c.chunk.in_(batch)))
+
+    def delete_region(self, dtype, rx, rz, chunks):
+        """
+        Forget a region file that no longer exists: delete the records loaded from its chunks and its
+        saved state in one transaction.
+
+        chunks: the chunk keys of the region file
+        """
+        with DATABASE_LOCK:
+            with self._engine.begin() as connection:
+                self._delete_chunk_records(connection, chunks)
+                self._delete_region_state(connection, dtype, rx, rz)
+
+    def save_region_state(self, dtype, rx, rz, mtime, size, timestamps):
+        """
+        Record the state of a region file after it has been imported.
+
+        timestamps is a dict of {(cx, cz): timestamp} for the chunks in the file
+        """
+        with DATABASE_LOCK:
+            with self._engine.begin() as connection:
+                self._save_region_state(connection, dtype, rx, rz, mtime, size, timestamps)
+
+    def _delete_region_state(self, connection, dtype, rx, rz):
+        for table in ('region_files', 'chunk_timestamps'):
+            table_obj = self._metadata.tables[table]
+            connection.execute(db.delete(table_obj).where(db.and_(
+                table_obj.c.dtype == dtype, table_obj.c.rx == rx, table_obj.c.rz == rz)))
+
+    def _save_region_state(self, connection, dtype, rx, rz, mtime, size, timestamps):
+        region_files = self._metadata.tables['region_files']
+        chunk_timestamps = self._metadata.tables['chunk_timestamps']
+        self._delete_region_state(connection, dtype, rx, rz)
+        connection.execute(db.insert(region_files),
+                           {'dtype': dtype, 'rx': rx, 'rz': rz, 'mtime': mtime, 'size': size})
+        if timestamps:
+            connection.execute(db.insert(chunk_timestamps), [
+                {'dtype': dtype, 'rx': rx, 'rz': rz, 'cx': cx, 'cz': cz, 'timestamp': timestamp}
+                for (cx, cz), timestamp in timestamps.items()
+            ])
+
     def _create_poi_table(self):
         logging.info('Create POI Table')
         poi = db.Table(
@@ -79,6 +369,7 @@ class Database():
             db.Column('z', db.Integer(), nullable=False),
             db.Column('type', db.String(32), nullable=False),
             db.Column('free', db.Integer(), nullable=False),
+            db.Column('chunk', db.String(32)),  # source chunk (see load_database.chunk_key)
             keep_existing=True
         )
 
@@ -96,6 +387,7 @@ class Database():
             db.Column('type', db.String(32), nullable=False),
             db.Column('count', db.Integer(), nullable=False),
             db.Column('slot', db.Integer(), nullable=False),
+            db.Column('chunk', db.String(32)),  # source chunk (see load_database.chunk_key)
             keep_existing=True
         )
 
@@ -113,6 +405,7 @@ class Database():
             db.Column('chested', db.Boolean()),
             db.Column('tame', db.Boolean()),
             db.Column('owner', db.String(32)),
+            db.Column('chunk', db.String(32)),  # source chunk (see load_database.chunk_key)
             keep_existing=True
         )
 
@@ -148,6 +441,32 @@ class Database():
             db.Column('meet_x', db.Integer()),
             db.Column('meet_y', db.Integer()),
             db.Column('meet_z', db.Integer()),
+            db.Column('chunk', db.String(32)),  # source chunk (see load_database.chunk_key)
+            keep_existing=True
+        )
+
+    def _create_region_files_table(self):
+        logging.info('Create Region Files Table')
+        region_files = db.Table(
+            'region_files', self._metadata,
+            db.Column('dtype', db.String(8), nullable=False),
+            db.Column('rx', db.Integer(), nullable=False),
+            db.Column('rz', db.Integer(), nullable=False),
+            db.Column('mtime', db.BigInteger(), nullable=False),  # nanoseconds
+            db.Column('size', db.Integer(), nullable=False),
+            keep_existing=True
+        )
+
+    def _create_chunk_timestamps_table(self):
+        logging.info('Create Chunk Timestamps Table')
+        chunk_timestamps = db.Table(
+            'chunk_timestamps', self._metadata,
+            db.Column('dtype', db.String(8), nullable=False),
+            db.Column('rx', db.Integer(), nullable=False),
+            db.Column('rz', db.Integer(), nullable=False),
+            db.Column('cx', db.Integer(), nullable=False),
+            db.Column('cz', db.Integer(), nullable=False),
+            db.Column('timestamp', db.Integer(), nullable=False),
             keep_existing=True
         )
 
@@ -159,7 +478,14 @@ class Database():
         self._create_item_modifiers_table()
         self._create_poi_table()
         self._create_nextid_table()
+        self._create_region_files_table()
+        self._create_chunk_timestamps_table()
         self._metadata.create_all(checkfirst=True)
         self._metadata.reflect()
+        if not self._bulk:
+            self.create_indexes()
         # initialize id table
-        self.insert_record('nextid', {'id': 0, 'next_id': 1})
+        with DATABASE_LOCK:
+            rows = self._connection.execute(db.select(self._metadata.tables['nextid'])).fetchall()
+        if len(rows) == 0:
+            self.insert_record('nextid', {'id': 0, 'next_id': 1})
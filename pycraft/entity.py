@@ -1,4 +1,106 @@
-import ctypes
+import sys
+
+
+def format_uuid(ints):
+    """
+    Format the 4 ints of an int array UUID as hex, each as an unsigned 32 bit int without leading zeros
+    """
+    a, b, c, d = ints
+    return '%x%x%x%x' % (int(a) & 0xffffffff, int(b) & 0xffffffff, int(c) & 0xffffffff, int(d) & 0xffffffff)
+
+
+def _value(v):
+    """
+    Return the value of an NBT tag (python_nbt) or v itself if it is already a plain value (fast decoder)
+    """
+    if isinstance(v, (dict, list)):
+        return v
+    return getattr(v, 'value', v)
+
+
+# full id -> interned short id
+_SHORT_IDS = {}
+
+
+def short_id(v):
+    """
+    Return v without "minecraft:", interned so the records of a region share one string per id
+    """
+    s = _SHORT_IDS.get(v)
+    if s is None:
+        s = sys.intern(v[10:] if v.startswith('minecraft:') else v)
+        _SHORT_IDS[v] = s
+    return s
+
+
+def _memory_pos(memories, name):
+    m = memories.get(name)
+    if m is None:
+        return None
+    pos = _value(_value(m['value'])['pos'])
+    return int(pos[0]), int(pos[1]), int(pos[2])
+
+
+class EntityRecord:
+    """
+    Compact record of the fields of an entity, extracted in one pass. Unlike Entity it does not keep the
+    NBT compound alive.
+
+    The item fields (armor_items, hand_items, items, item, saddle_item) keep the item compounds as they are.
+    passengers is a list of EntityRecord.
+    """
+    __slots__ = ('id', 'uuid', 'position', 'health', 'color', 'chested', 'tame', 'owner', 'profession',
+                 'home', 'meeting_point', 'armor_items', 'hand_items', 'items', 'item', 'saddle_item',
+                 'passengers')
+
+    def __init__(self, entity):
+        """
+        entity: the entity compound, python_nbt or the plain values of the fast decoder
+        """
+        get = entity.get
+        v = get('id')
+        self.id = short_id(_value(v)) if v is not None else None
+        v = get('UUID')
+        self.uuid = format_uuid(v) if v is not None else None
+        v = get('Pos')
+        self.position = (float(_value(v[0])), float(_value(v[1])), float(_value(v[2]))) if v else None
+        v = get('Health')
+        self.health = _value(v) if v is not None else None
+        v = get('Color')
+        self.color = _value(v) if v is not None else None
+        self.chested = _value(get('ChestedHorse', 0)) == 1
+        self.tame = _value(get('Tame', 0)) == 1
+        self.armor_items = get('ArmorItems')
+        self.hand_items = get('HandItems')
+        self.items = get('Items')
+        self.item = get('Item')
+        self.saddle_item = get('SaddleItem')
+
+        brain = get('Brain')
+        memories = _value(brain.get('memories')) if brain is not None else None
+        memories = memories or {}
+        self.owner = None
+        if 'Owner' in memories:
+            self.owner = memories['Owner']
+        else:
+            v = get('Owner')
+            if v is not None:
+                # 1.16+ int array, older worlds have a string
+                v = _value(v)
+                self.owner = v if isinstance(v, str) else format_uuid(v)
+        self.home = _memory_pos(memories, 'minecraft:home')
+        self.meeting_point = _memory_pos(memories, 'minecraft:meeting_point')
+        self.profession = None
+        v = get('VillagerData')
+        if v is not None and 'profession' in v:
+            self.profession = short_id(_value(v['profession']))
+        self.passengers = [EntityRecord(p) for p in get('Passengers') or []]
+
+    def is_type(self, ent_type):
+        return self.id == ent_type
+
+    def __repr__(self):
+        return f'EntityRecord({self.id} {self.uuid} {self.position})'
 
 
 def entity_factory(entity):
@@ -16,11 +118,7 @@ class Entity():
 
     @staticmethod
     def _make_uuid(uuid):
-        out = []
-        for d in uuid:
-            d = ctypes.c_uint(int(d)).value
-            out.append(d)
-        return f'{out[0]:x}{out[1]:x}{out[2]:x}{out[3]:x}'
+        return format_uuid(uuid)
 
     def __init__(self, entity):
         self._entity = entity
@@ -0,0 +1,150 @@
+"""
+Search the containers of a world (chests, shulker boxes in chests, chest minecarts, pack animals, dropped items, ...)
+for items
+"""
+import concurrent.futures
+
+from pycraft.error import PycraftException
+from pycraft.prefilter import BytesPrefilter
+from pycraft.region import Region
+
+# block entities and entities that hold items: a list of 'Items' or a single 'Item' (dropped items, item frames)
+REGION_TAGS = ('block_entities',)
+ENTITIES_TAGS = ('Entities',)
+
+
+def short_id(item_id):
+    return item_id[10:] if item_id.startswith('minecraft:') else item_id
+
+
+def _item_count(item):
+    return item.get('Count', item.get('count', 1))
+
+
+def _nested_items(item):
+    """
+    Return the items stored inside an item (shulker boxes, bundles), or an empty list
+    """
+    tag = item.get('tag') or {}
+    block_entity = tag.get('BlockEntityTag') or {}
+    if block_entity.get('Items'):
+        return block_entity['Items']
+    if tag.get('Items'):
+        # bundles
+        return tag['Items']
+    # 1.20.5+ item components
+    components = item.get('components') or {}
+    container = components.get('minecraft:container') or []
+    return [slot['item'] for slot in container if 'item' in slot] + (components.get('minecraft:bundle_contents') or [])
+
+
+def iter_items(items, path=()):
+    """
+    Generator for all of the items in a list of items, including the items inside containers in the list.
+
+    Yields (path, item) where path is the tuple of the ids of the containers the item is in
+    """
+    for item in items:
+        yield path, item
+        nested = _nested_items(item)
+        if nested:
+            yield from iter_items(nested, path + (short_id(item.get('id', '')),))
+
+
+def _container_items(e):
+    if e.get('Items'):
+        return e['Items']
+    if e.get('Item'):
+        return [e['Item']]
+    return []
+
+
+def _position(e):
+    if 'Pos' in e:
+        p = e['Pos']
+        return int(p[0]), int(p[1]), int(p[2])
+    if 'x' in e:
+        return int(e['x']), int(e['y']), int(e['z'])
+    return None
+
+
+def match_container(e, terms, source, bbox=None, center=None, radius=None):
+    """
+    Check a block entity or entity (decoded with the fast decoder) for items matching terms.
+
+    terms: list of strings matched against the item ids (without "minecraft:"). None matches everything.
+
+    Returns a result dict or None if the container is empty, outside bbox / radius or has no matching items:
+    {'id', 'pos', 'source', 'distance', 'items': [{'slot', 'count', 'id', 'path', 'matched'}]}
+    """
+    items = _container_items(e)
+    if not items:
+        return None
+    pos = _position(e)
+    if pos is None:
+        return None
+    if bbox is not None and not (bbox[0] <= pos[0] < bbox[2] and bbox[1] <= pos[2] < bbox[3]):
+        return None
+    distance = None
+    if center is not None:
+        dist2 = (pos[0] - center[0]) ** 2 + (pos[1] - center[1]) ** 2 + (pos[2] - center[2]) ** 2
+        if radius is not None and dist2 > radius * radius:
+            return None
+        distance = dist2 ** 0.5
+    found = []
+    any_match = False
+    for path, item in iter_items(items):
+        item_id = short_id(item.get('id', ''))
+        matched = terms is None or any(term in item_id for term in terms)
+        any_match = any_match or matched
+        found.append({'slot': item.get('Slot', item.get('slot')), 'count': _item_count(item), 'id': item_id,
+                      'path': path, 'matched': matched})
+    if not any_match:
+        return None
+    return {'id': short_id(e.get('id', '')), 'pos': pos, 'source': source, 'distance': distance, 'items': found}
+
+
+def search_region(world_path, rx, rz, terms, bbox=None, center=None, radius=None):
+    """
+    Search the block entities and entities of region (rx, rz). Runs in a worker process for search_world.
+
+    Returns a list of result dicts (see match_container)
+    """
+    results = []
+    # chunks without any of the terms can not match. Without terms every container is a result.
+    prefilter = BytesPrefilter(terms) if terms else None
+    with Region(world_path, rx, rz) as region:
+        chunk_filter = region.bbox_chunk_filter(bbox) if bbox is not None else None
+        for dtype, tags, tag in (('region', REGION_TAGS, 'block_entities'), ('entities', ENTITIES_TAGS, 'Entities')):
+            try:
+                for cx, cz, timestamp, chunk in region.iter_chunks(dtype, decoder='fast', tags=tags,
+                                                                   chunk_filter=chunk_filter, prefilter=prefilter):
+                    for e in chunk.get_tag(tag) or []:
+                        result = match_container(e, terms, dtype, bbox, center, radius)
+                        if result:
+                            results.append(result)
+            except PycraftException:
+                # no file of this type for the region
+                pass
+    return results
+
+
+def result_sort_key(result):
+    return (result['distance'] if result['distance'] is not None else 0.0, result['pos'])
+
+
+def search_world(world_path, regions, terms, bbox=None, center=None, radius=None, processes=None):
+    """
+    Search regions (list of (rx, rz)) for containers holding items matching terms, in parallel worker processes.
+
+    Returns the results of all of the regions (see match_container) sorted by distance from center, then
+    position.
+    """
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(search_region, world_path, rx, rz, terms, bbox, center, radius)
+                   for rx, rz in regions]
+        for future in concurrent.futures.as_completed(futures):
+            results.extend(future.result())
+    results.sort(key=result_sort_key)
+    return results
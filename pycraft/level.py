@@ -1,6 +1,44 @@
 import os
+import struct
+import zlib
 
 from pycraft import DatFile
+from pycraft import nbt
+from pycraft.error import PycraftException
+
+# level.dat is gzip compressed. It is decompressed in blocks of this size until the fields are found.
+READ_BLOCK_SIZE = 16384
+
+
+def read_level_fields(path: str, names):
+    """
+    Read only the named fields of the Data compound of a saved world's level.dat, without reading the rest.
+
+    The file is decompressed a block at a time and scanned with nbt.find_fields, which skips the other tags
+    (WorldGenSettings, Player, ...) and stops once all of the fields are found, so the rest of the file is
+    usually never decompressed.
+
+    :param path: Path to the saved world
+    :param names: names of the fields of Data, e.g. ('LevelName', 'LastPlayed')
+    :return: {name: value} of the fields found, with the values of the fast decoder
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = b''
+    with open(os.path.join(path, 'level.dat'), 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            try:
+                if block:
+                    data += decompressor.decompress(block)
+                else:
+                    data += decompressor.flush()
+            except zlib.error:
+                raise PycraftException(f'Bad level.dat: {path}')
+            try:
+                return nbt.find_fields(data, ('Data',), names)
+            except (IndexError, struct.error, ValueError):
+                if not block:
+                    raise PycraftException(f'Bad level.dat: {path}')
 
 
 class Level(DatFile):
@@ -1,9 +1,10 @@
 import json
 import math
 
+import numpy
 from PIL import Image
 
-from pycraft.colors import get_map_color
+from pycraft.colors import get_map_color_lut
 from pycraft.dat_file import DatFile
 
 
@@ -56,27 +57,81 @@ class Map(DatFile):
     def get_width(self):
         colors = self.get_colors()
         lencolors = len(colors)
-        width = 128 if lencolors == 16384 else math.sqrt(lencolors)
+        width = 128 if lencolors == 16384 else int(math.sqrt(lencolors))
         return width
 
-    def create_image(self, scale=1.0):
+    def get_color_indexes(self):
+        """
+        Return the map colors as a width x width NumPy array of unsigned color bytes
+        """
         width = self.get_width()
-        img = Image.new(mode="RGBA", size=(width, width), color='#00000000')
-        colors = self.get_colors()
-        for y in range(width):
-            for x in range(width):
-                offset = x + y * width
-                color_index = colors[offset]
-                try:
-                    if color_index != 0:
-                        val = get_map_color(color_index)
-                        img.putpixel((x, y), val)
-                except Exception as ex:
-                    print(f'Exception: {ex}')
-                    print(f' - ({x}, {y}) = {offset}')
-                    raise ex
-
-        if scale != 1.0:
-            img = img.resize((int(width * scale), int(width * scale)))
-
-        return img
+        # nbt may return the bytes signed or unsigned. The mask makes them unsigned either way.
+        indexes = numpy.array(self.get_colors().value, dtype=numpy.int16) & 0xff
+        return indexes.astype(numpy.uint8).reshape((width, width))
+
+    def create_image(self, scale=1.0):
+        return render_map_colors(self.get_color_indexes(), scale)
+
+    def get_map_data(self):
+        """
+        Return the decoded contents of this map as a MapData
+        """
+        return MapData(self.get_color_indexes(), self.get_center(), self.get_zoom(), self.get_banners())
+
+
+def render_map_colors(indexes, scale=1.0):
+    """
+    Create an RGBA image from a width x width NumPy array of unsigned map color bytes
+    """
+    width = indexes.shape[0]
+    # one lookup for all of the pixels: (width, width) color bytes -> (width, width, 4) RGBA
+    pixels = numpy.ascontiguousarray(get_map_color_lut()[indexes])
+    img = Image.frombuffer('RGBA', (width, width), pixels, 'raw', 'RGBA', 0, 1)
+
+    if scale != 1.0:
+        img = img.resize((int(width * scale), int(width * scale)))
+
+    return img
+
+
+class MapData:
+    """
+    The decoded contents of a map file: colors, center, zoom and banners.
+
+    Unlike Map it holds only plain values and a NumPy array, so it is cheap to keep
+    around and can be passed between processes.
+    """
+    def __init__(self, color_indexes, center, zoom, banners):
+        self._color_indexes = color_indexes
+        self._center = center
+        self._zoom = zoom
+        self._banners = banners
+
+    def get_origin(self):
+        """
+        return the map origin (x, z) in world (block) coordinates
+        """
+        c = self.get_center()
+        bw = self.width_in_blocks()
+        return c[0] - (bw / 2.0), c[1] - (bw / 2.0)
+
+    def get_zoom(self):
+        return self._zoom
+
+    def width_in_blocks(self):
+        return (128, 256, 512, 1024, 2048)[self.get_zoom()]
+
+    def get_banners(self):
+        return self._banners
+
+    def get_center(self):
+        return self._center
+
+    def get_color_indexes(self):
+        return self._color_indexes
+
+    def get_width(self):
+        return self._color_indexes.shape[0]
+
+    def create_image(self, scale=1.0):
+        return render_map_colors(self._color_indexes, scale)
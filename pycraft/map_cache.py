@@ -0,0 +1,194 @@
+"""
+Persistent on disk cache of decoded maps and rendered map images
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+import numpy
+from PIL import Image
+
+from pycraft.colors import get_map_palette_version
+from pycraft.map import Map
+from pycraft.map import MapData
+
+
+class MapCache:
+    """
+    Cache of decoded maps (MapData) and rendered map images, stored as files in cache_dir.
+
+    Entries are content addressed: the file name is a digest of the map file path, its mtime and size,
+    and for images the scale and map palette version. A map that changed on disk or a new palette
+    therefore never matches an old entry; old entries are simply evicted.
+
+    Using an entry updates its mtime. When the files in the cache add up to more than max_bytes, the least
+    recently used ones are deleted.
+
+    cache = MapCache()
+    img = cache.get_image('/path/to/world/data/map_0.dat', scale=2.0)
+    """
+    DEFAULT_CACHE_DIR = os.path.join(str(Path.home()), '.pycraft', 'maps')
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    DATA_SUFFIX = '.npz'
+    IMAGE_SUFFIX = '.png'
+    # cache files are named <40 hex digit digest><suffix>
+    KEY_LENGTH = 40
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache_dir = cache_dir or self.DEFAULT_CACHE_DIR
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # total size of the cache files, computed on first use
+        self._bytes = None
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @staticmethod
+    def _map_key(map_path):
+        st = os.stat(map_path)
+        return [os.path.abspath(map_path), st.st_mtime_ns, st.st_size]
+
+    def _entry_path(self, key, suffix):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, digest + suffix)
+
+    def data_path(self, map_path):
+        """
+        Path of the cache file for the decoded map_path (which may not exist yet)
+        """
+        return self._entry_path(self._map_key(map_path), self.DATA_SUFFIX)
+
+    def image_path(self, map_path, scale=1.0):
+        """
+        Path of the cache file for the image of map_path rendered at scale (which may not exist yet)
+        """
+        key = self._map_key(map_path) + [float(scale), get_map_palette_version()]
+        return self._entry_path(key, self.IMAGE_SUFFIX)
+
+    def _hit(self, path):
+        if not os.path.exists(path):
+            self._misses += 1
+            return False
+        self._hits += 1
+        try:
+            # mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def get_map_data(self, map_path):
+        """
+        Return the MapData for map_path, decoding the map file and adding it to the cache on a miss
+        """
+        path = self.data_path(map_path)
+        if self._hit(path):
+            try:
+                with numpy.load(path) as entry:
+                    meta = json.loads(str(entry['meta']))
+                    return MapData(entry['colors'], tuple(meta['center']), meta['zoom'], meta['banners'])
+            except (OSError, ValueError, KeyError):
+                # unreadable entry (e.g. a partial write from an old crash). Decode the map again.
+                pass
+        mapdata = Map(map_path).get_map_data()
+        meta = json.dumps({'center': mapdata.get_center(), 'zoom': mapdata.get_zoom(),
+                           'banners': mapdata.get_banners()})
+        self._write(path, lambda f: numpy.savez(f, colors=mapdata.get_color_indexes(), meta=numpy.array(meta)))
+        return mapdata
+
+    def get_image_path(self, map_path, scale=1.0, mapdata=None):
+        """
+        Return the path of the cached PNG of map_path rendered at scale, rendering it on a miss.
+
+        mapdata: optional MapData for map_path, to save looking it up when the image has to be rendered
+        """
+        path = self.image_path(map_path, scale)
+        if not self._hit(path):
+            mapdata = mapdata or self.get_map_data(map_path)
+            img = mapdata.create_image(scale=scale)
+            self._write(path, lambda f: img.save(f, format='PNG'))
+        return path
+
+    def get_image(self, map_path, scale=1.0, mapdata=None):
+        """
+        Return the image of map_path rendered at scale (see get_image_path)
+        """
+        with Image.open(self.get_image_path(map_path, scale, mapdata)) as img:
+            img.load()
+            return img
+
+    def _write(self, path, write):
+        """
+        Write a cache file atomically so other processes never see a partial entry, then evict if needed.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += os.path.getsize(path)
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self._cache_dir) as it:
+            for entry in it:
+                name, suffix = os.path.splitext(entry.name)
+                if suffix in (self.DATA_SUFFIX, self.IMAGE_SUFFIX) and len(name) == self.KEY_LENGTH:
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        if self._max_bytes is None:
+            return
+        if self._bytes is None:
+            self._bytes = sum(size for _mtime, size, _path in self._entries())
+        if self._bytes <= self._max_bytes:
+            return
+        entries = sorted(self._entries())
+        self._bytes = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in entries:
+            if self._bytes <= self._max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self._bytes -= size
+
+    def clear(self):
+        """
+        Delete all of the cache files
+        """
+        with self._lock:
+            for _mtime, _size, path in self._entries():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self._bytes = 0
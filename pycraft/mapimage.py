@@ -1,33 +1,58 @@
 # Create an image from map.dat files
+import concurrent.futures
 import json
 import math
+import os
 
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
 
-from pycraft.chunk import Chunk
-from pycraft.chunk import PoiSection
 from pycraft.colors import get_dye_color
 from pycraft.error import PycraftException
+from pycraft.map import Map
+from pycraft.map_cache import MapCache
+from pycraft.poi_index import PoiIndex
 from pycraft.region import Region
+from pycraft.tiles import DEFAULT_TILE_SIZE
+from pycraft.tiles import MapTileSource
+from pycraft.tiles import TilePyramid
 from pycraft.world import World
 
 
+def _load_map(map_path, scale, cache_dir=None):
+    """
+    Decode and render one map file. Runs in a worker process.
+
+    cache_dir: MapCache directory to read the map and image from (and add them to), None to not use the cache
+
+    Returns (MapData, image)
+    """
+    if cache_dir is None:
+        mapdata = Map(map_path).get_map_data()
+        return mapdata, mapdata.create_image(scale=scale)
+    cache = MapCache(cache_dir)
+    mapdata = cache.get_map_data(map_path)
+    return mapdata, cache.get_image(map_path, scale, mapdata)
+
+
 class MapImage:
-    def __init__(self, config_file_path):
+    def __init__(self, config_file_path, load_maps=True):
+        """
+        load_maps: decode and render all of the maps of the grid (needed for create_image). create_tiles
+        renders the maps itself, tile row by tile row, so with load_maps=False only the first map is
+        decoded to get the size and origin of the grid.
+        """
         self._config = None
         self.images = {}
-        self.load_config(config_file_path)
+        # decoded maps (MapData) by map number, shared by all of the passes
+        self.maps = {}
         self.w0 = None
         self.w = 0
         self.h = 0
         self.block_w = None
         self.mapimage = None
-        self.load_map_data()
         self.imgsize = None
-        self.banner_font_size = int(5 * self.scale)
-        self.banner_font = ImageFont.truetype('Keyboard.ttf', size=self.banner_font_size)
         self.mapobj = None
         self.maporigin = None
         self.mapsize = None
@@ -36,6 +61,14 @@ class MapImage:
         self.map_background_color = '#000000'
         self.bannerW = 6
         self.bannerH = 8
+        # load the config and maps after the defaults above so they are not reset
+        self.load_config(config_file_path)
+        if load_maps:
+            self.load_map_data()
+        else:
+            self.load_grid_geometry()
+        self.banner_font_size = int(5 * self.scale)
+        self.banner_font = ImageFont.truetype('Keyboard.ttf', size=self.banner_font_size)
 
     def create_image(self):
         self.stitch_maps()
@@ -44,6 +77,23 @@ class MapImage:
         self.draw_village_borders()
         self.add_banners()
 
+    def create_tiles(self, out_dir, tile_size=DEFAULT_TILE_SIZE, max_zoom=None):
+        """
+        Write the maps as a tile pyramid (z/x/y PNG tiles) in out_dir instead of one stitched image.
+        Only tiles whose maps changed since the last run are rendered again. Borders, villages and
+        banners are only drawn on the stitched image.
+
+        max_zoom: zoom level of the base tiles. The default is just deep enough for level 0 to be a
+        single tile (see MapTileSource.fit_zoom)
+
+        Returns the number of tiles written
+        """
+        source = MapTileSource(self.world.path, self._config['map'], self.scale, self.map_background_color,
+                               cache_dir=self.map_cache_dir(), tile_size=tile_size, map_width=self.w0 / self.scale)
+        pyramid = TilePyramid(out_dir, source.fit_zoom() if max_zoom is None else max_zoom)
+        return pyramid.update(source, processes=self._config.get('processes', None),
+                              progress=lambda z, count: print(f'Zoom level {z}: {count} tiles written'))
+
     def save_image(self, fname):
         print(f'Writing map to {fname}')
         if not self.mapimage:
@@ -106,33 +156,80 @@ class MapImage:
         # TODO : config should contain a list of "banner fonts" and try each until successful
         for row in self._config['map']:
             for m in row:
-                mapobj = self.world.get_map(m)
+                mapobj = self.get_map(m)
                 banners = mapobj.get_banners()
                 for banner in banners:
                     self.draw_banner(banner)
                 dx += self.w0
             dy += self.w0
 
+    def get_map(self, map_num):
+        """
+        Get the decoded map (MapData) for map_num, loading it if it is not in the cache for this run
+        """
+        if map_num not in self.maps:
+            self.maps[map_num] = self.world.get_map(map_num).get_map_data()
+        return self.maps[map_num]
+
+    def map_cache_dir(self):
+        """
+        The MapCache directory set by config "map_cache" (true for the default directory or a path), None if
+        it is false
+        """
+        map_cache = self._config.get('map_cache', True)
+        if not map_cache:
+            return None
+        return map_cache if isinstance(map_cache, str) else MapCache.DEFAULT_CACHE_DIR
+
     def load_map_data(self):
+        """
+        Decode and render all of the maps in the config.
+
+        The maps are loaded in a pool of worker processes (config "processes", default is one per core,
+        1 loads them in this process). The decoded maps are kept in self.maps for the other passes.
+        Maps and images are read from the persistent MapCache unless config "map_cache" is false. It can
+        also be the path of the cache directory.
+        """
+        map_nums = []
+        for row in self._config['map']:
+            for m in row:
+                if m not in map_nums:
+                    map_nums.append(m)
+        map_paths = [os.path.join(self.world.path, 'data', f'map_{m}.dat') for m in map_nums]
+        processes = self._config.get('processes', None)
+        cache_dir = self.map_cache_dir()
+        if processes == 1 or len(map_nums) < 2:
+            results = [_load_map(path, self.scale, cache_dir) for path in map_paths]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                n = len(map_paths)
+                results = list(executor.map(_load_map, map_paths, [self.scale] * n, [cache_dir] * n))
+        for m, (mapdata, img) in zip(map_nums, results):
+            self.maps[m] = mapdata
+            self.images[m] = img
+
         row_num = 0
         for row in self._config['map']:
             print(f'--row {row_num}--')
             row_num += 1
             for m in row:
-                self.mapobj = self.world.get_map(m)
+                self.mapobj = self.maps[m]
                 print(f'-- map {m} Center: {self.mapobj.get_center()} Origin: {self.mapobj.get_origin()} --')
-                if self.w0 is None:
-                    self.w0 = self.mapobj.get_width() * self.scale
-                    self.w = int(len(self._config['map'][0]) * self.w0)
-                    self.h = int(len(self._config['map']) * self.w0)
-                    self.block_w = self.mapobj.width_in_blocks()
-                img = self.mapobj.create_image(scale=self.scale)
                 if 'saveall' in self._config and self._config['saveall']:
                     print(f'Saving map image: map_{m}.png')
-                    img.save(f'map_{m}.png')
-                self.images[m] = img
+                    self.images[m].save(f'map_{m}.png')
+        self.load_grid_geometry()
 
-        map_0_0 = self.world.get_map(self._config['map'][0][0])
+    def load_grid_geometry(self):
+        """
+        Set the size of the grid in pixels and blocks and its origin from the first map of the grid. All of
+        the maps of a grid have the same size, so only that map is decoded.
+        """
+        map_0_0 = self.get_map(self._config['map'][0][0])
+        self.w0 = map_0_0.get_width() * self.scale
+        self.w = int(len(self._config['map'][0]) * self.w0)
+        self.h = int(len(self._config['map']) * self.w0)
+        self.block_w = map_0_0.width_in_blocks()
         self.maporigin = map_0_0.get_origin()
         self.mapsize = (len(self._config['map'][0]) * self.block_w, len(self._config['map']) * self.block_w)
 
@@ -197,45 +294,20 @@ class MapImage:
             return
         # load bells from all regions on map
         start_pos = self.maporigin
-        last_map = self.world.get_map(self._config['map'][-1:][0][-1:][0])
+        last_map = self.get_map(self._config['map'][-1:][0][-1:][0])
         o = last_map.get_origin()
         bw = last_map.width_in_blocks()
         end_pos = (o[0] + bw, o[1] + bw)
-        vcenters = []
-        # visit each region on map collecting bells
+        # Now draw boxes around all the villages
+        village_w = 32  # village width
         print(f'Start: {start_pos}, End: {end_pos}')
-        print(f' - This will take a long time...')
-        y = start_pos[1]
-        while y < end_pos[1] + Region.BLOCK_WIDTH:
-            x = start_pos[0]
-            while x < end_pos[0] + Region.BLOCK_WIDTH:
-                region = self.world.get_region((x, 0, y))
-                # print(f'Region of ({x}, {Y}): {region.filename}')
-                for cy in range(Chunk.BLOCK_WIDTH):
-                    for cx in range(Chunk.BLOCK_WIDTH):
-                        try:
-                            chunk = region.get_r_chunk('poi', cx, cy)
-                        except PycraftException:
-                            # region doesn't exist
-                            continue
-                        sections = chunk.sections
-                        for section in sections:
-                            s = PoiSection(sections[section])
-                            records = s.records
-                            for record in records:
-                                t = record['type'].value
-                                if t.startswith('minecraft:'):
-                                    t = t[10:]
-                                if t == 'meeting':
-                                    pos = record['pos'].value
-                                    tickets = record['free_tickets'].value
-                                    vcenters.append({'pos': pos, 'tickets': tickets})
-                x += Region.BLOCK_WIDTH
-            y += Region.BLOCK_WIDTH
+        # include villages whose center is just off the map but whose border is on it
+        bbox = (start_pos[0] - village_w, start_pos[1] - village_w, end_pos[0] + village_w, end_pos[1] + village_w)
+        vcenters = []
+        for poi in PoiIndex(self.world.path).query(bbox, types=('meeting',)):
+            vcenters.append({'pos': poi['pos'], 'tickets': poi['free_tickets']})
         print(f'FOUND {len(vcenters)} villages')
-        # Now draw boxes around all the villages
         draw = ImageDraw.Draw(self.mapimage)
-        village_w = 32  # village width
         for village in vcenters:
             pos = village['pos']
             p0 = self.block_to_map((pos[0] - village_w, pos[2] - village_w))
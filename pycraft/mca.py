@@ -28,12 +28,114 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import array
+from collections import OrderedDict
+import functools
 import gzip
-import zlib
+import mmap
 import os
+import struct
+import sys
+import threading
+import zlib
 from pycraft.error import PycraftException
 
 
+class FileHandlePool:
+    """Shared, bounded pool of open region files.
+
+    Mca objects open their file through a pool when they need it. When more than max_open files are open the
+    least recently used ones that are not being read are closed; an Mca whose file was closed reopens it
+    transparently on its next read. This keeps the number of open descriptors (and memory maps) bounded no
+    matter how many Mca / Region objects exist."""
+    DEFAULT_MAX_OPEN = 128
+
+    def __init__(self, max_open=DEFAULT_MAX_OPEN):
+        self._max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.RLock()
+        self._opens = 0
+        self._closes = 0
+
+    @property
+    def max_open(self):
+        return self._max_open
+
+    @max_open.setter
+    def max_open(self, max_open):
+        with self._lock:
+            self._max_open = max_open
+            self._evict()
+
+    def __len__(self):
+        return len(self._open)
+
+    def acquire(self, mca):
+        """Make sure the file of mca is open and mark it as in use. Must be paired with release.
+
+        A file that is not in use is reopened (and its header read again) if it changed on disk since it
+        was opened, so a long running program does not read chunks with the offsets of an old header."""
+        with self._lock:
+            key = id(mca)
+            if key in self._open and mca._users == 0 and mca._file_changed() and mca._close_file():
+                del self._open[key]
+                self._closes += 1
+            if key not in self._open:
+                mca._open_file()
+                self._opens += 1
+                self._open[key] = mca
+            self._open.move_to_end(key)
+            mca._users += 1
+            self._evict()
+
+    def release(self, mca):
+        with self._lock:
+            mca._users -= 1
+
+    def discard(self, mca):
+        """Close the file of mca and remove it from the pool."""
+        with self._lock:
+            if mca._close_file() and self._open.pop(id(mca), None) is not None:
+                self._closes += 1
+
+    def _evict(self):
+        if len(self._open) <= self._max_open:
+            return
+        for key, mca in list(self._open.items()):
+            if len(self._open) <= self._max_open:
+                break
+            # files being read, or with memoryviews handed out by get_payload, stay open
+            if mca._users == 0 and mca._close_file():
+                del self._open[key]
+                self._closes += 1
+
+    def close_all(self):
+        with self._lock:
+            for mca in list(self._open.values()):
+                self.discard(mca)
+
+    def stats(self):
+        with self._lock:
+            return {'open': len(self._open), 'max_open': self._max_open, 'opens': self._opens,
+                    'closes': self._closes}
+
+
+# Pool used by Mca unless another one is passed in
+FILE_POOL = FileHandlePool()
+
+
+def _with_file(method):
+    """Decorator for Mca methods that read the file: opens it through the pool and keeps it open for the call."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._pool.acquire(self)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._pool.release(self)
+    return wrapper
+
+
 class Mca:
     """Class used to read Minecraft region files and the chunk information contained within.
     
@@ -44,6 +146,19 @@ class Mca:
     region = Mca('/opt/mc/region/r.1.1.mca')
     nbt = region.get_data(0,0)  # gets the raw nbt data for chunk 0,0
     # here you can do stuff with that nbt data. It is the same format as if you open('level.dat','r+b)
+
+    With memory_map=True the file is memory-mapped once and the location and timestamp tables are parsed into
+    arrays when the file is opened, so looking up a chunk does not touch the file. get_payload() then returns
+    the compressed chunk data as a memoryview into the mapped file without copying it.
+
+    region = Mca('/opt/mc/region/r.1.1.mca', memory_map=True)
+
+    Files are opened read only through a FileHandlePool (FILE_POOL by default), which may close them when too
+    many are open; they are reopened when needed. Mca can be used as a context manager to close the file when
+    done.
+
+    with Mca('/opt/mc/region/r.1.1.mca') as region:
+        nbt = region.get_data(0, 0)
     """
     SECTOR_OFFSET_SIZE = 3  # Chunk offset is a 3-byte value
     SECTOR_COUNT_SIZE = 1  # Chunk size is a 1-byte value
@@ -57,24 +172,117 @@ class Mca:
     DATA_HEADER_SIZE = DATA_SIZE_SIZE + COMPRESSION_TYPE_SIZE  # Full size of the chunk header (5 bytes)
     DIMENSION_SIZE = 1 << DIMENSION_SIZE_POWER  # Used for bitwise operations on the provided chunk x and z values
     DIMENSION_SIZE_MASK = DIMENSION_SIZE - 1  # DIM_SIZE = 0b100000, MASK = -0b11111 and used for bitwise operations
-    INDEX_COUNT = DIMENSION_SIZE * DIMENSION_COUNT  # How many indexes (32 * 2 = 64)
-    HEADER_SIZE = SECTOR_DETAILS_SIZE + INDEX_COUNT  # 64 indexes + 4 byte details = 68
+    INDEX_COUNT = 1 << (DIMENSION_SIZE_POWER * DIMENSION_COUNT)  # How many indexes (32 * 32 = 1024)
+    HEADER_SIZE = SECTOR_DETAILS_SIZE * INDEX_COUNT  # 1024 indexes * 4 byte details = 4096
     SECTOR_SIZE = 1 << SECTOR_SIZE_POWER  # 4096 bytes
     # Compression types
     COMPRESSION_GZIP = 1
     COMPRESSION_ZLIB = 2
+    # Chunk data header: 4 byte big-endian size followed by the 1 byte compression type
+    DATA_HEADER = struct.Struct('>IB')
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, memory_map=False, pool=None):
         """Given a filename, returns an object to reference region file data.
 
-        We open the file as a binary file. Once you instantiate an object using this class,
+        We open the file as a read only binary file. Once you instantiate an object using this class,
         you are likely to call get_data(chunkX, chunkZ) or get_timestamp(chunkX, chunkZ).
         We frequently pass chunkX, chunkZ as *args in this Class.
 
-        filepath: full path to the region file (e.g. /opt/mc/region/r.1.1.mca)"""
+        filepath: full path to the region file (e.g. /opt/mc/region/r.1.1.mca)
+        memory_map: map the file into memory and cache the header tables (read only)
+        pool: FileHandlePool to open the file through, FILE_POOL by default"""
         if not os.path.isfile(filepath):
             raise PycraftException(f'mca file missing: {filepath}')
-        self.data = open(filepath, 'r+b')
+        self._filepath = filepath
+        self._memory_map = memory_map
+        self._pool = pool if pool is not None else FILE_POOL
+        self._users = 0
+        self.data = None
+        self._map = None
+        self._view = None
+        self._locations = None
+        self._timestamps = None
+        # (size, mtime_ns) of the file when it was opened
+        self._file_stat = None
+        # open the file now so missing / unreadable files are reported here and the header is loaded
+        self._pool.acquire(self)
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open_file(self):
+        """Open the file (read only). Called by the pool."""
+        self.data = open(self._filepath, 'rb')
+        st = os.fstat(self.data.fileno())
+        self._file_stat = (st.st_size, st.st_mtime_ns)
+        if self._memory_map:
+            self._load_header()
+
+    def _file_changed(self):
+        """True if the file on disk is not the one that was opened (different size or mtime)."""
+        try:
+            st = os.stat(self._filepath)
+        except OSError:
+            # deleted: keep reading the open file
+            return False
+        return (st.st_size, st.st_mtime_ns) != self._file_stat
+
+    def _close_file(self):
+        """Release the memory map (if any) and close the file. Called by the pool.
+
+        Returns False if the file could not be closed because memoryviews of the map are still in use."""
+        if self._map is not None:
+            self._view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                self._view = memoryview(self._map)
+                return False
+            self._view = None
+            self._map = None
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        return True
+
+    @staticmethod
+    def _read_table(table_bytes):
+        """Convert a table of 1024 big-endian 4 byte values into an array of unsigned ints.
+
+        Region files can be truncated (or empty), so missing entries are treated as zero."""
+        table = array.array('I')
+        table.frombytes(table_bytes.ljust(Mca.HEADER_SIZE, b'\x00'))
+        if sys.byteorder == 'little':
+            table.byteswap()
+        return table
+
+    def _load_header(self):
+        """Memory-map the file and parse the location and timestamp tables."""
+        if os.fstat(self.data.fileno()).st_size > 0:
+            self._map = mmap.mmap(self.data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            header = self._map[:2 * self.HEADER_SIZE]
+        else:
+            # mmap cannot map an empty file. An empty region file has no chunks.
+            header = b''
+        self._locations = self._read_table(header[:self.HEADER_SIZE])
+        self._timestamps = self._read_table(header[self.HEADER_SIZE:])
+
+    @property
+    def memory_mapped(self):
+        return self._memory_map
+
+    @property
+    def is_open(self):
+        return self.data is not None
+
+    def close(self):
+        """Release the memory map (if any) and close the file. It is reopened if the Mca is used again."""
+        self._pool.discard(self)
 
     def get_index(self, *args):
         """Get the index for the chunk
@@ -113,11 +321,14 @@ class Mca:
         See https://minecraft.gamepedia.com/Region_file_format#Chunk_timestamps"""
         return self.get_index(*args) * self.TIMESTAMP_SIZE + self.HEADER_SIZE
 
+    @_with_file
     def get_sector_offset(self, *args):
         """Return the sector offset value.
 
         Uses the earlier-defined function to seek appropriately in the file, and then it will return an int representing
         how many 4096 byte offsets from the start of the file the chunk is at."""
+        if self._locations is not None:
+            return self._locations[self.get_index(*args)] >> 8
         offset = self.get_sector_offset_offset(*args)
         self.data.seek(offset, 0)
         return int.from_bytes(self.data.read(self.SECTOR_OFFSET_SIZE), 'big')
@@ -129,23 +340,30 @@ class Mca:
         of where the chunk data begins."""
         return self.get_sector_offset(*args) << self.SECTOR_SIZE_POWER
 
+    @_with_file
     def get_sector_count(self, *args):
         """Return the sector size value.
 
         Uses the earlier-defined function to seek appropriately in the file, and then it will return an int representing
         how many 4096 bytes the chunk data occupies."""
+        if self._locations is not None:
+            return self._locations[self.get_index(*args)] & 0xff
         offset = self.get_sector_count_offset(*args)
         self.data.seek(offset)
         return int.from_bytes(self.data.read(self.SECTOR_COUNT_SIZE), 'big')
 
+    @_with_file
     def get_timestamp(self, *args):
         """Return the last modified timestamp.
 
         Seeks using the timestamp_offset and returns the timestamp as an int"""
+        if self._timestamps is not None:
+            return self._timestamps[self.get_index(*args)]
         offset = self.get_timestamp_offset(*args)
         self.data.seek(offset, 0)
         return int.from_bytes(self.data.read(self.TIMESTAMP_SIZE), 'big')
 
+    @_with_file
     def get_data_size(self, *args):
         """Return the byte size for the chunk.
 
@@ -153,22 +371,33 @@ class Mca:
 
         See https://minecraft.gamepedia.com/Region_file_format#Chunk_data"""
         offset = self.get_data_offset(*args)
+        if self._locations is not None:
+            return self._read_data_header(offset)[0]
         self.data.seek(offset, 0)
         return int.from_bytes(self.data.read(self.DATA_SIZE_SIZE), 'big')
 
+    @_with_file
     def get_compression_type(self, *args):
         """Return the compression type for the chunk.
 
         This value is either 1 or 2 for GZip or Zlib respectively"""
+        if self._locations is not None:
+            return self._read_data_header(self.get_data_offset(*args))[1]
         offset = self.get_data_offset(*args) + self.DATA_SIZE_SIZE
         self.data.seek(offset, 0)
         return int.from_bytes(self.data.read(self.COMPRESSION_TYPE_SIZE), 'big')
 
+    @_with_file
     def get_data(self, *args):
         """Returns NBT data for the chunk specified by x and z in *args.
 
         We get the start location of the chunk data. If that is valid, we skip the 4-byte header and read the size
         learned from get_data_size. Based on the compression type, we either gzip or zlib decompress the data."""
+        if self._locations is not None:
+            payload = self.get_payload(*args)
+            if payload is None:
+                return None
+            return self._decompress(*payload)
 
         datastart = self.get_data_offset(*args)
         if datastart != 0:
@@ -177,7 +406,91 @@ class Mca:
             self.data.seek(payloadstart, 0)
             payload = self.data.read(payloadsize)
             compressiontype = self.get_compression_type(*args)
-            if compressiontype == self.COMPRESSION_GZIP:
-                return gzip.decompress(payload)
-            elif compressiontype == self.COMPRESSION_ZLIB:
-                return zlib.decompress(payload)
+            return self._decompress(compressiontype, payload)
+
+    def _decompress(self, compressiontype, payload):
+        """Decompress a chunk payload. Returns None for unknown compression types."""
+        if compressiontype == self.COMPRESSION_GZIP:
+            return gzip.decompress(payload)
+        elif compressiontype == self.COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        return None
+
+    @_with_file
+    def _header_tables(self):
+        """Return the (locations, timestamps) tables, reading the header once if the file is not memory mapped."""
+        if self._locations is not None:
+            return self._locations, self._timestamps
+        self.data.seek(0, 0)
+        header = self.data.read(2 * self.HEADER_SIZE)
+        return self._read_table(header[:self.HEADER_SIZE]), self._read_table(header[self.HEADER_SIZE:])
+
+    @_with_file
+    def _read_chunk_at(self, datastart):
+        """Read and decompress the chunk stored at byte offset datastart (file mode, not memory mapped)."""
+        self.data.seek(datastart, 0)
+        header = self.data.read(self.DATA_HEADER_SIZE)
+        if len(header) < self.DATA_HEADER_SIZE:
+            return None
+        datasize, compressiontype = self.DATA_HEADER.unpack(header)
+        payload = self.data.read(datasize - self.COMPRESSION_TYPE_SIZE)
+        return self._decompress(compressiontype, payload)
+
+    def get_timestamps(self):
+        """Return a dict of {(chunkX, chunkZ): timestamp} for every chunk present in the region."""
+        locations, timestamps = self._header_tables()
+        return {(index & self.DIMENSION_SIZE_MASK, index >> self.DIMENSION_SIZE_POWER): timestamps[index]
+                for index in range(self.INDEX_COUNT) if locations[index] >> 8 != 0}
+
+    def iter_chunks(self, known_timestamps=None, chunk_filter=None):
+        """Generator for all of the chunks present in the region.
+
+        The header is read once, empty slots are skipped and the present chunks are visited in the order they are
+        stored in the file so the file is read sequentially. Yields (chunkX, chunkZ, timestamp, data) where data
+        is the decompressed NBT data for the chunk.
+
+        known_timestamps: optional dict of {(chunkX, chunkZ): timestamp}. Chunks whose timestamp matches are
+        skipped without being read.
+        chunk_filter: optional function called with (chunkX, chunkZ). Chunks for which it returns False are
+        skipped without being read."""
+        locations, timestamps = self._header_tables()
+        present = sorted((locations[index] >> 8, index) for index in range(self.INDEX_COUNT)
+                         if locations[index] >> 8 != 0)
+        for sector, index in present:
+            chunk_x = index & self.DIMENSION_SIZE_MASK
+            chunk_z = index >> self.DIMENSION_SIZE_POWER
+            if known_timestamps and known_timestamps.get((chunk_x, chunk_z)) == timestamps[index]:
+                continue
+            if chunk_filter is not None and not chunk_filter(chunk_x, chunk_z):
+                continue
+            if self._locations is not None:
+                data = self.get_data(chunk_x, chunk_z)
+            else:
+                data = self._read_chunk_at(sector << self.SECTOR_SIZE_POWER)
+            if data is not None:
+                yield chunk_x, chunk_z, timestamps[index], data
+
+    @_with_file
+    def _read_data_header(self, offset):
+        """Return (data size, compression type) from the chunk header at offset in the memory map."""
+        if self._map is None or offset == 0 or offset + self.DATA_HEADER_SIZE > len(self._map):
+            return 0, 0
+        return self.DATA_HEADER.unpack_from(self._map, offset)
+
+    @_with_file
+    def get_payload(self, *args):
+        """Return (compression type, compressed data) for the chunk or None if the chunk is not present.
+
+        Only available with memory_map=True. The data is a memoryview slice of the mapped file, so no bytes are
+        copied until the payload is decompressed."""
+        if self._locations is None:
+            raise PycraftException('get_payload requires a memory mapped Mca')
+        datastart = self.get_data_offset(*args)
+        if datastart == 0:
+            return None
+        datasize, compressiontype = self._read_data_header(datastart)
+        if datasize == 0:
+            return None
+        payloadstart = datastart + self.DATA_HEADER_SIZE
+        # the data size includes the compression type byte
+        return compressiontype, self._view[payloadstart:payloadstart + datasize - self.COMPRESSION_TYPE_SIZE]
@@ -1,3 +1,7 @@
+import io
+import struct
+
+import numpy
 import python_nbt.nbt as nbt
 
 
@@ -7,3 +11,239 @@ def read_bytes(data):
     # Without it everything comes back empty
     _name = nbt.NBTTagString(buffer=data).value
     return nbt.TAGLIST[_type](buffer=data)
+
+
+def read_payload_bytes(data, tag_type):
+    """
+    Read a single tag payload (no type byte or name) of type tag_type with python_nbt
+    """
+    return nbt.TAGLIST[tag_type](buffer=io.BytesIO(data))
+
+
+# Fast decoder
+#
+# Parses NBT straight from bytes / memoryview with struct and returns plain python values:
+# compounds are dicts, lists are lists, strings are str and numbers are int / float.
+# TAG_Byte_Array, TAG_Int_Array and TAG_Long_Array are returned as (big-endian) NumPy arrays
+# that share memory with the data instead of one python int per element.
+#
+# See https://minecraft.fandom.com/wiki/NBT_format
+
+TAG_END = 0
+TAG_BYTE = 1
+TAG_SHORT = 2
+TAG_INT = 3
+TAG_LONG = 4
+TAG_FLOAT = 5
+TAG_DOUBLE = 6
+TAG_BYTE_ARRAY = 7
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_INT_ARRAY = 11
+TAG_LONG_ARRAY = 12
+
+_BYTE = struct.Struct('>b')
+_USHORT = struct.Struct('>H')
+_INT = struct.Struct('>i')
+_LIST_HEADER = struct.Struct('>bi')
+
+# tag type: (struct format character, size) for fixed size values
+_NUMBERS = {
+    TAG_BYTE: ('b', 1),
+    TAG_SHORT: ('h', 2),
+    TAG_INT: ('i', 4),
+    TAG_LONG: ('q', 8),
+    TAG_FLOAT: ('f', 4),
+    TAG_DOUBLE: ('d', 8),
+}
+_NUMBER_STRUCTS = {tag_type: struct.Struct('>' + fmt) for tag_type, (fmt, size) in _NUMBERS.items()}
+
+# tag type: (NumPy dtype, item size) for arrays
+_ARRAYS = {
+    TAG_BYTE_ARRAY: (numpy.dtype('i1'), 1),
+    TAG_INT_ARRAY: (numpy.dtype('>i4'), 4),
+    TAG_LONG_ARRAY: (numpy.dtype('>i8'), 8),
+}
+
+
+def _read_string(data, offset):
+    length = _USHORT.unpack_from(data, offset)[0]
+    offset += 2
+    return str(data[offset:offset + length], 'utf-8', 'replace'), offset + length
+
+
+def _read_array(data, offset, tag_type):
+    length = _INT.unpack_from(data, offset)[0]
+    offset += 4
+    dtype, size = _ARRAYS[tag_type]
+    return numpy.frombuffer(data, dtype=dtype, count=length, offset=offset), offset + length * size
+
+
+def _read_list(data, offset):
+    item_type, length = _LIST_HEADER.unpack_from(data, offset)
+    offset += 5
+    if length <= 0 or item_type == TAG_END:
+        return [], offset
+    if item_type in _NUMBERS:
+        fmt, size = _NUMBERS[item_type]
+        return list(struct.unpack_from(f'>{length}{fmt}', data, offset)), offset + length * size
+    items = []
+    for _ in range(length):
+        item, offset = _read_payload(data, offset, item_type)
+        items.append(item)
+    return items, offset
+
+
+def _read_compound(data, offset):
+    compound = {}
+    while True:
+        tag_type = data[offset]
+        offset += 1
+        if tag_type == TAG_END:
+            return compound, offset
+        name, offset = _read_string(data, offset)
+        compound[name], offset = _read_payload(data, offset, tag_type)
+
+
+def _read_payload(data, offset, tag_type):
+    if tag_type in _NUMBER_STRUCTS:
+        return _NUMBER_STRUCTS[tag_type].unpack_from(data, offset)[0], offset + _NUMBERS[tag_type][1]
+    if tag_type == TAG_STRING:
+        return _read_string(data, offset)
+    if tag_type == TAG_COMPOUND:
+        return _read_compound(data, offset)
+    if tag_type == TAG_LIST:
+        return _read_list(data, offset)
+    if tag_type in _ARRAYS:
+        return _read_array(data, offset, tag_type)
+    raise ValueError(f'Unrecognized tag type {tag_type} at offset {offset}')
+
+
+def _skip_list(data, offset):
+    item_type, length = _LIST_HEADER.unpack_from(data, offset)
+    offset += 5
+    if length <= 0 or item_type == TAG_END:
+        return offset
+    if item_type in _NUMBERS:
+        return offset + length * _NUMBERS[item_type][1]
+    for _ in range(length):
+        offset = _skip_payload(data, offset, item_type)
+    return offset
+
+
+def _skip_compound(data, offset):
+    while True:
+        tag_type = data[offset]
+        offset += 1
+        if tag_type == TAG_END:
+            return offset
+        offset += 2 + _USHORT.unpack_from(data, offset)[0]
+        offset = _skip_payload(data, offset, tag_type)
+
+
+def _skip_payload(data, offset, tag_type):
+    """
+    Return the offset just past the payload at offset without building any values.
+    Numbers, strings, arrays and lists of numbers are skipped by length.
+    """
+    if tag_type in _NUMBERS:
+        return offset + _NUMBERS[tag_type][1]
+    if tag_type == TAG_STRING:
+        return offset + 2 + _USHORT.unpack_from(data, offset)[0]
+    if tag_type in _ARRAYS:
+        return offset + 4 + _INT.unpack_from(data, offset)[0] * _ARRAYS[tag_type][1]
+    if tag_type == TAG_LIST:
+        return _skip_list(data, offset)
+    if tag_type == TAG_COMPOUND:
+        return _skip_compound(data, offset)
+    raise ValueError(f'Unrecognized tag type {tag_type} at offset {offset}')
+
+
+def scan_bytes(data, names=None):
+    """
+    Index the tags in the root compound of uncompressed NBT data without decoding them.
+
+    names: optional collection of tag names. Other tags are skipped and left out of the index.
+
+    Returns {name: (tag_type, start, end)} where data[start:end] is the payload of the tag.
+    Use decode_payload or read_payload_bytes to decode a payload.
+    """
+    if _BYTE.unpack_from(data, 0)[0] != TAG_COMPOUND:
+        raise ValueError('Root tag is not a compound')
+    offset = 3 + _USHORT.unpack_from(data, 1)[0]
+    index = {}
+    while True:
+        tag_type = data[offset]
+        offset += 1
+        if tag_type == TAG_END:
+            return index
+        name, offset = _read_string(data, offset)
+        end = _skip_payload(data, offset, tag_type)
+        if names is None or name in names:
+            index[name] = (tag_type, offset, end)
+        offset = end
+
+
+def decode_payload(data, tag_type, offset=0):
+    """
+    Decode a single tag payload of type tag_type at offset with the fast decoder.
+    """
+    return _read_payload(data, offset, tag_type)[0]
+
+
+def decode_bytes(data):
+    """
+    Decode uncompressed NBT data (bytes, bytearray or memoryview) with the fast decoder.
+
+    Returns the value of the root tag, normally a dict.
+    """
+    tag_type = _BYTE.unpack_from(data, 0)[0]
+    _name, offset = _read_string(data, 1)
+    value, _offset = _read_payload(data, offset, tag_type)
+    return value
+
+
+def find_fields(data, path, names):
+    """
+    Decode only the tags in names from the compound at path in uncompressed NBT data, with the fast decoder.
+    Everything else is skipped without being decoded and the scan stops as soon as all of names are found.
+
+    path: names of the nested compounds from the root compound, e.g. ('Data',) for level.dat
+    names: collection of tag names to decode
+
+    Returns {name: value} for the names that were found.
+    Raises IndexError if data ends before the scan does, so a caller that decompresses data in
+    pieces can add more data and try again.
+    """
+    if _BYTE.unpack_from(data, 0)[0] != TAG_COMPOUND:
+        raise ValueError('Root tag is not a compound')
+    offset = 3 + _USHORT.unpack_from(data, 1)[0]
+    wanted = set(names)
+    found = {}
+    for compound in path:
+        while True:
+            tag_type = data[offset]
+            offset += 1
+            if tag_type == TAG_END:
+                return found
+            name, offset = _read_string(data, offset)
+            if name == compound and tag_type == TAG_COMPOUND:
+                break
+            offset = _skip_payload(data, offset, tag_type)
+    while wanted:
+        tag_type = data[offset]
+        offset += 1
+        if tag_type == TAG_END:
+            break
+        name, offset = _read_string(data, offset)
+        if name in wanted:
+            value, offset = _read_payload(data, offset, tag_type)
+            if offset > len(data):
+                # a string or list cut off by the end of the data
+                raise IndexError('NBT data is truncated')
+            found[name] = value
+            wanted.discard(name)
+        else:
+            offset = _skip_payload(data, offset, tag_type)
+    return found
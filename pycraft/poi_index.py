@@ -0,0 +1,180 @@
+"""
+Persistent spatial index of the points of interest (POI) in a world
+"""
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+
+import numpy
+
+from pycraft.region import Region
+
+
+def _short_type(poi_type):
+    return poi_type[10:] if poi_type.startswith('minecraft:') else poi_type
+
+
+class PoiIndex:
+    """
+    Index of the POI records (position, type and free tickets) of a world.
+
+    The records of each region are kept in compact NumPy arrays and saved in cache_dir, keyed by the
+    mtime and size of the region's POI file and the chunk timestamps in its header. When a POI file
+    changes only the chunks whose timestamp changed are read again.
+
+    Types are stored without the "minecraft:" prefix.
+
+    index = PoiIndex(world_path)
+    for poi in index.query((x0, z0, x1, z1), types=('meeting',)):
+        print(poi['pos'], poi['free_tickets'])
+    """
+    DEFAULT_CACHE_DIR = os.path.join(str(Path.home()), '.pycraft', 'poi')
+
+    def __init__(self, world_path, cache_dir=None):
+        self._world_path = world_path
+        world_key = hashlib.sha1(os.path.abspath(world_path).encode('utf-8')).hexdigest()[:16]
+        self._cache_dir = os.path.join(cache_dir or self.DEFAULT_CACHE_DIR, world_key)
+        os.makedirs(self._cache_dir, exist_ok=True)
+        # region arrays by (rx, rz), loaded on first use
+        self._regions = {}
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def _poi_path(self, rx, rz):
+        return os.path.join(self._world_path, 'poi', f'r.{rx}.{rz}.mca')
+
+    def _index_path(self, rx, rz):
+        return os.path.join(self._cache_dir, f'r.{rx}.{rz}.npz')
+
+    def _read_index(self, rx, rz):
+        path = self._index_path(rx, rz)
+        if not os.path.exists(path):
+            return None
+        try:
+            with numpy.load(path) as entry:
+                return {name: entry[name] for name in entry.files}
+        except (OSError, ValueError):
+            return None
+
+    def _write_index(self, rx, rz, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, **entry)
+            os.replace(tmp_path, self._index_path(rx, rz))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _empty_records():
+        return {'x': numpy.zeros(0, dtype=numpy.int32), 'y': numpy.zeros(0, dtype=numpy.int32),
+                'z': numpy.zeros(0, dtype=numpy.int32), 'type': numpy.zeros(0, dtype=numpy.uint16),
+                'free_tickets': numpy.zeros(0, dtype=numpy.int16), 'types': numpy.zeros(0, dtype=str)}
+
+    def _read_records(self, region, known_timestamps):
+        """
+        Read the records of the chunks that changed since known_timestamps into lists
+        """
+        x, y, z, types, tickets = [], [], [], [], []
+        for cx, cz, timestamp, chunk in region.iter_chunks('poi', known_timestamps=known_timestamps,
+                                                           decoder='fast', tags=('Sections',)):
+            sections = chunk.sections
+            for section in sections.values():
+                for record in section.get('Records', []):
+                    pos = record['pos']
+                    x.append(int(pos[0]))
+                    y.append(int(pos[1]))
+                    z.append(int(pos[2]))
+                    types.append(_short_type(record['type']))
+                    tickets.append(record.get('free_tickets', 0))
+        return x, y, z, types, tickets
+
+    def _refresh_region(self, rx, rz):
+        """
+        Return the index arrays for region (rx, rz), updating the saved index if the POI file changed.
+        Returns None if the region has no POI file.
+        """
+        poi_path = self._poi_path(rx, rz)
+        if not os.path.isfile(poi_path):
+            return None
+        st = os.stat(poi_path)
+        stat = numpy.array([st.st_mtime_ns, st.st_size], dtype=numpy.int64)
+        entry = self._read_index(rx, rz)
+        if entry is not None and numpy.array_equal(entry['stat'], stat):
+            return entry
+        if entry is None:
+            entry = self._empty_records()
+            entry['timestamps'] = numpy.zeros(1024, dtype=numpy.uint32)
+
+        with Region(self._world_path, rx, rz) as region:
+            current = region.get_timestamps('poi')
+            old = entry['timestamps']
+            known = {(index & 31, index >> 5): int(old[index]) for index in numpy.flatnonzero(old)}
+            # keep the records of the chunks that did not change
+            unchanged = numpy.zeros(1024, dtype=bool)
+            for (cx, cz), timestamp in current.items():
+                if known.get((cx, cz)) == timestamp:
+                    unchanged[cx | cz << 5] = True
+            x, y, z, types, tickets = self._read_records(region, known)
+
+        keep = unchanged[((entry['x'] >> 4) & 31) | ((entry['z'] >> 4) & 31) << 5]
+        all_types = [str(t) for t in entry['types'][entry['type'][keep]]] + types
+        type_names, type_ids = numpy.unique(numpy.array(all_types, dtype=str), return_inverse=True)
+        timestamps = numpy.zeros(1024, dtype=numpy.uint32)
+        for (cx, cz), timestamp in current.items():
+            timestamps[cx | cz << 5] = timestamp
+        entry = {
+            'x': numpy.concatenate((entry['x'][keep], numpy.array(x, dtype=numpy.int32))),
+            'y': numpy.concatenate((entry['y'][keep], numpy.array(y, dtype=numpy.int32))),
+            'z': numpy.concatenate((entry['z'][keep], numpy.array(z, dtype=numpy.int32))),
+            'type': type_ids.astype(numpy.uint16),
+            'free_tickets': numpy.concatenate((entry['free_tickets'][keep],
+                                               numpy.array(tickets, dtype=numpy.int16))),
+            'types': type_names,
+            'timestamps': timestamps,
+            'stat': stat
+        }
+        self._write_index(rx, rz, entry)
+        return entry
+
+    def get_region(self, rx, rz):
+        """
+        Return the index arrays for region (rx, rz) as a dict with the keys x, y, z, type (index into
+        types), free_tickets and types. Returns None if the region has no POI file.
+        """
+        if (rx, rz) not in self._regions:
+            self._regions[(rx, rz)] = self._refresh_region(rx, rz)
+        return self._regions[(rx, rz)]
+
+    def query(self, bbox, types=None):
+        """
+        Find the POI records inside bbox.
+
+        bbox: (x0, z0, x1, z1) in world (block) coordinates. x0 <= x < x1 and z0 <= z < z1
+        types: optional collection of POI types (with or without the "minecraft:" prefix)
+
+        Returns a list of dicts with 'pos' (x, y, z), 'type' and 'free_tickets'
+        """
+        x0, z0, x1, z1 = bbox
+        wanted = None if types is None else set(_short_type(t) for t in types)
+        results = []
+        for rx, rz in Region.bbox_positions(bbox):
+            entry = self.get_region(rx, rz)
+            if entry is None or len(entry['x']) == 0:
+                continue
+            x, z = entry['x'], entry['z']
+            mask = (x >= x0) & (x < x1) & (z >= z0) & (z < z1)
+            if wanted is not None:
+                type_mask = numpy.array([str(t) in wanted for t in entry['types']], dtype=bool)
+                mask &= type_mask[entry['type']]
+            for i in numpy.flatnonzero(mask):
+                results.append({
+                    'pos': (int(x[i]), int(entry['y'][i]), int(z[i])),
+                    'type': str(entry['types'][entry['type'][i]]),
+                    'free_tickets': int(entry['free_tickets'][i])
+                })
+        return results
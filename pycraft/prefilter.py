@@ -0,0 +1,50 @@
+"""
+Raw bytes prefilter for chunk data
+"""
+import re
+
+
+class BytesPrefilter:
+    """
+    Cheap check of decompressed chunk data for search terms before it is NBT decoded.
+
+    NBT stores strings as plain (modified) UTF-8, so a chunk that holds an item or block id has the id's
+    bytes somewhere in its data. If none of the terms are in the data the chunk can not match and does not
+    need to be decoded. A match only means the chunk may be interesting: the caller still checks the
+    decoded values.
+
+    One term is a plain substring search, more terms are a single regex alternation scan of the data.
+
+    prefilter = BytesPrefilter(['elytra', 'minecraft:beacon'])
+    for cx, cz, timestamp, chunk in region.iter_chunks('region', prefilter=prefilter):
+        ...
+    """
+
+    def __init__(self, terms):
+        if isinstance(terms, (str, bytes)):
+            terms = [terms]
+        self._terms = sorted(set(t.encode('utf-8') if isinstance(t, str) else bytes(t) for t in terms))
+        self._regex = None
+        if len(self._terms) > 1:
+            self._regex = re.compile(b'|'.join(re.escape(t) for t in self._terms))
+        self.checked = 0
+        self.skipped = 0
+
+    @property
+    def terms(self):
+        return self._terms
+
+    def matches(self, data):
+        """
+        Return True if data contains any of the terms
+        """
+        self.checked += 1
+        if not self._terms:
+            return True
+        if self._regex is None:
+            found = self._terms[0] in data
+        else:
+            found = self._regex.search(data) is not None
+        if not found:
+            self.skipped += 1
+        return found
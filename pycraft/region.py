@@ -5,6 +5,7 @@ from pycraft import mca
 from pycraft.chunk import EntitiesChunk
 from pycraft.chunk import PoiChunk
 from pycraft.chunk import RegionChunk
+from pycraft.chunk_cache import ChunkCache
 from pycraft.error import PycraftException
 from pycraft.mca_file import McaFile
 
@@ -13,8 +14,10 @@ from pycraft.mca_file import McaFile
 # chunks are 16x16 blocks
 
 class Region(McaFile):
-    REGION_CACHE = {}
+    # Shared cache of parsed chunks for get_r_chunk
+    CHUNK_CACHE = ChunkCache()
     DATA_TYPES = ('region', 'entities', 'poi')
+    CHUNK_CLASSES = {'poi': PoiChunk, 'entities': EntitiesChunk, 'region': RegionChunk}
 
     BLOCK_WIDTH = 512
 
@@ -27,9 +30,42 @@ class Region(McaFile):
         ry = floor(y / Region.BLOCK_WIDTH)
         return Region(world_path, rx, ry)
 
-    def __init__(self, world_path, x, y):
+    @staticmethod
+    def bbox_positions(bbox):
+        """
+        Return the (rx, rz) positions of the regions that overlap bbox.
+
+        bbox: (x0, z0, x1, z1) in world (block) coordinates. x0 <= x < x1 and z0 <= z < z1
+        """
+        x0, z0, x1, z1 = bbox
+        w = Region.BLOCK_WIDTH
+        return [(rx, rz)
+                for rz in range(floor(z0 / w), floor((z1 - 1) / w) + 1)
+                for rx in range(floor(x0 / w), floor((x1 - 1) / w) + 1)]
+
+    def bbox_chunk_filter(self, bbox):
+        """
+        Return a chunk_filter for iter_chunks that only accepts the chunks of this region that overlap bbox
+        (see bbox_positions)
+        """
+        x0, z0, x1, z1 = bbox
+        ox = self._pos[0] * self.BLOCK_WIDTH
+        oz = self._pos[1] * self.BLOCK_WIDTH
+
+        def chunk_filter(cx, cz):
+            x = ox + cx * 16
+            z = oz + cz * 16
+            return x < x1 and x + 16 > x0 and z < z1 and z + 16 > z0
+        return chunk_filter
+
+    def __init__(self, world_path, x, y, catalog=None):
+        """
+        catalog: optional WorldCatalog of the world, used to check which data files exist without
+        touching the file system
+        """
         super().__init__()
         self._pos = [x, y]
+        self._catalog = catalog
         # filename for region, entities, and poi
         self._fname = f'r.{x}.{y}.mca'
         self._world_path = world_path
@@ -39,17 +75,78 @@ class Region(McaFile):
             'region': None
         }
 
-    def get_r_chunk(self, dtype, cx, cy):
+    def get_r_chunk(self, dtype, cx, cy, decoder=None, tags=None, use_cache=True):
+        """
+        Get a chunk of type dtype from this region.
+
+        Chunks are kept in Region.CHUNK_CACHE keyed by world, position and chunk timestamp, so asking for
+        the same chunk again does not re-read and re-parse it unless it has changed.
+        use_cache: set to False to bypass the chunk cache
+        """
         # convert world chunk to region chunk
         x = floor(cx) % 32
         y = floor(cy) % 32
         data = self.get_data(dtype)
+        if not data:
+            return None
+        key = None
+        if use_cache:
+            key = (self._world_path, dtype, self._pos[0], self._pos[1], x, y, data.get_timestamp(x, y),
+                   decoder or self.CHUNK_CLASSES[dtype].DEFAULT_DECODER,
+                   tuple(sorted(tags)) if tags is not None else None)
+            chunk = self.CHUNK_CACHE.get(key)
+            if chunk is not None:
+                return chunk
         d = data.get_data(x, y)
-        if data:
-            size = data.get_data_size(x, y)
-            chunk_class = {'poi': PoiChunk, 'entities': EntitiesChunk, 'region': RegionChunk}
-            return chunk_class[dtype](d, size)
-        return None
+        size = data.get_data_size(x, y)
+        chunk = self.CHUNK_CLASSES[dtype](d, size, decoder, tags)
+        if key is not None:
+            self.CHUNK_CACHE.put(key, chunk, len(d) if d else 0)
+        return chunk
+
+    def get_timestamps(self, dtype):
+        """
+        Get the last modified timestamps of the chunks of type dtype in this region.
+
+        Returns a dict of {(cx, cz): timestamp}. Only the region file header is read.
+        """
+        return self.get_data(dtype).get_timestamps()
+
+    def iter_chunks(self, dtype, known_timestamps=None, decoder=None, tags=None, chunk_filter=None, prefilter=None):
+        """
+        Generator for the chunks of type dtype that are present in this region.
+
+        Empty chunk slots are skipped and chunks are read in file order.
+        Yields (cx, cz, timestamp, chunk) where cx and cz are region chunk coordinates (0 - 31)
+
+        known_timestamps: optional dict of {(cx, cz): timestamp} (see get_timestamps). Chunks that have not
+        changed since are skipped.
+        decoder: NBT decoder for the chunks (see Chunk.DECODERS)
+        tags: optional collection of top level tag names to keep. Other tags are skipped without being decoded.
+        chunk_filter: optional function called with (cx, cz). Chunks for which it returns False are not read.
+        prefilter: optional BytesPrefilter (see pycraft.prefilter). Chunks whose decompressed data does not
+        contain any of its terms are skipped without being NBT decoded.
+        """
+        data = self.get_data(dtype)
+        chunk_class = self.CHUNK_CLASSES[dtype]
+        for cx, cz, timestamp, d in data.iter_chunks(known_timestamps, chunk_filter):
+            if prefilter is not None and not prefilter.matches(d):
+                continue
+            yield cx, cz, timestamp, chunk_class(d, data.get_data_size(cx, cz), decoder, tags)
+
+    def close(self):
+        """
+        Close the region files opened by this region. They are reopened if the region is used again.
+        """
+        for data in self._data.values():
+            if data is not None:
+                data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def get_data(self, dtype):
         """
@@ -61,11 +158,26 @@ class Region(McaFile):
             raise PycraftException(f'Bad data type: {dtype}')
 
         if not self._data[dtype]:
-            data_path = os.path.join(self._world_path, dtype, self._fname)
-            self._data[dtype] = mca.Mca(data_path)
+            if self._catalog is not None and not self._catalog.has_region(dtype, *self._pos):
+                raise PycraftException(f'mca file missing: {self.data_path(dtype)}')
+            self._data[dtype] = mca.Mca(self.data_path(dtype), memory_map=True)
 
         return self._data[dtype]
 
+    def has_data(self, dtype):
+        """
+        Return True if this region has a data file of type dtype
+        """
+        if self._catalog is not None:
+            return self._catalog.has_region(dtype, *self._pos)
+        return os.path.isfile(self.data_path(dtype))
+
+    def data_path(self, dtype):
+        """
+        Get the path of the mca data file for dtype for this region.
+        """
+        return os.path.join(self._world_path, dtype, self._fname)
+
     @property
     def filename(self):
         return self._fname
@@ -0,0 +1,154 @@
+"""
+Header-only statistics of the region files of a world.
+
+Only the 8 KiB location / timestamp header of each file is read, nothing is decompressed, so a world with
+thousands of region files is scanned in well under a second.
+"""
+import concurrent.futures
+import os
+
+from pycraft.mca import Mca
+from pycraft.region import Region
+
+SECTOR_SIZE = 4096
+HEADER_SECTORS = 2
+
+
+def region_files(world_path, dtype):
+    """
+    Return [(rx, rz, path)] for the region files of type dtype in a world
+    """
+    data_dir = os.path.join(world_path, dtype)
+    if not os.path.isdir(data_dir):
+        return []
+    files = []
+    for fname in os.listdir(data_dir):
+        parts = fname.split('.')
+        if len(parts) == 4 and parts[0] == 'r' and parts[3] == 'mca':
+            try:
+                files.append((int(parts[1]), int(parts[2]), os.path.join(data_dir, fname)))
+            except ValueError:
+                continue
+    return files
+
+
+def read_header(path):
+    """
+    Read the header of one region file. Returns (header, os.stat_result), or None if the file cannot be read
+    (e.g. it was deleted since it was listed)
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(2 * Mca.HEADER_SIZE), os.fstat(f.fileno())
+    except OSError:
+        return None
+
+
+def read_headers(paths, threads=None):
+    """
+    Read the headers of region files in a thread pool (the reads are small, so threads are faster than
+    starting worker processes).
+
+    threads: number of threads, default is the ThreadPoolExecutor default
+
+    Returns a list with the read_header result of each path
+    """
+    if len(paths) < 2:
+        return [read_header(path) for path in paths]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(read_header, paths))
+
+
+def scan_file(path):
+    """
+    Read the header of one region file. Returns the header_stats of the file
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(2 * Mca.HEADER_SIZE)
+    return header_stats(header, size)
+
+
+def header_stats(header, size):
+    """
+    Return the statistics of a region file from its header (the first 8 KiB) and size.
+
+    Returns a dict:
+      bytes: file size
+      chunks: number of chunks present
+      sectors: 4 KiB sectors allocated to the header and the chunks
+      free_sectors: sectors of the file not allocated to any chunk (space left by chunks that moved or shrank)
+      fragmentation: free_sectors / sectors in the file
+      oldest, newest: oldest and newest chunk timestamps (seconds since the epoch), None if there are no chunks
+    """
+    locations = Mca._read_table(header[:Mca.HEADER_SIZE])
+    timestamps = Mca._read_table(header[Mca.HEADER_SIZE:])
+    chunks = 0
+    sectors = HEADER_SECTORS if size > 0 else 0
+    oldest = None
+    newest = None
+    for index in range(Mca.INDEX_COUNT):
+        location = locations[index]
+        if location >> 8 == 0:
+            continue
+        chunks += 1
+        sectors += location & 0xff
+        t = timestamps[index]
+        if t:
+            if oldest is None or t < oldest:
+                oldest = t
+            if newest is None or t > newest:
+                newest = t
+    file_sectors = (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+    free_sectors = max(0, file_sectors - sectors)
+    return {
+        'bytes': size,
+        'chunks': chunks,
+        'sectors': sectors,
+        'free_sectors': free_sectors,
+        'fragmentation': free_sectors / file_sectors if file_sectors else 0.0,
+        'oldest': oldest,
+        'newest': newest
+    }
+
+
+def totals(files):
+    """
+    Return the totals of {(rx, rz): stats} (see header_stats) with the number of files
+    """
+    result = {'files': len(files), 'bytes': 0, 'chunks': 0, 'sectors': 0, 'free_sectors': 0,
+              'oldest': None, 'newest': None}
+    for stats in files.values():
+        for k in ('bytes', 'chunks', 'sectors', 'free_sectors'):
+            result[k] += stats[k]
+        if stats['oldest'] is not None and (result['oldest'] is None or stats['oldest'] < result['oldest']):
+            result['oldest'] = stats['oldest']
+        if stats['newest'] is not None and (result['newest'] is None or stats['newest'] > result['newest']):
+            result['newest'] = stats['newest']
+    file_sectors = result['sectors'] + result['free_sectors']
+    result['fragmentation'] = result['free_sectors'] / file_sectors if file_sectors else 0.0
+    return result
+
+
+def scan_world(world_path, dtypes=Region.DATA_TYPES, threads=None):
+    """
+    Read the headers of the region files of a world in a thread pool (see read_headers). Unlike
+    WorldCatalog.stats nothing is cached, every header is read.
+
+    threads: number of threads, default is the ThreadPoolExecutor default
+
+    Returns {dtype: {'files', 'bytes', 'chunks', 'sectors', 'free_sectors', 'fragmentation', 'oldest',
+    'newest', 'regions': {(rx, rz): stats}}} where stats is the result of header_stats. Files that cannot
+    be read are left out.
+    """
+    files = [(dtype, rx, rz, path) for dtype in dtypes for rx, rz, path in region_files(world_path, dtype)]
+    results = {dtype: {} for dtype in dtypes}
+    for (dtype, rx, rz, path), result in zip(files, read_headers([f[3] for f in files], threads)):
+        if result is not None:
+            header, st = result
+            results[dtype][(rx, rz)] = header_stats(header, st.st_size)
+    world_stats = {}
+    for dtype in dtypes:
+        world_stats[dtype] = totals(results[dtype])
+        world_stats[dtype]['regions'] = results[dtype]
+    return world_stats
@@ -0,0 +1,150 @@
+"""
+Top-down terrain rendering from region chunks.
+
+Unlike map items (see Map) this does not need anyone to have explored the area with a map: the color of
+each column comes from the top block found with the chunk's heightmap and the section block palettes.
+Each region is rendered into a 512 x 512 tile, one pixel per block.
+"""
+import concurrent.futures
+import os
+
+import numpy
+from PIL import Image
+
+from pycraft.block_states import SECTION_WIDTH
+from pycraft.block_states import section_block_indexes
+from pycraft.block_states import unpack_heightmap
+from pycraft.colors import get_block_color
+from pycraft.error import PycraftException
+from pycraft.region import Region
+from pycraft.world import World
+
+HEIGHTMAPS = ('WORLD_SURFACE', 'MOTION_BLOCKING')
+DEFAULT_HEIGHTMAP = 'WORLD_SURFACE'
+TILE_SIZE = Region.BLOCK_WIDTH
+CHUNK_TAGS = ('Heightmaps', 'sections', 'yPos')
+# Relief shading: brightness of a block that is higher / lower than the block north of it
+SHADE_HIGHER = 1.12
+SHADE_LOWER = 0.86
+
+def _palette_color_table(palette):
+    """
+    Return an N x 4 array with the color of each entry of a block state palette
+    """
+    return numpy.array([get_block_color(entry.get('Name', 'minecraft:air')) for entry in palette], dtype=numpy.uint8)
+
+
+def render_chunk(chunk, heightmap=DEFAULT_HEIGHTMAP):
+    """
+    Find the color and height of the top block of each column of a region chunk.
+
+    chunk: RegionChunk decoded with the 'fast' decoder (it may be limited to the tags in CHUNK_TAGS)
+
+    Returns (colors, heights): a 16 x 16 x 4 uint8 RGBA array and a 16 x 16 int32 array of the y of the
+    top block, both ordered [z, x]. Returns None if the chunk has no heightmap (e.g. not fully generated).
+    """
+    heightmaps = chunk.get_tag('Heightmaps')
+    if not heightmaps or heightmap not in heightmaps:
+        return None
+    min_y = (chunk.get_tag('yPos') or 0) * SECTION_WIDTH
+    heights = unpack_heightmap(heightmaps[heightmap])
+    top_y = min_y + heights - 1
+    colors = numpy.zeros((SECTION_WIDTH, SECTION_WIDTH, 4), dtype=numpy.uint8)
+    z, x = numpy.nonzero(heights > 0)
+    if len(z) == 0:
+        return colors, top_y
+
+    column_y = top_y[z, x]
+    section_y = column_y >> 4
+    local_y = column_y & 15
+    sections = {section.get('Y'): section for section in chunk.get_tag('sections') or []}
+    for sy in numpy.unique(section_y):
+        section = sections.get(int(sy))
+        if section is None:
+            continue
+        block_indexes = section_block_indexes(section)
+        if block_indexes is None:
+            continue
+        indexes, palette = block_indexes
+        in_section = section_y == sy
+        sz, sx = z[in_section], x[in_section]
+        colors[sz, sx] = _palette_color_table(palette)[indexes[local_y[in_section], sz, sx]]
+    return colors, top_y
+
+
+def shade_relief(colors, heights):
+    """
+    Shade colors (N x N x 4) in place by comparing each block's height to the block north of it,
+    the way map items do.
+    """
+    north = numpy.vstack((heights[:1], heights[:-1]))
+    shade = numpy.ones(heights.shape, dtype=numpy.float32)
+    shade[heights > north] = SHADE_HIGHER
+    shade[heights < north] = SHADE_LOWER
+    rgb = colors[:, :, :3].astype(numpy.float32) * shade[:, :, None]
+    colors[:, :, :3] = numpy.clip(rgb, 0, 255).astype(numpy.uint8)
+
+
+def render_region(world_path, rx, rz, heightmap=DEFAULT_HEIGHTMAP, shade=True):
+    """
+    Render region (rx, rz) of a world as a 512 x 512 RGBA image. Columns of chunks that are missing or
+    not generated are transparent.
+    """
+    if heightmap not in HEIGHTMAPS:
+        raise PycraftException(f'Bad heightmap: {heightmap}')
+    colors = numpy.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=numpy.uint8)
+    heights = numpy.zeros((TILE_SIZE, TILE_SIZE), dtype=numpy.int32)
+    with Region(world_path, rx, rz) as region:
+        for cx, cz, timestamp, chunk in region.iter_chunks('region', decoder='fast', tags=CHUNK_TAGS):
+            rendered = render_chunk(chunk, heightmap)
+            if rendered is None:
+                continue
+            x0 = cx * SECTION_WIDTH
+            z0 = cz * SECTION_WIDTH
+            colors[z0:z0 + SECTION_WIDTH, x0:x0 + SECTION_WIDTH] = rendered[0]
+            heights[z0:z0 + SECTION_WIDTH, x0:x0 + SECTION_WIDTH] = rendered[1]
+    if shade:
+        shade_relief(colors, heights)
+    return Image.frombuffer('RGBA', (TILE_SIZE, TILE_SIZE), colors, 'raw', 'RGBA', 0, 1)
+
+
+def tile_file_name(rx, rz):
+    return f'r.{rx}.{rz}.png'
+
+
+def _render_region_file(world_path, rx, rz, out_dir, heightmap, shade):
+    """
+    Render one region and save it as a PNG in out_dir. Runs in a worker process.
+
+    Returns (rx, rz, path)
+    """
+    path = os.path.join(out_dir, tile_file_name(rx, rz))
+    render_region(world_path, rx, rz, heightmap, shade).save(path)
+    return rx, rz, path
+
+
+def render_regions(world_path, out_dir, regions=None, heightmap=DEFAULT_HEIGHTMAP, shade=True, processes=None,
+                   progress=None):
+    """
+    Render regions of a world into out_dir as r.<rx>.<rz>.png tiles, one region per task in a pool of
+    worker processes.
+
+    regions: list of (rx, rz). All of the regions of the world by default.
+    processes: number of worker processes, default is one per core
+    progress: optional callback called with (rx, rz, path) as each tile is finished
+
+    Returns a dict of {(rx, rz): path}
+    """
+    if regions is None:
+        regions = World(world_path).get_region_positions('region')
+    os.makedirs(out_dir, exist_ok=True)
+    tiles = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_render_region_file, world_path, rx, rz, out_dir, heightmap, shade)
+                   for rx, rz in regions]
+        for future in concurrent.futures.as_completed(futures):
+            rx, rz, path = future.result()
+            tiles[(rx, rz)] = path
+            if progress:
+                progress(rx, rz, path)
+    return tiles
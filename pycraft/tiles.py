@@ -0,0 +1,358 @@
+"""
+Incremental tile pyramid ("slippy map") output for world renders.
+
+Tiles are written as <out_dir>/<z>/<x>/<y>.png. The most detailed level is max_zoom; each level below it is
+made by downsampling 2 x 2 tiles of the level above, down to level 0 which is a single tile.
+Sources with centered = True (world coordinates) are shifted by 2 ** (max_zoom - 1) tiles so that level 0
+is centered on the world origin and all tile coordinates are positive. At the base level max_zoom = 8
+with 256 pixel tiles covers 65536 x 65536 blocks. By default max_zoom is just deep enough for all the
+tiles of the source to fit (see fit_zoom).
+A manifest in out_dir records a key for every tile (the source file stats for the base level, a digest of
+the children for the other levels), so a re-run only renders the tiles whose sources changed.
+
+Sources produce the base level tiles:
+ - RegionTileSource: terrain rendered from the region files (see pycraft.terrain)
+ - MapTileSource: a grid of map items, like MapImage
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+
+from PIL import Image
+
+from pycraft.colors import get_map_palette_version
+from pycraft.map import Map
+from pycraft.map_cache import MapCache
+from pycraft.region import Region
+from pycraft.terrain import DEFAULT_HEIGHTMAP
+from pycraft.terrain import render_region
+from pycraft.world_catalog import WorldCatalog
+
+DEFAULT_TILE_SIZE = 256
+MANIFEST_NAME = 'manifest.json'
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class RegionTileSource:
+    """
+    Base level tiles rendered from the region files of a world. One pixel per block, tile (x, y) covers
+    blocks x * tile_size to (x + 1) * tile_size (likewise for z).
+    """
+    def __init__(self, world_path, heightmap=DEFAULT_HEIGHTMAP, shade=True, tile_size=DEFAULT_TILE_SIZE,
+                 catalog=None):
+        """
+        catalog: WorldCatalog of the world, one is created (and refreshed once) if not given
+        """
+        if Region.BLOCK_WIDTH % tile_size != 0:
+            raise ValueError(f'tile_size must divide {Region.BLOCK_WIDTH}')
+        self._world_path = world_path
+        self._heightmap = heightmap
+        self._shade = shade
+        self.tile_size = tile_size
+        self._per_region = Region.BLOCK_WIDTH // tile_size
+        self._catalog = catalog
+        # tile coordinates are world coordinates and can be negative
+        self.centered = True
+
+    def __getstate__(self):
+        # the source is sent to the worker processes, which only render tiles and do not need the catalog
+        state = self.__dict__.copy()
+        state['_catalog'] = None
+        return state
+
+    def _get_catalog(self):
+        if self._catalog is None:
+            self._catalog = WorldCatalog(self._world_path)
+            self._catalog.refresh()
+        return self._catalog
+
+    def fit_zoom(self):
+        """
+        Return the smallest max_zoom at which all the regions fit in the single tile of level 0 once the
+        tiles are shifted by 2 ** (max_zoom - 1)
+        """
+        bounds = self._get_catalog().get_bounds('region')
+        if bounds is None:
+            return 0
+        x0, z0, x1, z1 = (v // self.tile_size for v in bounds)
+        half = max(-x0, -z0, x1, z1)
+        return 1 + (half - 1).bit_length()
+
+    def tile_keys(self):
+        """
+        Return {(x, y): key} for the base level tiles. The key changes when the tile needs to be rendered again.
+        """
+        catalog = self._get_catalog()
+        keys = {}
+        for rx, rz in catalog.get_region_positions('region'):
+            key = ['region', rx, rz, self._heightmap, self._shade] + list(catalog.get_file_stat('region', rx, rz))
+            for i in range(self._per_region):
+                for j in range(self._per_region):
+                    keys[(rx * self._per_region + i, rz * self._per_region + j)] = key
+        return keys
+
+    def tile_groups(self, tiles):
+        """
+        Split the tiles to render into groups that are rendered together (one group per region)
+        """
+        groups = {}
+        for x, y in tiles:
+            groups.setdefault((x // self._per_region, y // self._per_region), []).append((x, y))
+        return list(groups.values())
+
+    def render_tiles(self, tiles):
+        """
+        Render a group of tiles (see tile_groups). Yields ((x, y), image)
+        """
+        x, y = tiles[0]
+        rx, rz = x // self._per_region, y // self._per_region
+        img = render_region(self._world_path, rx, rz, self._heightmap, self._shade)
+        for x, y in tiles:
+            left = (x - rx * self._per_region) * self.tile_size
+            top = (y - rz * self._per_region) * self.tile_size
+            yield (x, y), img.crop((left, top, left + self.tile_size, top + self.tile_size))
+
+
+class MapTileSource:
+    """
+    Base level tiles from a grid of map items (the "map" list of a MapImage config): rows of map numbers,
+    each map drawn width * scale pixels wide.
+    """
+    def __init__(self, world_path, map_grid, scale=1.0, background_color=None, cache_dir=None,
+                 tile_size=DEFAULT_TILE_SIZE, map_width=128):
+        """
+        map_width: width of the maps in pixels before scaling. All maps in a grid have the same width.
+        cache_dir: MapCache directory for the map images, None to not use the cache
+        """
+        self._world_path = world_path
+        self._grid = map_grid
+        self._scale = scale
+        self._background_color = background_color
+        self._cache_dir = cache_dir
+        self.tile_size = tile_size
+        self._map_width = int(map_width * scale)
+        # tile coordinates start at the top left of the grid
+        self.centered = False
+
+    def _map_path(self, map_num):
+        return os.path.join(self._world_path, 'data', f'map_{map_num}.dat')
+
+    def _tile_maps(self, x, y):
+        """
+        Return the (row, column) of the maps that overlap tile (x, y)
+        """
+        ts = self.tile_size
+        w = self._map_width
+        rows = range(max(0, (y * ts) // w), min(len(self._grid), ((y + 1) * ts - 1) // w + 1))
+        for row in rows:
+            cols = range(max(0, (x * ts) // w), min(len(self._grid[row]), ((x + 1) * ts - 1) // w + 1))
+            for col in cols:
+                yield row, col
+
+    def _grid_tiles(self):
+        """
+        Return the number of base level tiles (across, down) covered by the grid
+        """
+        ts = self.tile_size
+        width = max(len(row) for row in self._grid) * self._map_width
+        height = len(self._grid) * self._map_width
+        return (width + ts - 1) // ts, (height + ts - 1) // ts
+
+    def fit_zoom(self):
+        """
+        Return the smallest max_zoom at which the whole grid fits in the single tile of level 0,
+        ceil(log2(tiles across or down))
+        """
+        return (max(self._grid_tiles()) - 1).bit_length()
+
+    def tile_keys(self):
+        tiles_x, tiles_y = self._grid_tiles()
+        palette = get_map_palette_version()
+        keys = {}
+        for y in range(tiles_y):
+            for x in range(tiles_x):
+                key = ['maps', self._scale, self._background_color, palette]
+                for row, col in self._tile_maps(x, y):
+                    m = self._grid[row][col]
+                    path = self._map_path(m)
+                    key.append([row, col, m] + (_file_key(path) if os.path.exists(path) else [None]))
+                keys[(x, y)] = key
+        return keys
+
+    def tile_groups(self, tiles):
+        # rows of tiles, so a map image is reused for the tiles next to each other
+        groups = {}
+        for x, y in tiles:
+            groups.setdefault(y, []).append((x, y))
+        return list(groups.values())
+
+    def _map_image(self, cache, map_num):
+        path = self._map_path(map_num)
+        if cache is None:
+            return Map(path).get_map_data().create_image(scale=self._scale)
+        return cache.get_image(path, self._scale)
+
+    def render_tiles(self, tiles):
+        cache = MapCache(self._cache_dir) if self._cache_dir is not None else None
+        images = {}
+        ts = self.tile_size
+        w = self._map_width
+        for x, y in tiles:
+            tile = Image.new('RGBA', (ts, ts), self._background_color or '#00000000')
+            for row, col in self._tile_maps(x, y):
+                m = self._grid[row][col]
+                if not os.path.exists(self._map_path(m)):
+                    continue
+                if m not in images:
+                    images[m] = self._map_image(cache, m)
+                img = images[m]
+                tile.paste(img, (col * w - x * ts, row * w - y * ts), img)
+            yield (x, y), tile
+
+
+def _render_group(source, tiles, out_dir, max_zoom, offset):
+    """
+    Render a group of base level tiles and save them. Runs in a worker process.
+
+    Returns the list of tiles written
+    """
+    written = []
+    for (x, y), img in source.render_tiles(tiles):
+        path = tile_path(out_dir, max_zoom, x + offset, y + offset)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        img.save(path)
+        written.append((x, y))
+    return written
+
+
+def tile_path(out_dir, z, x, y):
+    return os.path.join(out_dir, str(z), str(x), f'{y}.png')
+
+
+def _key_digest(key):
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+class TilePyramid:
+    """
+    Writes and incrementally updates a tile pyramid in out_dir.
+
+    pyramid = TilePyramid('tiles')
+    pyramid.update(RegionTileSource(world_path))
+    """
+    def __init__(self, out_dir, max_zoom=None):
+        """
+        max_zoom: zoom level of the base tiles. The default is source.fit_zoom() of each update
+        """
+        self._out_dir = out_dir
+        self._max_zoom = max_zoom
+        self._manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+
+    @property
+    def out_dir(self):
+        return self._out_dir
+
+    def _load_manifest(self, tile_size):
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('tile_size') == tile_size:
+                return manifest['tiles']
+        return {}
+
+    def _save_manifest(self, tile_size, max_zoom, offset, tiles):
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'tile_size': tile_size, 'max_zoom': max_zoom, 'offset': offset, 'tiles': tiles}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _remove_tile(self, z, x, y):
+        path = tile_path(self._out_dir, z, x, y)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def _downsample(self, z, x, y, tile_size):
+        """
+        Build tile (x, y) of level z from its 4 children in level z + 1
+        """
+        img = Image.new('RGBA', (tile_size * 2, tile_size * 2), '#00000000')
+        for i in range(2):
+            for j in range(2):
+                child = tile_path(self._out_dir, z + 1, 2 * x + i, 2 * y + j)
+                if os.path.exists(child):
+                    with Image.open(child) as child_img:
+                        img.paste(child_img, (i * tile_size, j * tile_size))
+        path = tile_path(self._out_dir, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        img.resize((tile_size, tile_size), Image.BOX).save(path)
+
+    def update(self, source, processes=None, progress=None):
+        """
+        Render the tiles of source that changed since the last update and rebuild the lower zoom levels
+        that depend on them.
+
+        processes: number of worker processes for the base level, default is one per core
+        progress: optional callback called with (z, count) after each level
+
+        Returns the number of tiles written
+        """
+        tile_size = source.tile_size
+        old = self._load_manifest(tile_size)
+        new = {}
+        written = 0
+
+        # base level
+        max_zoom = source.fit_zoom() if self._max_zoom is None else self._max_zoom
+        offset = 1 << (max_zoom - 1) if source.centered and max_zoom > 0 else 0
+        keys = {(x, y): _key_digest(key) for (x, y), key in source.tile_keys().items()}
+        size = 1 << max_zoom
+        outside = [(x, y) for x, y in keys if not (0 <= x + offset < size and 0 <= y + offset < size)]
+        if outside:
+            raise ValueError(f'{len(outside)} tiles are outside of the tile pyramid at max_zoom {max_zoom} '
+                             f'(e.g. {outside[0]}), use a max_zoom of at least {source.fit_zoom()}')
+        level = {f'{max_zoom}/{x + offset}/{y + offset}': digest for (x, y), digest in keys.items()}
+        changed = [xy for xy, digest in keys.items()
+                   if old.get(f'{max_zoom}/{xy[0] + offset}/{xy[1] + offset}') != digest or
+                   not os.path.exists(tile_path(self._out_dir, max_zoom, xy[0] + offset, xy[1] + offset))]
+        if changed:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(_render_group, source, group, self._out_dir, max_zoom, offset)
+                           for group in source.tile_groups(changed)]
+                for future in concurrent.futures.as_completed(futures):
+                    written += len(future.result())
+        if progress:
+            progress(max_zoom, len(changed))
+        new.update(level)
+
+        # lower levels, down to level 0
+        z = max_zoom
+        tiles = set((x + offset, y + offset) for x, y in keys)
+        while z > 0:
+            z -= 1
+            children = {}
+            for x, y in tiles:
+                children.setdefault((x >> 1, y >> 1), []).append(f'{z + 1}/{x}/{y}')
+            count = 0
+            for (x, y), names in children.items():
+                digest = _key_digest(sorted((name, new[name]) for name in names))
+                name = f'{z}/{x}/{y}'
+                new[name] = digest
+                if old.get(name) != digest or not os.path.exists(tile_path(self._out_dir, z, x, y)):
+                    self._downsample(z, x, y, tile_size)
+                    count += 1
+            written += count
+            if progress:
+                progress(z, count)
+            tiles = set(children)
+
+        # tiles whose source is gone
+        for name in set(old) - set(new):
+            self._remove_tile(*(int(v) for v in name.split('/')))
+
+        self._save_manifest(tile_size, max_zoom, offset, new)
+        return written
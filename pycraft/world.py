@@ -1,60 +1,156 @@
+import concurrent.futures
 from datetime import datetime
+import json
+from math import floor
 from pathlib import Path
 
+from pycraft import block_search
+from pycraft.census import area_regions
+from pycraft.census import take_census
 from pycraft.level import Level
+from pycraft.level import read_level_fields
 from pycraft.player import Player
 from pycraft.region import Region
+from pycraft.world_catalog import WorldCatalog
 from pycraft.error import PycraftException
 from pycraft.map import Map
 
 import os
+import struct
+import tempfile
+import zlib
+
+
+# level.dat fields shown in the saved world list
+SAVED_WORLD_FIELDS = ('LevelName', 'GameType', 'LastPlayed', 'allowCommands', 'Version')
+# 0 is Survival, 1 is Creative, 2 is Adventure, 3 is Spectator
+GAME_MODE_NAMES = ['Survival', 'Creative', 'Adventure', 'Spectator']
+
+
+def _read_saved_world(world_path):
+    """
+    Read the level.dat fields of a saved world for the saved world list. Runs in a thread for get_saved_worlds.
+
+    Returns [mtime_ns, size, fields] or None if the world has no readable level.dat
+    """
+    try:
+        st = os.stat(os.path.join(world_path, 'level.dat'))
+        fields = read_level_fields(world_path, SAVED_WORLD_FIELDS)
+    except (OSError, EOFError, zlib.error, struct.error, IndexError, ValueError, PycraftException):
+        # a missing, truncated or corrupt level.dat only drops this world from the list
+        return None
+    version = fields.get('Version')
+    if not isinstance(version, dict):
+        version = {}
+    return [st.st_mtime_ns, st.st_size, {
+        'name': fields.get('LevelName', os.path.basename(world_path)),
+        'game_type': fields.get('GameType', 0),
+        'last_played': fields.get('LastPlayed', 0),
+        'cheats': fields.get('allowCommands', 0),
+        'version': version.get('Name', '')
+    }]
 
 
 class World:
+    SAVED_WORLDS_CACHE = os.path.join(str(Path.home()), '.pycraft', 'saved_worlds.json')
 
     @staticmethod
-    def get_saved_worlds():
-        save_world_list = []
+    def get_saves_dir():
+        """
+        Return the Minecraft saves directory, or None if it is not found
+        """
         savepaths = (
             '%HOME%/Library/Application Support/minecraft/saves',
-            '%APPDATA%.minecraft'
-            '%HOME%.minecraft'
+            '%APPDATA%/.minecraft/saves',
+            '%HOME%/.minecraft/saves'
         )
         # plat = platform.system()
         home = str(Path.home())
-        savedir = ''
         for path in savepaths:
-            p = path.replace('%HOME%', home)
+            if '%APPDATA%' in path and 'APPDATA' not in os.environ:
+                continue
+            p = path.replace('%HOME%', home).replace('%APPDATA%', os.environ.get('APPDATA', ''))
             if os.path.exists(p):
-                savedir = p
-                break
+                return p
+        return None
+
+    @staticmethod
+    def _load_saved_worlds_cache():
+        try:
+            with open(World.SAVED_WORLDS_CACHE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_saved_worlds_cache(cache):
+        cache_dir = os.path.dirname(World.SAVED_WORLDS_CACHE)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, World.SAVED_WORLDS_CACHE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def get_saved_worlds(savedir=None, threads=None):
+        """
+        Return the list of saved worlds, most recently played first.
+
+        Only the fields of level.dat needed for the list are read (see level.read_level_fields), in a thread
+        pool, and the results are cached in SAVED_WORLDS_CACHE by level.dat mtime and size, so only new or
+        changed worlds are read.
+
+        savedir: saves directory, default is the Minecraft saves directory (see get_saves_dir)
+        threads: number of threads, default is the ThreadPoolExecutor default
+        """
+        savedir = savedir or World.get_saves_dir()
+        if savedir is None or not os.path.isdir(savedir):
+            return []
 
         _world_paths = {}
         for fname in os.listdir(savedir):
-            _world_paths[fname] = os.path.join(savedir, fname)
-
-        for world_name in _world_paths:
-            world_path = _world_paths[world_name]
-            print(f'path: {world_path}')
-            level = Level(world_path)
-            file_name = world_name
-            icon_path = os.path.join(world_path, 'icon.png')
-            name = level.LevelName
-            last_played = level.LastPlayed
-            # 0 is Survival, 1 is Creative, 2 is Adventure, 3 is Spectator
-            mode_names = ['Survival', 'Creative', 'Adventure', 'Spectator']
-            mode = mode_names[level.GameType]
-            cheats = level.allowCommands
-            dt = datetime.fromtimestamp(last_played/1000)
-            version = level.Version['Name'].value
+            path = os.path.join(savedir, fname)
+            if os.path.isfile(os.path.join(path, 'level.dat')):
+                _world_paths[fname] = path
+
+        cache = World._load_saved_worlds_cache()
+        summaries = {}
+        to_read = []
+        for world_name, world_path in _world_paths.items():
+            entry = cache.get(world_path)
+            try:
+                st = os.stat(os.path.join(world_path, 'level.dat'))
+            except OSError:
+                continue
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                summaries[world_name] = entry
+            else:
+                to_read.append(world_name)
+        if to_read:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+                for world_name, entry in zip(to_read, executor.map(_read_saved_world,
+                                                                   [_world_paths[w] for w in to_read])):
+                    if entry is not None:
+                        summaries[world_name] = entry
+            # keep the entries of the worlds in other saves directories
+            cache.update({_world_paths[w]: entry for w, entry in summaries.items()})
+            World._save_saved_worlds_cache(cache)
+
+        save_world_list = []
+        for world_name, (mtime_ns, size, summary) in summaries.items():
+            game_type = summary['game_type']
             save_world_list.append({
-                'file_name': file_name,
-                'icon_path': icon_path,
-                'name': name,
-                'last_played': dt,
-                'mode': mode,
-                'cheats': cheats,
-                'version': version
+                'file_name': world_name,
+                'icon_path': os.path.join(_world_paths[world_name], 'icon.png'),
+                'name': summary['name'],
+                'last_played': datetime.fromtimestamp(summary['last_played'] / 1000),
+                'mode': GAME_MODE_NAMES[game_type] if 0 <= game_type < len(GAME_MODE_NAMES) else str(game_type),
+                'cheats': summary['cheats'],
+                'version': summary['version']
             })
         save_world_list.sort(key=lambda x: x['last_played'], reverse=True)
         return save_world_list
@@ -63,6 +159,9 @@ class World:
         self._path = path
         self._player = Player(path)
         self._level = Level(path)
+        # Regions by (rx, rz) so chunk lookups reuse the open region files
+        self._regions = {}
+        self._catalog = None
 
     @property
     def level(self):
@@ -72,6 +171,16 @@ class World:
     def path(self):
         return self._path
 
+    @property
+    def catalog(self):
+        """
+        The WorldCatalog of the region files of this world, refreshed when it is first used
+        """
+        if self._catalog is None:
+            self._catalog = WorldCatalog(self._path)
+            self._catalog.refresh()
+        return self._catalog
+
     @property
     def map_path(self):
         """
@@ -94,7 +203,82 @@ class World:
 
     def get_region(self, pos):
         x, y = World.pos_to_xy(pos)
-        return Region.from_position_xy(self._path, x, y)
+        rx = floor(x / Region.BLOCK_WIDTH)
+        ry = floor(y / Region.BLOCK_WIDTH)
+        if (rx, ry) not in self._regions:
+            self._regions[(rx, ry)] = Region(self._path, rx, ry, catalog=self.catalog)
+        return self._regions[(rx, ry)]
+
+    def close(self):
+        """
+        Close the region files opened by this world.
+        """
+        for region in self._regions.values():
+            region.close()
+        self._regions = {}
+
+    @staticmethod
+    def chunk_cache_stats():
+        """
+        Return the hit / miss counters and usage of the shared chunk cache (see ChunkCache.stats)
+        """
+        return Region.CHUNK_CACHE.stats()
+
+    def get_region_positions(self, dtype='region'):
+        """
+        Return a sorted list of the (rx, rz) positions of the region files of type dtype in this world
+        """
+        if dtype not in Region.DATA_TYPES:
+            raise PycraftException(f'Bad data type: {dtype}')
+        return self.catalog.get_region_positions(dtype)
+
+    def get_bounds(self, dtype='region'):
+        """
+        Return the (x0, z0, x1, z1) block coordinates covered by the region files of type dtype, or None
+        """
+        return self.catalog.get_bounds(dtype)
+
+    def find_blocks(self, names, bbox=None, processes=None):
+        """
+        Generator for the blocks in this world whose name is in names (e.g. ['spawner', 'minecraft:beacon']).
+
+        bbox: optional (x0, z0, x1, z1) in world (block) coordinates to search (x0 <= x < x1, z0 <= z < z1)
+        processes: number of worker processes, default is one per core
+
+        Regions are searched in parallel. Sections whose block palette does not contain any of the names
+        are skipped without being unpacked.
+
+        Yields (x, y, z, name) as each region is finished, so the order is not defined.
+        """
+        regions = self.get_region_positions('region')
+        if bbox is not None:
+            in_bbox = set(Region.bbox_positions(bbox))
+            regions = [pos for pos in regions if pos in in_bbox]
+        return block_search.find_blocks(self._path, regions, names, bbox, processes)
+
+    def stats(self, dtypes=Region.DATA_TYPES):
+        """
+        Return the chunk counts, allocated sectors, fragmentation, oldest / newest chunk timestamps and sizes
+        of the region, entities and poi files of this world, from the file headers only
+        (see region_stats.scan_world). The headers are read from the catalog.
+        """
+        self.catalog.refresh()
+        return self.catalog.stats(dtypes)
+
+    def census(self, bbox=None, center=None, radius=None, types=None, processes=None, progress=None):
+        """
+        Count the entities of this world by type, owner and villager profession (see pycraft.census).
+
+        bbox: optional (x0, z0, x1, z1) in world (block) coordinates
+        center, radius: optional (x, y, z) and horizontal distance in blocks
+        types: optional list of entity ids to count
+        processes: number of worker processes, default is one per core
+        progress: optional callback called with (rx, rz, region_census) as each region is finished
+
+        Returns a Census
+        """
+        regions = area_regions(self.get_region_positions('entities'), bbox, center, radius)
+        return take_census(self._path, regions, bbox, center, radius, types, processes, progress)
 
     @staticmethod
     def block_to_chunk_pos(p):
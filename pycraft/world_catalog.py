@@ -0,0 +1,204 @@
+"""
+Persistent catalog of the region files of a world
+"""
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+
+from pycraft.error import PycraftException
+from pycraft.mca import Mca
+from pycraft.region import Region
+from pycraft import region_stats
+
+
+class WorldCatalog:
+    """
+    Sidecar SQLite catalog of the region, entities and poi files of a world: the coordinates, size and mtime
+    of every file and its 8 KiB header (the chunk offsets and timestamps).
+
+    refresh() lists the data directories and only reads the header of the files whose mtime or size
+    changed, so after the first run it costs one stat per file. The catalog is then held in memory, so
+    region lists and bounds do not touch the file system, and neither do existence checks of files that are
+    in the catalog. A file that is not is looked for on disk (and added), so files created after the last
+    refresh are still found.
+
+    catalog = WorldCatalog(world_path)
+    catalog.refresh()
+    if catalog.has_region('entities', rx, rz):
+        timestamps = catalog.get_timestamps('entities', rx, rz)
+    """
+    DEFAULT_CACHE_DIR = os.path.join(str(Path.home()), '.pycraft', 'catalog')
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS region_files (
+        dtype TEXT NOT NULL,
+        rx INTEGER NOT NULL,
+        rz INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        header BLOB NOT NULL,
+        PRIMARY KEY (dtype, rx, rz))'''
+    INSERT = 'INSERT OR REPLACE INTO region_files (dtype, rx, rz, mtime_ns, size, header) VALUES (?, ?, ?, ?, ?, ?)'
+
+    def __init__(self, world_path, cache_dir=None):
+        self._world_path = world_path
+        cache_dir = cache_dir or self.DEFAULT_CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        world_key = hashlib.sha1(os.path.abspath(world_path).encode('utf-8')).hexdigest()[:16]
+        self._db_path = os.path.join(cache_dir, f'{world_key}.sqlite')
+        # {dtype: {(rx, rz): (mtime_ns, size, header)}}, loaded by refresh. (mtime, size) is the order used for
+        # file stats everywhere, see get_file_stat
+        self._files = None
+
+    @property
+    def db_path(self):
+        return self._db_path
+
+    def _connect(self):
+        connection = sqlite3.connect(self._db_path)
+        connection.execute(self.SCHEMA)
+        return connection
+
+    def _load(self):
+        files = {dtype: {} for dtype in Region.DATA_TYPES}
+        connection = self._connect()
+        try:
+            for dtype, rx, rz, mtime_ns, size, header in connection.execute(
+                    'SELECT dtype, rx, rz, mtime_ns, size, header FROM region_files'):
+                if dtype in files:
+                    files[dtype][(rx, rz)] = (mtime_ns, size, bytes(header))
+        finally:
+            connection.close()
+        return files
+
+    def refresh(self, threads=None):
+        """
+        Bring the catalog up to date with the world's files. The headers of the new and changed files are
+        read in a thread pool (see region_stats.read_headers).
+
+        threads: number of threads, default is the ThreadPoolExecutor default
+
+        Returns the number of files added, changed or removed
+        """
+        files = self._load() if self._files is None else self._files
+        changed = []
+        removed = []
+        for dtype in Region.DATA_TYPES:
+            known = files[dtype]
+            present = set()
+            for rx, rz, path in region_stats.region_files(self._world_path, dtype):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                present.add((rx, rz))
+                entry = known.get((rx, rz))
+                if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+                    changed.append((dtype, rx, rz, path))
+            for pos in set(known) - present:
+                del known[pos]
+                removed.append((dtype, pos[0], pos[1]))
+        updates = []
+        for (dtype, rx, rz, path), result in zip(changed, region_stats.read_headers([c[3] for c in changed],
+                                                                                    threads)):
+            if result is None:
+                # deleted since it was listed
+                if files[dtype].pop((rx, rz), None) is not None:
+                    removed.append((dtype, rx, rz))
+                continue
+            header, st = result
+            files[dtype][(rx, rz)] = (st.st_mtime_ns, st.st_size, header)
+            updates.append((dtype, rx, rz, st.st_mtime_ns, st.st_size, header))
+        if updates or removed:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany(self.INSERT, updates)
+                    connection.executemany('DELETE FROM region_files WHERE dtype = ? AND rx = ? AND rz = ?', removed)
+            finally:
+                connection.close()
+        self._files = files
+        return len(updates) + len(removed)
+
+    def _dtype_files(self, dtype):
+        if dtype not in Region.DATA_TYPES:
+            raise PycraftException(f'Bad data type: {dtype}')
+        if self._files is None:
+            self.refresh()
+        return self._files[dtype]
+
+    def _entry(self, dtype, rx, rz):
+        """
+        Return the (mtime_ns, size, header) of a file, or None if it does not exist.
+
+        A file that is not in the catalog is looked for on disk and added if it exists, so files created
+        since the last refresh are found.
+        """
+        files = self._dtype_files(dtype)
+        entry = files.get((rx, rz))
+        if entry is not None:
+            return entry
+        result = region_stats.read_header(os.path.join(self._world_path, dtype, f'r.{rx}.{rz}.mca'))
+        if result is None:
+            return None
+        header, st = result
+        entry = files[(rx, rz)] = (st.st_mtime_ns, st.st_size, header)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(self.INSERT, (dtype, rx, rz) + entry)
+        finally:
+            connection.close()
+        return entry
+
+    def has_region(self, dtype, rx, rz):
+        return self._entry(dtype, rx, rz) is not None
+
+    def get_region_positions(self, dtype='region'):
+        """
+        Return a sorted list of the (rx, rz) of the files of type dtype
+        """
+        return sorted(self._dtype_files(dtype))
+
+    def get_file_stat(self, dtype, rx, rz):
+        """
+        Return (mtime_ns, size) of a file as of the last refresh, or None if the file does not exist
+        """
+        entry = self._entry(dtype, rx, rz)
+        return entry[:2] if entry is not None else None
+
+    def get_timestamps(self, dtype, rx, rz):
+        """
+        Return {(cx, cz): timestamp} of the chunks present in a file, like Mca.get_timestamps
+        """
+        entry = self._entry(dtype, rx, rz)
+        if entry is None:
+            return {}
+        header = entry[2]
+        locations = Mca._read_table(header[:Mca.HEADER_SIZE])
+        timestamps = Mca._read_table(header[Mca.HEADER_SIZE:])
+        return {(index & Mca.DIMENSION_SIZE_MASK, index >> Mca.DIMENSION_SIZE_POWER): timestamps[index]
+                for index in range(Mca.INDEX_COUNT) if locations[index] >> 8 != 0}
+
+    def get_bounds(self, dtype='region'):
+        """
+        Return the (x0, z0, x1, z1) block coordinates covered by the files of type dtype (x0 <= x < x1), or
+        None if there are none
+        """
+        positions = self._dtype_files(dtype)
+        if not positions:
+            return None
+        w = Region.BLOCK_WIDTH
+        return (min(p[0] for p in positions) * w, min(p[1] for p in positions) * w,
+                (max(p[0] for p in positions) + 1) * w, (max(p[1] for p in positions) + 1) * w)
+
+    def stats(self, dtypes=Region.DATA_TYPES):
+        """
+        Return the same statistics as region_stats.scan_world from the cached headers
+        """
+        world_stats = {}
+        for dtype in dtypes:
+            files = {pos: region_stats.header_stats(header, size)
+                     for pos, (mtime_ns, size, header) in self._dtype_files(dtype).items()}
+            world_stats[dtype] = region_stats.totals(files)
+            world_stats[dtype]['regions'] = files
+        return world_stats
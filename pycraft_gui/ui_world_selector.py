@@ -1,5 +1,4 @@
 import os
-from pathlib import Path
 
 import pygame
 import pygame_gui
@@ -110,22 +109,12 @@ class UIWorldSelector(UIPanel):
         Only tested on MacOS so far.
         """
         # Add the WorldSelectorMenu
-        savepaths = (
-            '%HOME%/Library/Application Support/minecraft/saves',
-            '%APPDATA%.minecraft'
-            '%HOME%.minecraft'
-        )
-        # plat = platform.system()
-        home = str(Path.home())
-        savedir = ''
-        for path in savepaths:
-            p = path.replace('%HOME%', home)
-            if os.path.exists(p):
-                savedir = p
-                break
+        savedir = World.get_saves_dir()
 
         self._world_paths = {}
         self.options = []
+        if savedir is None:
+            return
         for fname in os.listdir(savedir):
             self.options.append(fname)
             self._world_paths[fname] = os.path.join(savedir, fname)
@@ -0,0 +1,49 @@
+## Render top-down terrain tiles (one 512x512 PNG per region) from the region files of a world
+from pycraft.terrain import DEFAULT_HEIGHTMAP
+from pycraft.terrain import HEIGHTMAPS
+from pycraft.terrain import render_regions
+from pycraft.tiles import RegionTileSource
+from pycraft.tiles import TilePyramid
+from pycraft.util import ElapsedTime
+
+import argparse
+import os
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Render top-down terrain images of the regions of a saved world')
+    parser.add_argument('worldpath', type=str, help='Path to saved world')
+    parser.add_argument('--outdir', '-o', type=str, default='terrain', help='Directory to write the region tiles to')
+    parser.add_argument('--heightmap', type=str, default=DEFAULT_HEIGHTMAP, choices=HEIGHTMAPS, help='Heightmap used to find the top block of each column')
+    parser.add_argument('--processes', '-P', type=int, default=None, help='Number of worker processes. [default: one per core]')
+    parser.add_argument('--no-shade', action='store_true', help='Do not shade the terrain by height')
+    parser.add_argument('--tiles', '-t', type=str, default=None, help='Write a z/x/y tile pyramid to this directory instead of one PNG per region. Only tiles of changed regions are updated')
+    parser.add_argument('--max-zoom', type=int, default=None, help='Zoom level of the most detailed tiles (one pixel per block) [default: just deep enough for the whole world]')
+    parser.add_argument('--region', '-r', type=str, action='append', default=None, help='Only render this region, as "rx,rz". Can be repeated')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not os.path.isdir(args.worldpath):
+        print(f'World not found: "{args.worldpath}"')
+        sys.exit(1)
+    regions = None
+    if args.region:
+        regions = [tuple(int(v) for v in r.split(',')) for r in args.region]
+    et = ElapsedTime()
+    if args.tiles:
+        if regions:
+            print('--region can not be used with --tiles')
+            sys.exit(1)
+        pyramid = TilePyramid(args.tiles, args.max_zoom)
+        count = pyramid.update(RegionTileSource(args.worldpath, args.heightmap, not args.no_shade),
+                               processes=args.processes,
+                               progress=lambda z, n: print(f'Zoom level {z}: {n} tiles written'))
+        print(f'Wrote {count} tiles in {et.elapsed_time_str()}')
+        sys.exit(0)
+    tiles = render_regions(args.worldpath, args.outdir, regions, heightmap=args.heightmap, shade=not args.no_shade,
+                           processes=args.processes,
+                           progress=lambda rx, rz, path: print(f'Rendered region ({rx}, {rz}): {path}'))
+    print(f'Rendered {len(tiles)} regions in {et.elapsed_time_str()}')
@@ -0,0 +1,98 @@
+'''
+Unpacking of the packed long arrays of region chunks (pycraft.block_states) against a pure python packer.
+'''
+import random
+
+import numpy
+import pytest
+
+from pycraft import block_states
+from pycraft import nbt
+from pycraft.chunk import RegionChunk
+
+from worldgen import TAG_BYTE, TAG_COMPOUND, TAG_INT, TAG_LIST, TAG_LONG_ARRAY, TAG_STRING
+from worldgen import nbt_root
+from worldgen import pack_longs
+
+
+def random_values(bits, count, seed):
+    rng = random.Random(seed)
+    # include the largest value, whose top bit ends up in the sign bit of the long for some widths
+    values = [rng.randrange(1 << bits) for _ in range(count - 1)] + [(1 << bits) - 1]
+    rng.shuffle(values)
+    return values
+
+
+@pytest.mark.parametrize('bits', [1, 4, 5, 6, 7, 9, 12, 16])
+def test_unpack_longs(bits):
+    values = random_values(bits, block_states.SECTION_VOLUME, bits)
+    longs = pack_longs(values, bits)
+    assert len(longs) == -(-block_states.SECTION_VOLUME // (64 // bits))
+    assert block_states.unpack_longs(longs, bits, len(values)).tolist() == values
+    # the fast decoder returns big-endian signed arrays
+    big_endian = numpy.array(longs, dtype='>i8')
+    assert block_states.unpack_longs(big_endian, bits, len(values)).tolist() == values
+
+
+@pytest.mark.parametrize('palette_length, bits', [(1, 0), (2, 4), (16, 4), (17, 5), (32, 5), (33, 6), (64, 6),
+                                                  (65, 7)])
+def test_palette_bits(palette_length, bits):
+    assert block_states.palette_bits(palette_length, block_states.BLOCK_STATES_MIN_BITS) == bits
+
+
+def test_unpack_heightmap():
+    heights = random_values(9, block_states.HEIGHTMAP_SIZE, 0)
+    longs = pack_longs(heights, 9)
+    assert len(longs) == 37
+    unpacked = block_states.unpack_heightmap(numpy.array(longs, dtype='>i8'))
+    assert unpacked.shape == (16, 16)
+    assert unpacked.reshape(-1).tolist() == heights
+
+
+def section(y, palette_length, seed):
+    bits = block_states.palette_bits(palette_length, block_states.BLOCK_STATES_MIN_BITS)
+    values = random_values(bits, block_states.SECTION_VOLUME, seed)
+    values = [v % palette_length for v in values]
+    palette = [{'Name': (TAG_STRING, f'minecraft:block_{i}')} for i in range(palette_length)]
+    biome_values = [v % 3 for v in random_values(2, block_states.BIOMES_VOLUME, seed)]
+    tags = {
+        'Y': (TAG_BYTE, y),
+        'block_states': (TAG_COMPOUND, {'palette': (TAG_LIST, (TAG_COMPOUND, palette)),
+                                        'data': (TAG_LONG_ARRAY, pack_longs(values, bits))}),
+        'biomes': (TAG_COMPOUND, {'palette': (TAG_LIST, (TAG_STRING, ['a', 'b', 'c'])),
+                                  'data': (TAG_LONG_ARRAY, pack_longs(biome_values, 2))}),
+    }
+    return tags, values, biome_values
+
+
+@pytest.mark.parametrize('decoder', ['fast', 'python_nbt'])
+def test_sections_array(decoder):
+    # 16, 17 and 40 entry palettes: 4, 5 and 6 bits per block
+    sections = [section(-1, 16, 1), section(0, 17, 2), section(1, 40, 3)]
+    air = {'Y': (TAG_BYTE, 2), 'block_states': (TAG_COMPOUND, {
+        'palette': (TAG_LIST, (TAG_COMPOUND, [{'Name': (TAG_STRING, 'minecraft:air')}]))})}
+    data = nbt_root({'DataVersion': (TAG_INT, 2975),
+                     'sections': (TAG_LIST, (TAG_COMPOUND, [tags for tags, _, _ in sections] + [air]))})
+    chunk = RegionChunk(data, len(data), decoder)
+    ids, palettes, ys = chunk.sections_array()
+    assert ids.shape == (4, 16, 16, 16)
+    assert ys == [-1, 0, 1, 2]
+    for i, (tags, values, biome_values) in enumerate(sections):
+        assert ids[i].reshape(-1).tolist() == values
+        assert len(palettes[i]) == len(tags['block_states'][1]['palette'][1][1])
+    assert not ids[3].any()
+    assert palettes[3] == [{'Name': 'minecraft:air'}]
+    biomes, biome_palettes, biome_ys = chunk.biomes_array()
+    assert biome_ys == [-1, 0, 1]
+    for i, (tags, values, biome_values) in enumerate(sections):
+        assert biomes[i].reshape(-1).tolist() == biome_values
+        assert biome_palettes[i] == ['a', 'b', 'c']
+
+
+def test_section_indexes_from_fast_decoder():
+    tags, values, _ = section(0, 33, 4)
+    decoded = nbt.decode_bytes(nbt_root(tags))
+    indexes, palette = block_states.section_block_indexes(decoded)
+    assert indexes.shape == (16, 16, 16)
+    assert indexes.reshape(-1).tolist() == values
+    assert len(palette) == 33
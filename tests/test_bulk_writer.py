@@ -0,0 +1,57 @@
+'''
+BulkWriter batching against a real SQLite database.
+'''
+import sqlite3
+
+from pycraft.database import BulkWriter
+from pycraft.database import Database
+
+
+def poi(x, chunk):
+    return {'x': x, 'y': 64, 'z': 0, 'type': 'home', 'free': 1, 'chunk': chunk}
+
+
+def count(dbfile, sql):
+    connection = sqlite3.connect(dbfile)
+    try:
+        return connection.execute(sql).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_deletes_are_written_with_the_inserts(tmp_path):
+    dbfile = str(tmp_path / 'world.db')
+    database = Database(dbfile, bulk=True)
+    database.insert_records('poi', [poi(1, 'poi.0.0.0.0'), poi(2, 'poi.0.0.1.0')])
+    writer = BulkWriter(database, max_rows=1000, max_seconds=1000)
+    # a re-imported chunk: its old records are deleted and the new ones added
+    writer.delete_chunk_records(['poi.0.0.0.0'])
+    writer.insert_records('poi', [poi(3, 'poi.0.0.0.0')])
+    # nothing is written until the batch is
+    assert count(dbfile, 'SELECT COUNT(*) FROM poi') == 2
+    writer.flush()
+    assert count(dbfile, "SELECT x FROM poi WHERE chunk = 'poi.0.0.0.0'") == 3
+    assert count(dbfile, 'SELECT COUNT(*) FROM poi') == 2
+    database.end_bulk_import()
+    database.close()
+
+
+def test_failed_batch_is_dropped(tmp_path):
+    dbfile = str(tmp_path / 'world.db')
+    database = Database(dbfile, bulk=True)
+    writer = BulkWriter(database, max_rows=1000, max_seconds=1000)
+    # x cannot be NULL, so the whole batch is rolled back
+    writer.insert_records('poi', [poi(1, 'poi.0.0.0.0'), poi(None, 'poi.0.0.1.0')])
+    writer.save_region_state('poi', 0, 0, 1, 2, {(0, 0): 100})
+    writer.flush()
+    assert writer.failed_batches == 1
+    assert count(dbfile, 'SELECT COUNT(*) FROM poi') == 0
+    assert count(dbfile, 'SELECT COUNT(*) FROM region_files') == 0
+    # the next batch is written normally
+    writer.insert_records('poi', [poi(2, 'poi.0.0.1.0')])
+    writer.flush()
+    assert writer.failed_batches == 1
+    assert count(dbfile, 'SELECT COUNT(*) FROM poi') == 1
+    assert writer.stats['poi'][0] == 1
+    database.end_bulk_import()
+    database.close()
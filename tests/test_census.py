@@ -0,0 +1,51 @@
+'''
+census_region filters with passengers.
+'''
+import os
+
+from pycraft.census import Census
+from pycraft.census import census_region
+from pycraft.census import entity_filter
+
+from worldgen import TAG_COMPOUND, TAG_DOUBLE, TAG_INT, TAG_INT_ARRAY, TAG_LIST, TAG_STRING
+from worldgen import nbt_root
+from worldgen import write_mca
+
+
+def entity(eid, x, z, passengers=()):
+    return {'id': (TAG_STRING, f'minecraft:{eid}'), 'Pos': (TAG_LIST, (TAG_DOUBLE, [x, 64.0, z])),
+            'Passengers': (TAG_LIST, (TAG_COMPOUND, list(passengers)))}
+
+
+def write_entities(world, entities):
+    os.makedirs(os.path.join(world, 'entities'))
+    chunk = nbt_root({'DataVersion': (TAG_INT, 2975), 'Position': (TAG_INT_ARRAY, [0, 0]),
+                      'Entities': (TAG_LIST, (TAG_COMPOUND, entities))})
+    write_mca(os.path.join(world, 'entities', 'r.0.0.mca'), {(0, 0): chunk})
+
+
+def test_passengers_are_filtered_on_their_own(tmp_path):
+    world = str(tmp_path / 'world')
+    write_entities(world, [
+        entity('boat', 2.5, 2.5, [entity('villager', 2.5, 2.5)]),
+        entity('minecart', 12.5, 12.5, [entity('villager', 12.5, 12.5), entity('cat', 12.5, 12.5)]),
+        entity('cow', 4.5, 4.5),
+    ])
+    assert census_region(world, 0, 0).types == {'boat': 1, 'villager': 2, 'minecart': 1, 'cat': 1, 'cow': 1}
+
+    census = census_region(world, 0, 0, types=['villager'])
+    assert census.types == {'villager': 2}
+    assert census.entities == 2
+
+    census = census_region(world, 0, 0, bbox=(0, 0, 8, 8))
+    assert census.types == {'boat': 1, 'villager': 1, 'cow': 1}
+
+
+def test_vehicle_filter():
+    boat = {'id': 'minecraft:boat', 'Pos': [100.5, 64.0, 100.5], 'Passengers': []}
+    census = Census()
+    census.add_entity(boat, entity_filter(center=(0.0, 64.0, 0.0), radius=16))
+    census.add_entity(boat, entity_filter(types=['villager']))
+    assert census.entities == 0
+    census.add_entity(boat, entity_filter(bbox=(96, 96, 128, 128), types=['boat']))
+    assert census.types == {'boat': 1}
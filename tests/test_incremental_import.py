@@ -0,0 +1,52 @@
+'''
+Incremental imports of load_database.py on a tiny generated world.
+
+Run with: python -m pytest tests
+'''
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from worldgen import make_world
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_world(tmp_path, world, dbfile, *options):
+    # the world catalog is kept under the home directory and the log is written to the working directory
+    env = dict(os.environ, HOME=str(tmp_path), USERPROFILE=str(tmp_path))
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'load_database.py'), dbfile, '-w', world] + list(options),
+                   cwd=str(tmp_path), env=env, check=True)
+
+
+def query(dbfile, sql):
+    connection = sqlite3.connect(dbfile)
+    try:
+        return connection.execute(sql).fetchone()[0]
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('options', [(), ('--bulk',)])
+def test_incremental_import_removes_deleted_region_file(tmp_path, options):
+    world = str(tmp_path / 'world')
+    dbfile = str(tmp_path / 'world.db')
+    make_world(world)
+    import_world(tmp_path, world, dbfile, *options)
+    # a full import does not need the world catalog
+    assert not os.path.exists(str(tmp_path / '.pycraft' / 'catalog'))
+    assert query(dbfile, "SELECT COUNT(*) FROM poi WHERE chunk LIKE 'poi.-1.0.%'") == 2
+    assert query(dbfile, "SELECT COUNT(*) FROM poi") == 4
+
+    os.remove(os.path.join(world, 'poi', 'r.-1.0.mca'))
+    import_world(tmp_path, world, dbfile, '--incremental', *options)
+
+    assert query(dbfile, "SELECT COUNT(*) FROM poi WHERE chunk LIKE 'poi.-1.0.%'") == 0
+    assert query(dbfile, "SELECT COUNT(*) FROM region_files WHERE dtype = 'poi' AND rx = -1 AND rz = 0") == 0
+    assert query(dbfile, "SELECT COUNT(*) FROM chunk_timestamps WHERE dtype = 'poi' AND rx = -1 AND rz = 0") == 0
+    # the records of the file that is still there are kept
+    assert query(dbfile, "SELECT COUNT(*) FROM poi WHERE chunk LIKE 'poi.0.0.%'") == 2
+    assert query(dbfile, "SELECT COUNT(*) FROM region_files WHERE dtype = 'poi' AND rx = 0 AND rz = 0") == 1
@@ -0,0 +1,51 @@
+'''
+Reading region files that change while they are open.
+'''
+import os
+
+import pytest
+
+from pycraft.mca import FileHandlePool
+from pycraft.mca import Mca
+from pycraft.region import Region
+
+from worldgen import TAG_INT, TAG_STRING
+from worldgen import nbt_root
+from worldgen import write_mca
+
+
+def chunk_data(value, padding=0):
+    return nbt_root({'DataVersion': (TAG_INT, 2975), 'value': (TAG_INT, value), 'padding': (TAG_STRING, 'x' * padding)})
+
+
+def rewrite(path, chunks, timestamp):
+    # make sure the mtime changes even on file systems with coarse timestamps
+    mtime_ns = os.stat(path).st_mtime_ns
+    write_mca(path, chunks, timestamp)
+    os.utime(path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+
+@pytest.mark.parametrize('memory_map', [True, False])
+def test_mca_reloads_changed_file(tmp_path, memory_map):
+    path = str(tmp_path / 'r.0.0.mca')
+    write_mca(path, {(0, 0): chunk_data(1)}, 100)
+    mca = Mca(path, memory_map=memory_map, pool=FileHandlePool())
+    assert mca.get_timestamp(0, 0) == 100
+    assert mca.get_data(0, 0) == chunk_data(1)
+    # the chunk moves to another sector and a new chunk is added in front of it
+    rewrite(path, {(1, 1): chunk_data(7), (0, 0): chunk_data(2, 9000)}, 200)
+    assert mca.get_timestamp(0, 0) == 200
+    assert mca.get_data(0, 0) == chunk_data(2, 9000)
+    assert mca.get_data(1, 1) == chunk_data(7)
+    mca.close()
+
+
+def test_region_chunk_cache_sees_changed_file(tmp_path):
+    os.makedirs(str(tmp_path / 'region'))
+    path = str(tmp_path / 'region' / 'r.0.0.mca')
+    write_mca(path, {(0, 0): chunk_data(1)}, 100)
+    region = Region(str(tmp_path), 0, 0)
+    assert region.get_r_chunk('region', 0, 0, decoder='fast').get_tag('value') == 1
+    rewrite(path, {(0, 0): chunk_data(2)}, 200)
+    assert region.get_r_chunk('region', 0, 0, decoder='fast').get_tag('value') == 2
+    region.close()
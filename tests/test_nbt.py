@@ -0,0 +1,81 @@
+'''
+The fast NBT decoder (pycraft.nbt.decode_bytes and friends) against python_nbt.
+'''
+import numpy
+
+from pycraft import nbt
+from pycraft.chunk import Chunk
+
+from worldgen import TAG_BYTE, TAG_BYTE_ARRAY, TAG_COMPOUND, TAG_DOUBLE, TAG_FLOAT, TAG_INT, TAG_INT_ARRAY, \
+    TAG_LIST, TAG_LONG, TAG_LONG_ARRAY, TAG_SHORT, TAG_STRING
+from worldgen import nbt_root
+
+# python_nbt cannot read byte arrays with values above 127, so the byte array stays in 0 - 127
+TAGS = {
+    'byte': (TAG_BYTE, -7),
+    'short': (TAG_SHORT, -300),
+    'int': (TAG_INT, 2 ** 31 - 1),
+    'long': (TAG_LONG, -2 ** 63),
+    'float': (TAG_FLOAT, 1.5),
+    'double': (TAG_DOUBLE, -0.25),
+    'string': (TAG_STRING, 'minecraft:stone é'),
+    'bytes': (TAG_BYTE_ARRAY, [0, 1, 127]),
+    'ints': (TAG_INT_ARRAY, [-1, 0, 1, 2 ** 31 - 1]),
+    'longs': (TAG_LONG_ARRAY, [-1, 0, 2 ** 63 - 1]),
+    'empty list': (TAG_LIST, (TAG_INT, [])),
+    'strings': (TAG_LIST, (TAG_STRING, ['a', 'b'])),
+    'compounds': (TAG_LIST, (TAG_COMPOUND, [{'x': (TAG_INT, 1)}, {'y': (TAG_LIST, (TAG_LONG, [5]))}])),
+    'nested': (TAG_COMPOUND, {'inner': (TAG_COMPOUND, {'id': (TAG_STRING, 'minecraft:chest')})}),
+}
+DATA = nbt_root(TAGS)
+
+
+def plain(value):
+    '''
+    Convert the NumPy arrays of the fast decoder to lists
+    '''
+    if isinstance(value, numpy.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+
+def test_decode_bytes_matches_python_nbt():
+    fast = plain(nbt.decode_bytes(DATA))
+    reference = Chunk(DATA, len(DATA), decoder='python_nbt').get_tags().json_obj(full_json=False)
+    assert fast == reference
+    assert fast['long'] == -2 ** 63
+    assert fast['string'] == 'minecraft:stone é'
+    assert fast['longs'] == [-1, 0, 2 ** 63 - 1]
+
+
+def test_decode_memoryview():
+    assert plain(nbt.decode_bytes(memoryview(DATA))) == plain(nbt.decode_bytes(DATA))
+
+
+def test_scan_and_decode_payload():
+    index = nbt.scan_bytes(DATA)
+    assert list(index) == list(TAGS)
+    full = nbt.decode_bytes(DATA)
+    for name, (tag_type, start, end) in index.items():
+        assert tag_type == TAGS[name][0]
+        assert plain(nbt.decode_payload(DATA[start:end], tag_type)) == plain(full[name])
+    assert list(nbt.scan_bytes(DATA, ('int', 'nested'))) == ['int', 'nested']
+
+
+def test_lazy_chunk_matches_full_decode():
+    full = plain(Chunk(DATA, len(DATA), decoder='fast').get_tags())
+    lazy = Chunk(DATA, len(DATA), decoder='fast', lazy=True)
+    assert plain(lazy.get_tag('compounds')) == full['compounds']
+    assert plain(lazy.get_tags()) == full
+    selected = Chunk(DATA, len(DATA), decoder='fast', tags=('short', 'strings'))
+    assert plain(selected.get_tags()) == {'short': -300, 'strings': ['a', 'b']}
+
+
+def test_find_fields():
+    assert plain(nbt.find_fields(DATA, ('nested', 'inner'), ('id',))) == {'id': 'minecraft:chest'}
+    assert plain(nbt.find_fields(DATA, (), ('int', 'ints', 'missing'))) == {'int': 2 ** 31 - 1,
+                                                                           'ints': [-1, 0, 1, 2 ** 31 - 1]}
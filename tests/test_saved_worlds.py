@@ -0,0 +1,40 @@
+'''
+World.get_saved_worlds with broken saves in the saves directory.
+'''
+import gzip
+import os
+
+from pycraft.world import World
+
+from worldgen import TAG_BYTE, TAG_COMPOUND, TAG_INT, TAG_LONG, TAG_STRING
+from worldgen import nbt_root
+
+LEVEL = nbt_root({'Data': (TAG_COMPOUND, {
+    'LevelName': (TAG_STRING, 'Good World'),
+    'GameType': (TAG_INT, 1),
+    'LastPlayed': (TAG_LONG, 1650000000000),
+    'allowCommands': (TAG_BYTE, 1),
+    'Version': (TAG_COMPOUND, {'Name': (TAG_STRING, '1.18.2')}),
+})})
+
+
+def write_level(savedir, name, data):
+    os.makedirs(os.path.join(savedir, name))
+    with open(os.path.join(savedir, name, 'level.dat'), 'wb') as f:
+        f.write(data)
+
+
+def test_broken_saves_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(World, 'SAVED_WORLDS_CACHE', str(tmp_path / 'saved_worlds.json'))
+    savedir = str(tmp_path / 'saves')
+    good = gzip.compress(LEVEL)
+    write_level(savedir, 'good', good)
+    write_level(savedir, 'empty', b'')
+    write_level(savedir, 'not gzip', LEVEL)
+    write_level(savedir, 'truncated', good[:len(good) // 2])
+    write_level(savedir, 'bad crc', good[:-8] + bytes(8))
+    write_level(savedir, 'truncated nbt', gzip.compress(LEVEL[:len(LEVEL) // 2]))
+
+    worlds = World.get_saved_worlds(savedir)
+    assert [(w['file_name'], w['name'], w['mode'], w['version']) for w in worlds] == \
+        [('good', 'Good World', 'Creative', '1.18.2')]
@@ -0,0 +1,45 @@
+'''
+TilePyramid with region tiles far from the world origin.
+'''
+import os
+
+import pytest
+
+from pycraft.tiles import RegionTileSource
+from pycraft.tiles import TilePyramid
+from pycraft.world_catalog import WorldCatalog
+
+from worldgen import TAG_INT
+from worldgen import nbt_root
+from worldgen import write_mca
+
+
+def make_source(tmp_path, regions):
+    world = str(tmp_path / 'world')
+    os.makedirs(os.path.join(world, 'region'))
+    for rx, rz in regions:
+        # chunks without heightmaps render as transparent tiles
+        write_mca(os.path.join(world, 'region', f'r.{rx}.{rz}.mca'), {(0, 0): nbt_root({'DataVersion': (TAG_INT, 2975)})})
+    return RegionTileSource(world, catalog=WorldCatalog(world, cache_dir=str(tmp_path / 'catalog')))
+
+
+def test_fit_zoom(tmp_path):
+    # 256 pixel tiles: regions 0 and -1 are tiles -2 to 1
+    assert make_source(tmp_path, [(0, 0), (-1, 0)]).fit_zoom() == 2
+
+
+def test_large_world(tmp_path):
+    # region 100 starts at block 51200, outside the 65536 blocks of max_zoom 8
+    source = make_source(tmp_path, [(0, 0), (100, -3)])
+    assert source.fit_zoom() == 9
+    out_dir = str(tmp_path / 'tiles')
+    with pytest.raises(ValueError):
+        TilePyramid(out_dir, 8).update(source, processes=1)
+
+    assert TilePyramid(out_dir).update(source, processes=1) > 0
+    assert os.listdir(os.path.join(out_dir, '0', '0')) == ['0.png']
+    for x in os.listdir(os.path.join(out_dir, '9')):
+        assert 0 <= int(x) < 512
+        for y in os.listdir(os.path.join(out_dir, '9', x)):
+            assert 0 <= int(y[:-len('.png')]) < 512
+    assert TilePyramid(out_dir).update(source, processes=1) == 0
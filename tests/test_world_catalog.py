@@ -0,0 +1,60 @@
+'''
+WorldCatalog against the region files on disk.
+'''
+import os
+
+from pycraft import region_stats
+from pycraft.region import Region
+from pycraft.world_catalog import WorldCatalog
+
+from worldgen import make_world
+from worldgen import poi_chunk
+from worldgen import write_mca
+
+
+def test_refresh(tmp_path):
+    world = str(tmp_path / 'world')
+    make_world(world)
+    catalog = WorldCatalog(world, cache_dir=str(tmp_path / 'catalog'))
+    assert catalog.refresh() == 2
+    assert catalog.get_region_positions('poi') == [(-1, 0), (0, 0)]
+    assert catalog.get_timestamps('poi', 0, 0) == {(0, 0): 1000, (3, 5): 1000}
+    assert catalog.stats() == region_stats.scan_world(world)
+    assert catalog.refresh() == 0
+
+    path = os.path.join(world, 'poi', 'r.0.0.mca')
+    write_mca(path, {(1, 1): poi_chunk(0, 0, 1, 1)}, 2000)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    os.remove(os.path.join(world, 'poi', 'r.-1.0.mca'))
+    assert catalog.refresh() == 2
+    assert catalog.get_region_positions('poi') == [(0, 0)]
+    assert catalog.get_timestamps('poi', 0, 0) == {(1, 1): 2000}
+    assert catalog.get_file_stat('poi', -1, 0) is None
+
+    # a new catalog object loads the saved catalog and finds nothing to update
+    reloaded = WorldCatalog(world, cache_dir=str(tmp_path / 'catalog'))
+    assert reloaded.refresh() == 0
+    assert reloaded.stats() == catalog.stats()
+
+
+def test_read_header_of_missing_file(tmp_path):
+    assert region_stats.read_header(str(tmp_path / 'r.0.0.mca')) is None
+
+
+def test_file_created_after_refresh(tmp_path):
+    world = str(tmp_path / 'world')
+    make_world(world)
+    catalog = WorldCatalog(world, cache_dir=str(tmp_path / 'catalog'))
+    catalog.refresh()
+    assert not catalog.has_region('poi', 5, 5)
+
+    write_mca(os.path.join(world, 'poi', 'r.5.5.mca'), {(2, 3): poi_chunk(5, 5, 2, 3)})
+    region = Region(world, 5, 5, catalog=catalog)
+    assert region.has_data('poi')
+    assert region.get_timestamps('poi') == {(2, 3): 1000}
+    assert catalog.get_timestamps('poi', 5, 5) == {(2, 3): 1000}
+    assert (5, 5) in catalog.get_region_positions('poi')
+    region.close()
+    # and it was saved
+    assert WorldCatalog(world, cache_dir=str(tmp_path / 'catalog')).refresh() == 0
@@ -0,0 +1,112 @@
+'''
+Writers for the small NBT files, region files and worlds used by the tests.
+
+Tags are (tag type, value) pairs. Compounds are dicts of {name: (tag type, value)}, lists are
+(item tag type, [values]).
+'''
+import gzip
+import os
+import struct
+import zlib
+
+TAG_BYTE = 1
+TAG_SHORT = 2
+TAG_INT = 3
+TAG_LONG = 4
+TAG_FLOAT = 5
+TAG_DOUBLE = 6
+TAG_BYTE_ARRAY = 7
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_INT_ARRAY = 11
+TAG_LONG_ARRAY = 12
+
+SCALARS = {TAG_BYTE: '>b', TAG_SHORT: '>h', TAG_INT: '>i', TAG_LONG: '>q', TAG_FLOAT: '>f', TAG_DOUBLE: '>d'}
+ARRAYS = {TAG_BYTE_ARRAY: 'b', TAG_INT_ARRAY: 'i', TAG_LONG_ARRAY: 'q'}
+
+
+def nbt_string(value):
+    data = value.encode('utf-8')
+    return struct.pack('>H', len(data)) + data
+
+
+def nbt_payload(tag_type, value):
+    if tag_type in SCALARS:
+        return struct.pack(SCALARS[tag_type], value)
+    if tag_type in ARRAYS:
+        return struct.pack(f'>i{len(value)}{ARRAYS[tag_type]}', len(value), *value)
+    if tag_type == TAG_STRING:
+        return nbt_string(value)
+    if tag_type == TAG_LIST:
+        item_type, items = value
+        return struct.pack('>bi', item_type, len(items)) + b''.join(nbt_payload(item_type, v) for v in items)
+    if tag_type == TAG_COMPOUND:
+        return b''.join(struct.pack('>b', t) + nbt_string(k) + nbt_payload(t, v) for k, (t, v) in value.items()) + b'\0'
+    raise ValueError(f'Unsupported tag type {tag_type}')
+
+
+def nbt_root(value):
+    '''
+    Uncompressed NBT data of an unnamed root compound
+    '''
+    return struct.pack('>b', TAG_COMPOUND) + nbt_string('') + nbt_payload(TAG_COMPOUND, value)
+
+
+def write_mca(path, chunks, timestamp=1000):
+    '''
+    Write a region file. chunks is {(cx, cz): uncompressed NBT data}
+    '''
+    locations = bytearray(4096)
+    timestamps = bytearray(4096)
+    body = b''
+    sector = 2
+    for (cx, cz), data in chunks.items():
+        payload = zlib.compress(data)
+        record = struct.pack('>IB', len(payload) + 1, 2) + payload
+        record += b'\0' * (-len(record) % 4096)
+        index = cx | cz << 5
+        struct.pack_into('>I', locations, index * 4, sector << 8 | len(record) // 4096)
+        struct.pack_into('>I', timestamps, index * 4, timestamp)
+        body += record
+        sector += len(record) // 4096
+    with open(path, 'wb') as f:
+        f.write(bytes(locations) + bytes(timestamps) + body)
+
+
+def poi_chunk(rx, rz, cx, cz):
+    x = rx * 512 + cx * 16
+    z = rz * 512 + cz * 16
+    record = {'pos': (TAG_INT_ARRAY, [x, 64, z]), 'type': (TAG_STRING, 'minecraft:home'), 'free_tickets': (TAG_INT, 1)}
+    section = {'Records': (TAG_LIST, (TAG_COMPOUND, [record]))}
+    return nbt_root({'DataVersion': (TAG_INT, 2975), 'Sections': (TAG_COMPOUND, {'4': (TAG_COMPOUND, section)})})
+
+
+def make_world(path):
+    '''
+    A world with a player and the poi files r.0.0 and r.-1.0, with two chunks each
+    '''
+    os.makedirs(os.path.join(path, 'poi'))
+    os.makedirs(os.path.join(path, 'playerdata'))
+    for rx, rz in ((0, 0), (-1, 0)):
+        write_mca(os.path.join(path, 'poi', f'r.{rx}.{rz}.mca'),
+                  {(cx, cz): poi_chunk(rx, rz, cx, cz) for cx, cz in ((0, 0), (3, 5))})
+    player = {'Pos': (TAG_LIST, (TAG_DOUBLE, [1.5, 64.0, 2.5])), 'Health': (TAG_FLOAT, 20.0),
+              'Inventory': (TAG_LIST, (TAG_COMPOUND, []))}
+    with gzip.open(os.path.join(path, 'playerdata', '00000001-0000-0002-0000-000300000004.dat'), 'wb') as f:
+        f.write(nbt_root(player))
+
+
+def pack_longs(values, bits):
+    '''
+    Pack values into signed longs, 64 // bits values per long from the least significant bits (the
+    non-spanning layout of block states, biomes and heightmaps)
+    '''
+    per_long = 64 // bits
+    longs = []
+    for start in range(0, len(values), per_long):
+        packed = 0
+        for i, value in enumerate(values[start:start + per_long]):
+            packed |= value << (i * bits)
+        longs.append(packed - (1 << 64) if packed >= 1 << 63 else packed)
+    return longs
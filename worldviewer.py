@@ -1,13 +1,34 @@
+from datetime import datetime
 import glob
 import os
+import threading
 
 import pygame
 from pygame_gui.elements import UIPanel, UILabel, UIImage
 from pygame_gui_extras.app import GuiApp
 
+from pycraft.world_catalog import WorldCatalog
 from pycraft_gui.pycraft_app import PYCRAFT_WORLD_SELECTION_CHANGED
 from pycraft_gui.ui_world_selector import UIWorldSelector
 
+# posted by the catalog thread when the region file statistics of a world are ready
+WORLD_STATS_READY = pygame.event.custom_type()
+
+
+def read_world_stats(path):
+    """
+    Refresh the world catalog and post its statistics. Runs in a worker thread so that reading the headers
+    of a large world does not freeze the UI.
+    """
+    try:
+        catalog = WorldCatalog(path)
+        catalog.refresh()
+        stats = catalog.stats()
+    except Exception as e:
+        print(f'Failed to read the region files of {path}: {e}')
+        stats = None
+    pygame.event.post(pygame.event.Event(WORLD_STATS_READY, {'path': path, 'stats': stats}))
+
 
 def blank_icon():
     icon = pygame.surface.Surface((64, 64))
@@ -26,6 +47,10 @@ class WorldDataViewerApp(GuiApp):
         self.world_icon = None
         self._world_info_panel = None
         self._entities_count_text = None
+        self._chunks_count_text = None
+        self._size_text = None
+        self._oldest_text = None
+        self._newest_text = None
         self._world_data = None
         self._top_panel = None
         self._world_selector = None
@@ -42,6 +67,11 @@ class WorldDataViewerApp(GuiApp):
             # the selected world has been changed. Load the map data for the new world.
             self.on_select_world()
             return True
+        if event.type == WORLD_STATS_READY:
+            # ignore the results for a world that is no longer selected
+            if event.path == self._world_selector.get_world_path():
+                self.show_world_stats(event.stats)
+            return True
         return False
 
     def setup_world_info_panel(self, x, y, width, height):
@@ -188,6 +218,120 @@ class WorldDataViewerApp(GuiApp):
                 'left_target': maps_label
             }
         )
+        # CHUNKS (region files)
+        chunks_label = UILabel(
+            pygame.Rect(0, y + 3, label_width, label_height),
+            'Chunks:', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextFieldLabel',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': self._regions_count_text,
+                'top_target': maps_label
+            }
+        )
+        self._chunks_count_text = UILabel(
+            pygame.Rect(0, 3, field_width, label_height),
+            '', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextField',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': chunks_label,
+                'top_target': self._maps_count_text
+            }
+        )
+        # SIZE (all region, entities and poi files)
+        size_label = UILabel(
+            pygame.Rect(0, y + 3, label_width, label_height),
+            'Size:', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextFieldLabel',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': self._poi_count_text,
+                'top_target': chunks_label
+            }
+        )
+        self._size_text = UILabel(
+            pygame.Rect(0, 3, field_width, label_height),
+            '', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextField',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': size_label,
+                'top_target': self._chunks_count_text
+            }
+        )
+        # OLDEST / NEWEST chunk
+        date_width = field_width + 30
+        oldest_label = UILabel(
+            pygame.Rect(0, y + 3, label_width, label_height),
+            'Oldest:', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextFieldLabel',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': self._maps_count_text
+            }
+        )
+        self._oldest_text = UILabel(
+            pygame.Rect(0, 3, date_width, label_height),
+            '', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextField',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': oldest_label
+            }
+        )
+        newest_label = UILabel(
+            pygame.Rect(0, y + 3, label_width, label_height),
+            'Newest:', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextFieldLabel',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': self._chunks_count_text,
+                'top_target': oldest_label
+            }
+        )
+        self._newest_text = UILabel(
+            pygame.Rect(0, 3, date_width, label_height),
+            '', self.ui_manager,
+            container=self._world_info_panel,
+            object_id='@TextField',
+            anchors={
+                'top': 'top',
+                'left': 'left',
+                'bottom': 'top',
+                'right': 'left',
+                'left_target': newest_label,
+                'top_target': self._oldest_text
+            }
+        )
     def setup_region_status_panel(self):
         app_size = self.size
         x = 0
@@ -241,6 +385,10 @@ class WorldDataViewerApp(GuiApp):
             self._entities_count_text.set_text('')
             self._regions_count_text.set_text('')
             self._poi_count_text.set_text('')
+            self._chunks_count_text.set_text('')
+            self._size_text.set_text('')
+            self._oldest_text.set_text('')
+            self._newest_text.set_text('')
             self.world_icon.set_image(blank_icon())
 
             return
@@ -249,21 +397,10 @@ class WorldDataViewerApp(GuiApp):
         self._world_data['files']['maps'] = file_list
         self._maps_count_text.set_text(str(len(file_list)))
 
-        region_path = os.path.join(path, 'region')
-        file_list = glob.glob(os.path.join(region_path, 'r.*.mca'))
-        self._world_data['files']['region'] = file_list
-        self._regions_count_text.set_text(str(len(file_list)))
-
-        entity_path = os.path.join(path, 'entities')
-        print(f'entities: {entity_path}')
-        file_list = glob.glob(os.path.join(entity_path, 'r.*.mca'))
-        self._world_data['files']['entity'] = file_list
-        self._entities_count_text.set_text(str(len(file_list)))
-
-        poi_path = os.path.join(path, 'poi')
-        file_list = glob.glob(os.path.join(poi_path, 'r.*.mca'))
-        self._world_data['files']['poi'] = file_list
-        self._poi_count_text.set_text(str(len(file_list)))
+        # counts from the region file headers in the world catalog, nothing is decompressed. The catalog
+        # is refreshed in a thread, the counts are shown when WORLD_STATS_READY arrives
+        self.set_stats_text('...')
+        threading.Thread(name='world_stats', target=read_world_stats, args=(path,), daemon=True).start()
 
         icon_path = os.path.join(path, 'icon.png')
         if os.path.exists(icon_path):
@@ -272,6 +409,27 @@ class WorldDataViewerApp(GuiApp):
             icon = blank_icon()
         self.world_icon.set_image(icon)
 
+    def set_stats_text(self, text):
+        for label in (self._regions_count_text, self._entities_count_text, self._poi_count_text,
+                      self._chunks_count_text, self._size_text, self._oldest_text, self._newest_text):
+            label.set_text(text)
+
+    def show_world_stats(self, stats):
+        if stats is None:
+            self.set_stats_text('')
+            return
+        self._world_data['stats'] = stats
+        self._regions_count_text.set_text(str(stats['region']['files']))
+        self._entities_count_text.set_text(str(stats['entities']['files']))
+        self._poi_count_text.set_text(str(stats['poi']['files']))
+        self._chunks_count_text.set_text(str(stats['region']['chunks']))
+        size = sum(stats[dtype]['bytes'] for dtype in stats)
+        self._size_text.set_text(f'{size / (1024 * 1024):.1f} MB')
+        oldest = stats['region']['oldest']
+        newest = stats['region']['newest']
+        self._oldest_text.set_text(datetime.fromtimestamp(oldest).strftime('%Y-%m-%d') if oldest else '')
+        self._newest_text.set_text(datetime.fromtimestamp(newest).strftime('%Y-%m-%d') if newest else '')
+
     def on_select_world(self):
         print(f'world selected: {self._world_selector.selected_world}...')
         self.get_world_info()